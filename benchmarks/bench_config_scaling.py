@@ -0,0 +1,168 @@
+"""
+Benchmark for large register maps.
+
+Generates a register map with many devices and registers, then measures
+loading it, the per-device getter calls made when a device table is built,
+device tag allocation, register edits and one poll cycle over every device.
+The poll cycle answers requests from an in-process pymodbus datastore so
+it measures ModConnect's side of polling, not the network.
+
+Usage:
+    python benchmarks/bench_config_scaling.py --devices 1000 --registers 100
+"""
+
+import os
+import sys
+import json
+import argparse
+import tempfile
+from time import perf_counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from pymodbus.datastore import ModbusSlaveContext, ModbusSequentialDataBlock
+from pymodbus.bit_read_message import ReadCoilsResponse, ReadDiscreteInputsResponse
+from pymodbus.register_read_message import ReadHoldingRegistersResponse, ReadInputRegistersResponse
+
+from file_handler import FileHandler
+from read_planner import extract_register_patterns, ScanPlan
+from register_decoder import RegisterDecoder
+from constants import SLAVE_ADDRESS, DEVICE_NAME, DEFAULT_METHOD, HIDDEN_STATUS, \
+        CONNECTION_PARAMETERS, RTU_PARAMETERS, TCP_PARAMETERS, HOST, PORT, \
+        REGISTERS, REGISTER_NAME, FUNCTION_CODE, REGISTER_TEMPLATE, TCP_METHOD, DATA_TYPE
+
+
+class DatastoreClient:
+    """
+    Answers read requests from a pymodbus datastore, with the same method
+    signatures as the pymodbus sync clients.
+    """
+
+    def __init__(self, size=65536):
+        self.context = ModbusSlaveContext(
+            co=ModbusSequentialDataBlock(0, [1] * size),
+            di=ModbusSequentialDataBlock(0, [0] * size),
+            hr=ModbusSequentialDataBlock(0, list(range(size))),
+            ir=ModbusSequentialDataBlock(0, list(range(size))),
+            zero_mode=True,
+        )
+
+    def read_coils(self, address, count, slave=0):
+        return ReadCoilsResponse(self.context.getValues(1, address, count))
+
+    def read_discrete_inputs(self, address, count, slave=0):
+        return ReadDiscreteInputsResponse(self.context.getValues(2, address, count))
+
+    def read_holding_registers(self, address, count, slave=0):
+        return ReadHoldingRegistersResponse(self.context.getValues(3, address, count))
+
+    def read_input_registers(self, address, count, slave=0):
+        return ReadInputRegistersResponse(self.context.getValues(4, address, count))
+
+
+def generate_register_map(device_count, register_count, data_type=None):
+    data = {}
+    for tag in range(1, device_count + 1):
+        registers = {}
+        for address in range(register_count):
+            register = dict(REGISTER_TEMPLATE)
+            # Alternate blocks of 10 holding and input registers with a gap of 5 between blocks,
+            # so registers of the same function code are 20 addresses apart.
+            register[FUNCTION_CODE] = 3 if (address // 10) % 2 == 0 else 4
+            if data_type:
+                register[DATA_TYPE] = data_type
+            registers[str(address + (address // 10) * 5)] = register
+        data[f"device_{tag}"] = {
+            SLAVE_ADDRESS: str(tag % 247 + 1),
+            DEVICE_NAME: f"Device {tag}",
+            DEFAULT_METHOD: TCP_METHOD,
+            HIDDEN_STATUS: False,
+            CONNECTION_PARAMETERS: {RTU_PARAMETERS: {}, TCP_PARAMETERS: {HOST: "127.0.0.1", PORT: 502}},
+            REGISTERS: registers,
+        }
+    return data
+
+
+def timed(label, function, operations=1):
+    start = perf_counter()
+    result = function()
+    elapsed = perf_counter() - start
+    per_op = f"{elapsed / operations * 1e6:10.1f} us/op" if operations > 1 else ""
+    print(f"{label:<42}{elapsed * 1000:10.1f} ms  {per_op}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=1000)
+    parser.add_argument("--registers", type=int, default=100, help="registers per device")
+    parser.add_argument("--edits", type=int, default=10000, help="register renames to perform")
+    parser.add_argument("--max-gap", type=int, default=0, help="unused registers a read request may span")
+    parser.add_argument("--data-type", default="float32", help="data type the registers are decoded as")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="modconnect_bench_")
+    file_path = os.path.join(directory, "register_map_file.json")
+    data = generate_register_map(args.devices, args.registers, args.data_type)
+    with open(file_path, "w") as file:
+        json.dump(data, file, indent=4)
+    total_registers = args.devices * args.registers
+    print(f"{args.devices} devices, {total_registers} registers, "
+          f"{os.path.getsize(file_path) / 1e6:.1f} MB register map\n")
+
+    file_handler = FileHandler(file_path)
+    tags = timed("Load register map", file_handler.get_int_device_tags)
+
+    def build_tables():
+        # The getters a TableWidget and its Modbus clients call for each device
+        for tag in tags:
+            handler = FileHandler(file_path)
+            handler.get_register_count(tag)
+            handler.get_device_name(tag)
+            handler.get_slave_address(tag)
+            handler.get_modbus_protocol(tag)
+            handler.get_connection_params(tag)
+            handler.get_default_modbus_method(tag)
+            handler.get_hidden_status(tag)
+            handler.get_register_attributes(tag, REGISTER_NAME)
+    timed("Device table getters (all devices)", build_tables, len(tags))
+
+    def allocate_tags():
+        new_tags = [file_handler.add_device({REGISTERS: {}, CONNECTION_PARAMETERS: {}}) for _ in range(args.devices)]
+        for tag in new_tags:
+            file_handler.delete_device(tag)
+    timed("Add + delete devices", allocate_tags, args.devices * 2)
+
+    def rename_registers():
+        for i in range(args.edits):
+            tag = tags[i % len(tags)]
+            address = next(iter(data[f"device_{tag}"][REGISTERS]))
+            file_handler.update_register_name(tag, address, f"edit {i}")
+    timed("Rename registers", rename_registers, args.edits)
+    timed("Flush pending edits", file_handler.flush_device_data)
+
+    def plan_devices():
+        return {
+            tag: ScanPlan(extract_register_patterns(file_handler.get_registers_to_read(tag)), args.max_gap)
+            for tag in tags
+        }
+    plans = timed("Build read plans", plan_devices, len(tags))
+
+    client = DatastoreClient()
+    def poll_cycle():
+        for plan in plans.values():
+            for request in plan.requests:
+                plan.store(request, getattr(client, request.method)(request.start, request.quantity, slave=1))
+    request_count = sum(len(plan.requests) for plan in plans.values())
+    timed(f"Poll cycle ({request_count} requests)", poll_cycle, request_count)
+
+    decoders = timed("Build decoders", lambda: {
+        tag: RegisterDecoder(file_handler.get_register_formats(tag)) for tag in tags
+    }, len(tags))
+    def decode_all():
+        for tag, plan in plans.items():
+            decoders[tag].decode(plan.values)
+    timed(f"Decode values ({total_registers} registers)", decode_all, len(tags))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""
+Benchmark of polling against simulated devices.
+
+Starts a simulator farm (see simulator.py) in a separate process, so its
+work does not count against ModConnect, then polls every simulated device
+with each engine for --duration seconds:
+
+    sequential  acquisition.Device.read() of one device after the other,
+                the read path the table widgets used before worker threads
+    threads     PollCoordinator with one DeviceWorker thread per device
+    asyncio     AsyncPollCoordinator on one event loop
+
+and reports the poll cycles, the achieved against the target rate, cycle
+time percentiles, overruns, requests per second, timeouts and exception
+responses, and the CPU time of the polling process. --json writes the
+full poll_stats reports, to compare runs.
+
+Usage:
+    python benchmarks/bench_polling.py --tcp 50 --registers 500 --latency-ms 5 --jitter-ms 2 --duration 10
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+from time import perf_counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from PyQt5.QtCore import QCoreApplication, QThread, QTimer, Qt
+from file_handler import FileHandler
+from acquisition import Device
+from poll_stats import PollStats
+from register_reader import DeviceWorker, PollCoordinator
+from async_poller import AsyncPollCoordinator
+from simulator import add_arguments
+from constants import SCAN_CLASS_ITEMS
+
+
+ENGINES = ["sequential", "threads", "asyncio"]
+
+
+def start_simulator(args, config_path) -> subprocess.Popen:
+    """Starts simulator.py with the simulator arguments of this benchmark and waits until it is ready."""
+    command = [
+        sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "simulator.py"),
+        "--tcp", str(args.tcp), "--rtu", str(args.rtu), "--slaves", str(args.slaves),
+        "--registers", str(args.registers), "--base-port", str(args.base_port),
+        "--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms),
+        "--drop-rate", str(args.drop_rate), "--error-rate", str(args.error_rate), "--seed", str(args.seed),
+        "--scan-class", args.scan_class, "--config", config_path,
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    for line in process.stdout:
+        if line.strip() == "ready":
+            # Nothing else is read from it, and it prints nothing more
+            process.stdout.close()
+            return process
+    process.kill()
+    process.wait()
+    process.stdout.close()
+    raise RuntimeError("The simulator exited before it was ready")
+
+
+def load_devices(config_path, connect=True) -> list:
+    file_handler = FileHandler(config_path)
+    devices = [Device(device_number, file_handler) for device_number in file_handler.get_int_device_tags()]
+    if connect:
+        for device in devices:
+            if not device.connect():
+                print(f"Could not connect to device {device.device_number} ({device.name})")
+    return devices
+
+
+def poll_sequential(devices, stats, interval_ms, duration_s):
+    deadline = perf_counter() + duration_s
+    while perf_counter() < deadline:
+        cycle_start = perf_counter()
+        for device in devices:
+            device.read(cycle_start)
+        elapsed = perf_counter() - cycle_start
+        stats.cycles.record(cycle_start, elapsed)
+        time.sleep(max(0.0, interval_ms / 1000 - elapsed))
+    for device in devices:
+        device.disconnect()
+
+
+def run_until(app, duration_s):
+    QTimer.singleShot(int(duration_s * 1000), app.quit)
+    app.exec_()
+
+
+def poll_threads(devices, stats, interval_ms, duration_s, app):
+    threads, workers = [], {}
+    for device in devices:
+        thread = QThread()
+        worker = DeviceWorker(device)
+        worker.moveToThread(thread)
+        thread.start()
+        threads.append(thread)
+        workers[device.device_number] = worker
+
+    coordinator_thread = QThread()
+    coordinator = PollCoordinator(workers, interval_ms, stats.cycles)
+    for worker in workers.values():
+        coordinator.trigger_workers.connect(worker.do_read, Qt.QueuedConnection)
+    coordinator.moveToThread(coordinator_thread)
+    coordinator_thread.started.connect(coordinator.start)
+    coordinator_thread.start()
+
+    run_until(app, duration_s)
+
+    coordinator.request_stop()
+    for worker in workers.values():
+        worker.request_stop()
+    for thread in [coordinator_thread] + threads:
+        thread.quit()
+        thread.wait(5000)
+
+
+def poll_asyncio(devices, stats, interval_ms, duration_s, app):
+    coordinator_thread = QThread()
+    coordinator = AsyncPollCoordinator({device.device_number: device for device in devices}, interval_ms,
+                                       stats=stats.cycles)
+    coordinator.moveToThread(coordinator_thread)
+    coordinator_thread.started.connect(coordinator.start)
+    coordinator_thread.start()
+
+    run_until(app, duration_s)
+
+    coordinator.request_stop()
+    coordinator_thread.quit()
+    coordinator_thread.wait(5000)
+
+
+def run_engine(engine, config_path, args, app) -> dict:
+    # The async engine opens its own connections
+    devices = load_devices(config_path, connect=engine != "asyncio")
+    stats = PollStats({device.device_number: device.stats for device in devices}, args.interval_ms)
+    stats.reset()
+
+    cpu_start = time.process_time()
+    wall_start = perf_counter()
+    if engine == "sequential":
+        poll_sequential(devices, stats, args.interval_ms, args.duration)
+    elif engine == "threads":
+        poll_threads(devices, stats, args.interval_ms, args.duration, app)
+    else:
+        poll_asyncio(devices, stats, args.interval_ms, args.duration, app)
+    wall = perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    report = stats.report()
+    report["cpu_s"] = round(cpu, 3)
+    report["wall_s"] = round(wall, 3)
+    return report
+
+
+def print_row(engine, report):
+    cycles = report.get("cycles", {"achieved_hz": 0, "target_hz": 0, "overruns": 0, "duration": {"count": 0}})
+    duration = cycles["duration"]
+    devices = report["devices"].values()
+    requests = sum(device["requests"] for device in devices)
+    timeouts = sum(device["timeouts"] for device in devices)
+    errors = sum(device["error_responses"] for device in devices)
+    print(f"{engine:<12}{duration['count']:>8}{cycles['achieved_hz']:>10.2f}{cycles['target_hz'] or 0:>9.2f}"
+          f"{duration.get('p50_ms', 0):>9.1f}{duration.get('p95_ms', 0):>9.1f}{duration.get('p99_ms', 0):>9.1f}"
+          f"{cycles['overruns']:>10}{requests / report['wall_s']:>12.1f}{timeouts:>10}{errors:>8}"
+          f"{report['cpu_s'] / report['wall_s'] * 100:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_arguments(parser)
+    parser.add_argument("--engines", nargs="+", choices=ENGINES, default=ENGINES)
+    parser.add_argument("--interval-ms", type=int, default=100, help="target poll cycle time")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds to poll with each engine")
+    parser.add_argument("--scan-class", choices=SCAN_CLASS_ITEMS, default="Fast",
+                        help="scan class of the registers, which limits how often they are read")
+    parser.add_argument("--json", metavar="PATH", help="write the poll statistics of every engine to this file")
+    args = parser.parse_args()
+
+    config_path = os.path.join(tempfile.mkdtemp(prefix="modconnect_bench_"), "register_map_file.json")
+    simulator = start_simulator(args, config_path)
+    app = QCoreApplication.instance() or QCoreApplication(sys.argv)
+    reports = {}
+    try:
+        device_count = args.tcp + args.rtu * args.slaves
+        print(f"{device_count} simulated devices, {args.registers} registers each, "
+              f"{args.latency_ms} ms +- {args.jitter_ms} ms latency, {args.interval_ms} ms target cycle\n")
+        print(f"{'engine':<12}{'cycles':>8}{'rate Hz':>10}{'target':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+              f"{'overruns':>10}{'requests/s':>12}{'timeouts':>10}{'errors':>8}{'CPU %':>8}")
+        for engine in args.engines:
+            reports[engine] = run_engine(engine, config_path, args, app)
+            print_row(engine, reports[engine])
+    finally:
+        simulator.terminate()
+        simulator.wait()
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(reports, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
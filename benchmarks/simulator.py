@@ -0,0 +1,353 @@
+"""
+Simulated Modbus devices for benchmarks.
+
+Starts any number of Modbus TCP servers on consecutive ports, and Modbus
+RTU buses on pseudo-terminals (Linux and macOS) with several slaves each,
+all served from one asyncio event loop in a background thread. Every
+device answers reads of coils, discrete inputs, holding and input
+registers from address 0 up to --registers.
+
+Responses can be delayed by a fixed latency plus random jitter, and a
+fraction of requests can be dropped (the client times out) or answered
+with a Slave Device Busy exception. The random numbers are seeded, so a
+run with the same settings injects the same errors.
+
+The farm can write a register map pointing at its devices, which
+ModConnect and the benchmarks can load directly.
+
+Usage:
+    python benchmarks/simulator.py --tcp 10 --rtu 2 --slaves 4 --latency-ms 5 --jitter-ms 2 --config farm.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import logging
+import asyncio
+import argparse
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from pymodbus.factory import ServerDecoder
+from pymodbus.pdu import ModbusExceptions
+from pymodbus.framer.rtu_framer import ModbusRtuFramer
+from pymodbus.framer.socket_framer import ModbusSocketFramer
+from pymodbus.datastore import ModbusSlaveContext, ModbusSequentialDataBlock
+from constants import SLAVE_ADDRESS, DEVICE_NAME, DEFAULT_METHOD, HIDDEN_STATUS, \
+        CONNECTION_PARAMETERS, RTU_PARAMETERS, TCP_PARAMETERS, HOST, PORT, \
+        SERIAL_PORT, BAUD_RATE, PARITY, STOP_BITS, BYTESIZE, TIMEOUT, \
+        REGISTERS, FUNCTION_CODE, REGISTER_TEMPLATE, TCP_METHOD, RTU_METHOD, \
+        SCAN_CLASS, SCAN_CLASS_ITEMS, DEFAULT_SCAN_CLASS
+
+
+def create_slave_context(registers):
+    """Returns a datastore whose registers hold their own address and whose coils alternate."""
+    size = registers + 1
+    return ModbusSlaveContext(
+        co=ModbusSequentialDataBlock(0, [address % 2 for address in range(size)]),
+        di=ModbusSequentialDataBlock(0, [(address + 1) % 2 for address in range(size)]),
+        hr=ModbusSequentialDataBlock(0, [address % 65536 for address in range(size)]),
+        ir=ModbusSequentialDataBlock(0, [address % 65536 for address in range(size)]),
+        zero_mode=True,
+    )
+
+
+class SimulatorFarm:
+    """
+    Serves simulated Modbus TCP devices and RTU buses from a background thread.
+
+    Call start() before polling and stop() when done. tcp_ports and
+    serial_ports list the endpoints once started.
+    """
+
+    def __init__(self, tcp_devices=1, rtu_buses=0, slaves_per_bus=1, registers=100, host="127.0.0.1",
+                 base_port=5020, latency_ms=0.0, jitter_ms=0.0, drop_rate=0.0, error_rate=0.0, seed=0):
+        """
+        args:
+            tcp_devices (int): The number of Modbus TCP servers, one device each.
+            rtu_buses (int): The number of pseudo-terminal RTU buses.
+            slaves_per_bus (int): The number of slaves on each RTU bus, addresses 1 and up.
+            registers (int): The number of registers of each function code every device has.
+            host (str): The address the TCP servers listen on.
+            base_port (int): The port of the first TCP server; the others follow it.
+            latency_ms (float): How long every response is delayed.
+            jitter_ms (float): The most the delay varies around latency_ms, up or down.
+            drop_rate (float): The fraction of requests that get no response.
+            error_rate (float): The fraction of requests answered with a Slave Device Busy exception.
+            seed (int): Seeds the jitter and the injected errors.
+        """
+        self.tcp_devices = tcp_devices
+        self.rtu_buses = rtu_buses
+        self.slaves_per_bus = slaves_per_bus
+        self.registers = registers
+        self.host = host
+        self.base_port = base_port
+        self.latency_s = latency_ms / 1000
+        self.jitter_s = jitter_ms / 1000
+        self.drop_rate = drop_rate
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+
+        self.tcp_ports = []
+        self.serial_ports = []
+        self.requests = 0
+        self._servers = []
+        self._writers = set()
+        self._pty_fds = []
+        self._loop = None
+        self._thread = None
+        self._ready = threading.Event()
+        self._error = None
+
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def start(self, timeout=10):
+        """Starts serving and returns once every device is listening."""
+        self._thread = threading.Thread(target=self._run, name="SimulatorFarm", daemon=True)
+        self._thread.start()
+        if not self._ready.wait(timeout):
+            raise RuntimeError("The simulator farm did not start in time")
+        if self._error is not None:
+            raise self._error
+
+
+    def stop(self):
+        loop = self._loop
+        if loop is not None and loop.is_running():
+            loop.call_soon_threadsafe(loop.stop)
+            self._thread.join()
+        for fd in self._pty_fds:
+            os.close(fd)
+        self._pty_fds.clear()
+
+
+    def register_map(self, registers=None, function_code=3, scan_class=DEFAULT_SCAN_CLASS, timeout_s=1) -> dict:
+        """
+        Returns a register map with one device per simulated device, for FileHandler.
+
+        args:
+            registers (int): The number of registers each device reads, from address 0. All of them if None.
+            function_code (int): The function code of every register.
+            scan_class (str): The scan class of every register, which limits how often it is read.
+            timeout_s (int): The serial timeout of the RTU devices.
+        """
+        count = self.registers if registers is None else min(registers, self.registers)
+        register_entries = {}
+        for address in range(count):
+            register = dict(REGISTER_TEMPLATE)
+            register[FUNCTION_CODE] = function_code
+            register[SCAN_CLASS] = scan_class
+            register_entries[str(address)] = register
+
+        devices = []
+        for port in self.tcp_ports:
+            devices.append(("1", TCP_METHOD, {HOST: self.host, PORT: port}, f"TCP {port}"))
+        for path in self.serial_ports:
+            for slave in range(1, self.slaves_per_bus + 1):
+                devices.append((str(slave), RTU_METHOD, {
+                    SERIAL_PORT: path, BAUD_RATE: "115200", PARITY: "N", STOP_BITS: "1",
+                    BYTESIZE: "8", TIMEOUT: str(timeout_s),
+                }, f"RTU {os.path.basename(path)} slave {slave}"))
+
+        data = {}
+        for tag, (slave_address, method, params, name) in enumerate(devices, start=1):
+            data[f"device_{tag}"] = {
+                SLAVE_ADDRESS: slave_address,
+                DEVICE_NAME: name,
+                DEFAULT_METHOD: method,
+                HIDDEN_STATUS: False,
+                CONNECTION_PARAMETERS: {
+                    RTU_PARAMETERS: params if method == RTU_METHOD else {},
+                    TCP_PARAMETERS: params if method == TCP_METHOD else {},
+                },
+                REGISTERS: dict(register_entries),
+            }
+        return data
+
+
+    def write_register_map(self, path, registers=None, function_code=3, scan_class=DEFAULT_SCAN_CLASS, timeout_s=1):
+        """Writes register_map() to a file."""
+        with open(path, "w") as file:
+            json.dump(self.register_map(registers, function_code, scan_class, timeout_s), file, indent=4)
+
+
+    # ------------------------------------------------------------------
+    # Event loop thread
+    # ------------------------------------------------------------------
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_until_complete(self._start_servers())
+        except Exception as e:
+            self._error = e
+            self._ready.set()
+            return
+        self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            for server in self._servers:
+                server.close()
+            for fd in self._pty_fds:
+                self._loop.remove_reader(fd)
+            # End the open TCP connections. Closing them lets their handlers return normally;
+            # a handler cancelled while reading makes asyncio print a traceback.
+            for writer in list(self._writers):
+                writer.close()
+            tasks = asyncio.all_tasks(self._loop)
+            if tasks:
+                self._loop.run_until_complete(asyncio.wait(tasks, timeout=1))
+            for task in tasks:
+                task.cancel()
+            self._loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            self._loop.close()
+
+
+    async def _start_servers(self):
+        for index in range(self.tcp_devices):
+            port = self.base_port + index
+            context = create_slave_context(self.registers)
+            server = await asyncio.start_server(
+                lambda reader, writer, context=context: self._serve_tcp(reader, writer, context),
+                self.host, port
+            )
+            self._servers.append(server)
+            self.tcp_ports.append(port)
+
+        for _ in range(self.rtu_buses):
+            self._open_rtu_bus()
+
+
+    def _open_rtu_bus(self):
+        import tty   # Unix only, so TCP devices can be simulated on every platform
+        master, slave = os.openpty()
+        # No echo or line editing, so the bus carries only Modbus frames
+        tty.setraw(slave)
+        self._pty_fds.extend((master, slave))
+        self.serial_ports.append(os.ttyname(slave))
+
+        contexts = {slave_id: create_slave_context(self.registers) for slave_id in range(1, self.slaves_per_bus + 1)}
+        framer = ModbusRtuFramer(ServerDecoder())
+
+        def on_request(request):
+            response = self._respond(request, contexts[request.slave_id])
+            if response is not None:
+                self._send_later(lambda: os.write(master, framer.buildPacket(response)))
+
+        def on_readable():
+            try:
+                data = os.read(master, 4096)
+            except OSError:
+                return
+            framer.processIncomingPacket(data, on_request, slave=list(contexts))
+
+        self._loop.add_reader(master, on_readable)
+
+
+    async def _serve_tcp(self, reader, writer, context):
+        framer = ModbusSocketFramer(ServerDecoder())
+
+        def on_request(request):
+            response = self._respond(request, context)
+            if response is not None:
+                self._send_later(lambda: writer.is_closing() or writer.write(framer.buildPacket(response)))
+
+        self._writers.add(writer)
+        try:
+            while True:
+                data = await reader.read(4096)
+                if not data:
+                    break
+                framer.processIncomingPacket(data, on_request, slave=[0], single=True)
+        except ConnectionError:
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+
+    def _respond(self, request, context):
+        """Returns the response to a request, or None to drop it."""
+        self.requests += 1
+        draw = self.random.random()
+        if draw < self.drop_rate:
+            return None
+        if draw < self.drop_rate + self.error_rate:
+            response = request.doException(ModbusExceptions.SlaveBusy)
+        else:
+            response = request.execute(context)
+        response.transaction_id = request.transaction_id
+        response.slave_id = request.slave_id
+        return response
+
+
+    def _send_later(self, send):
+        delay = self.latency_s
+        if self.jitter_s:
+            delay += self.random.uniform(-self.jitter_s, self.jitter_s)
+        if delay > 0:
+            self._loop.call_later(delay, send)
+        else:
+            send()
+
+
+def add_arguments(parser):
+    """Adds the simulator settings to an argument parser, shared with the benchmarks."""
+    parser.add_argument("--tcp", type=int, default=10, help="number of simulated Modbus TCP devices")
+    parser.add_argument("--rtu", type=int, default=0, help="number of simulated RTU buses on pseudo-terminals")
+    parser.add_argument("--slaves", type=int, default=1, help="slaves on every RTU bus")
+    parser.add_argument("--registers", type=int, default=100, help="registers read from every device")
+    parser.add_argument("--base-port", type=int, default=5020, help="port of the first TCP device")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="delay of every response")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="random variation of the delay, up or down")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="fraction of requests left unanswered")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with an exception")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the jitter and injected errors")
+
+
+def farm_from_arguments(args) -> SimulatorFarm:
+    return SimulatorFarm(
+        tcp_devices=args.tcp, rtu_buses=args.rtu, slaves_per_bus=args.slaves, registers=args.registers,
+        base_port=args.base_port, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        drop_rate=args.drop_rate, error_rate=args.error_rate, seed=args.seed,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_arguments(parser)
+    parser.add_argument("--config", help="write a register map of the simulated devices to this file")
+    parser.add_argument("--scan-class", choices=SCAN_CLASS_ITEMS, default=DEFAULT_SCAN_CLASS,
+                        help="scan class of the registers in the register map")
+    args = parser.parse_args()
+
+    # pymodbus logs every exception response, including the injected ones
+    logging.getLogger("pymodbus").setLevel(logging.CRITICAL)
+    farm = farm_from_arguments(args)
+    farm.start()
+    if args.config:
+        farm.write_register_map(args.config, scan_class=args.scan_class)
+    for port in farm.tcp_ports:
+        print(f"TCP device on {farm.host}:{port}")
+    for path in farm.serial_ports:
+        print(f"RTU bus on {path} with slaves 1-{farm.slaves_per_bus}")
+    print("ready", flush=True)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        farm.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+"""
+This module implements the acquisition core of one device: its Modbus
+client, compiled read plan and decoder.
+
+It has no GUI dependencies, so it is used by the headless poller and can be
+profiled and benchmarked without a QApplication.
+"""
+
+from time import perf_counter
+from pymodbus.exceptions import ConnectionException, ModbusIOException
+from file_handler import FileHandler
+from modbus_clients import ModbusTCP, ModbusRTU
+from read_planner import extract_register_patterns, ScanPlan
+from register_decoder import RegisterDecoder
+from deadband import DeadbandFilter
+from poll_stats import DeviceStats, REQUEST_TIMEOUT, request_outcome
+from adaptive_timeout import AdaptiveTimeout
+from circuit_breaker import CircuitBreaker
+from constants import TCP_METHOD, RTU_METHOD, SERIAL_PORT, TIMEOUT, DEFAULT_TCP_TIMEOUT_S
+
+
+class DeviceRegisters:
+    """
+    The compiled registers of one device: read plan, decoder and deadbands.
+
+    They are built together and replace Device.registers in a single assignment, so a read
+    that runs on a worker thread while the registers are edited uses either the old or the
+    new ones, never a mix.
+    """
+
+    def __init__(self, device_number: int, file_handler):
+        """
+        args:
+            device_number (int): The device number in the register map.
+            file_handler (FileHandler): The register map to read the registers from.
+        """
+        input_dict = file_handler.get_registers_to_read(device_number)
+        self.addresses = list(input_dict) if input_dict else []
+        self.registers_to_read = extract_register_patterns(input_dict) if input_dict else {}
+        self.max_read_gap = file_handler.get_max_read_gap(device_number)
+        self.forbidden_ranges = file_handler.get_forbidden_ranges(device_number)
+        self.scan_plan = ScanPlan(self.registers_to_read, self.max_read_gap, self.forbidden_ranges)
+        self.decoder = RegisterDecoder(file_handler.get_register_formats(device_number) or {})
+        self.deadband = DeadbandFilter(file_handler.get_deadbands(device_number) or {})
+
+
+class Device:
+    """
+    Connects to and reads one device of the register map.
+
+    read() sends the requests of the scan classes that are due and returns
+    the decoded value of every register, in table row order. read_changes()
+    returns only the values that moved by more than their deadband.
+    Every request and read is timed in self.stats, see poll_stats.DeviceStats.
+    Requests use the timeout and retries of self.timeout_policy, which adapts
+    them to the response times of the device, see adaptive_timeout. A device
+    that keeps failing is quarantined by self.breaker: read() then returns
+    nothing until a probe is due, see circuit_breaker.
+
+    Once connect() was called, a Modbus TCP device that is not connected is
+    reconnected by read() itself, spaced by the backoff of its pooled
+    connection (see tcp_pool), until disconnect() is called.
+    """
+
+    def __init__(self, device_number: int, file_handler=None):
+        """
+        args:
+            device_number (int): The device number in the register map.
+            file_handler (FileHandler): The register map to read the device from. The default register map if None.
+        """
+        self.file_handler = file_handler if file_handler is not None else FileHandler()
+        self.device_number = device_number
+        self.connected = False
+        self.auto_reconnect = False
+        self.connection = None
+        self.register_data = []
+        self.stats = DeviceStats()
+        self.breaker = CircuitBreaker()
+        self.load_settings()
+        self.update_registers_to_read()
+
+
+    def load_settings(self):
+        """
+        Loads the name, slave address and connection parameters of the device and creates its client.
+        The device must be disconnected.
+        """
+        file_handler = self.file_handler
+        self.name = file_handler.get_device_name(self.device_number) or f"Device {self.device_number}"
+        self.slave_address = file_handler.get_slave_address(self.device_number)
+        self.connection_params = file_handler.get_connection_params(self.device_number) or {}
+
+        # The GUI stores a default method when a device is shown; fall back to TCP, then RTU, until it has.
+        self.default_method = file_handler.get_default_modbus_method(self.device_number)
+        if self.default_method not in (TCP_METHOD, RTU_METHOD) or self.default_method not in self.connection_params:
+            self.default_method = next((method for method in (TCP_METHOD, RTU_METHOD) if method in self.connection_params), None)
+
+        if self.default_method == TCP_METHOD:
+            self.connection = ModbusTCP(self.device_number, file_handler)
+        elif self.default_method == RTU_METHOD:
+            self.connection = ModbusRTU(self.device_number, file_handler)
+        else:
+            self.connection = None
+
+        floor_s, ceiling_s, max_retries = file_handler.get_timeout_limits(self.device_number)
+        if ceiling_s is None:
+            if self.default_method == RTU_METHOD and self.connection_params[RTU_METHOD].get(TIMEOUT):
+                ceiling_s = float(self.connection_params[RTU_METHOD][TIMEOUT])
+            else:
+                ceiling_s = DEFAULT_TCP_TIMEOUT_S
+        self.timeout_policy = AdaptiveTimeout(floor_s, ceiling_s, max_retries)
+        self.stats.timeout = self.timeout_policy
+
+
+    def update_registers_to_read(self):
+        """
+        Compiles the read plan, decoder and deadbands of the device's registers. Call after the registers have changed.
+        Safe to call while another thread reads the device, see DeviceRegisters.
+        """
+        self.registers = DeviceRegisters(self.device_number, self.file_handler)
+        self.register_data = []
+
+
+    @property
+    def addresses(self):
+        return self.registers.addresses
+
+
+    @property
+    def registers_to_read(self):
+        return self.registers.registers_to_read
+
+
+    @property
+    def max_read_gap(self):
+        return self.registers.max_read_gap
+
+
+    @property
+    def forbidden_ranges(self):
+        return self.registers.forbidden_ranges
+
+
+    @property
+    def scan_plan(self):
+        return self.registers.scan_plan
+
+
+    @property
+    def decoder(self):
+        return self.registers.decoder
+
+
+    @property
+    def deadband(self):
+        return self.registers.deadband
+
+
+    @property
+    def client(self):
+        return self.connection.client if self.connection is not None else None
+
+
+    def connect(self) -> bool:
+        """
+        Opens the connection to the device.
+
+        returns:
+            bool: True if connected successfully or False otherwise.
+        """
+        client = self.client
+        if client is None:
+            print(f"Device {self.device_number} has no Modbus connection settings")
+            return False
+        if self.default_method == RTU_METHOD and not self.connection_params[RTU_METHOD].get(SERIAL_PORT):
+            print(f"Device {self.device_number} has no serial port")
+            return False
+        try:
+            self.connected = bool(client.connect())
+        except Exception as e:
+            print(f"Failed to connect to device {self.device_number}: {e}")
+            client.close()
+            self.connected = False
+        # Retried by reconnect() even if this attempt failed, until disconnect()
+        self.auto_reconnect = self.default_method == TCP_METHOD
+        self.breaker.reset()
+        return self.connected
+
+
+    def disconnect(self):
+        if self.client is not None:
+            self.client.close()
+        self.connected = False
+        self.auto_reconnect = False
+
+
+    def reconnect(self) -> bool:
+        """
+        Reconnects a device whose connection was lost, if it reconnects automatically
+        and the backoff delay since the last failed attempt has passed.
+
+        returns:
+            bool: True if the device is connected.
+        """
+        if self.connected:
+            return True
+        if not self.auto_reconnect:
+            return False
+        try:
+            self.connected = bool(self.client.reconnect())
+        except Exception:
+            self.connected = False
+        if self.connected:
+            self.stats.record_reconnect()
+        return self.connected
+
+
+    def read(self, now=None) -> list:
+        """
+        Reads the scan classes that are due, see read_planner.ScanPlan.
+
+        args:
+            now (float): The perf_counter time of the read, used to pick the due scan classes.
+
+        returns:
+            register_data (list): The decoded value of every register, or an empty list if not connected or quarantined.
+        """
+        return self._read(self.registers, now)
+
+
+    def _read(self, registers, now):
+        if not self.connected and not self.reconnect():
+            return []
+
+        scan_plan = registers.scan_plan
+        stats = self.stats
+        breaker = self.breaker
+
+        read_start = perf_counter()
+        if not breaker.allow(read_start):
+            return []
+        failing = breaker.failing
+
+        # Registers whose scan class is not due keep their last values.
+        requests = scan_plan.due_requests(now)
+        answered = False
+        for request in requests:
+            response = self._request(request)
+            scan_plan.store(request, response)
+            if response is not None and not response.isError():
+                answered = True
+            elif failing and not answered:
+                # A device that is not answering, or is being probed, costs one timeout per read
+                break
+
+        self.register_data = registers.decoder.decode(scan_plan.values)
+        if requests:
+            stats.record_read(perf_counter() - read_start)
+            if breaker.record(answered, read_start):
+                stats.record_quarantine()
+        if not self.connected:
+            stats.record_connection_loss()
+        return self.register_data
+
+
+    def _request(self, request):
+        """
+        Sends one compiled request, and again while it times out and retries are left.
+
+        returns:
+            The pymodbus response, or None if the device did not answer.
+        """
+        method = getattr(self.client, request.method)
+        policy = self.timeout_policy
+        stats = self.stats
+        for attempt in range(policy.retries() + 1):
+            if attempt:
+                stats.record_retry()
+            request_start = perf_counter()
+            try:
+                response = method(request.start, request.quantity, slave=self.slave_address,
+                                  timeout=policy.timeout(attempt))
+                outcome = request_outcome(response)
+            except (ModbusIOException, ConnectionException):
+                # The connection is gone, so retrying would not help
+                self.connected = False
+                stats.record_request(perf_counter() - request_start, REQUEST_TIMEOUT)
+                return None
+            seconds = perf_counter() - request_start
+            stats.record_request(seconds, outcome)
+            policy.record(seconds, outcome)
+            if outcome != REQUEST_TIMEOUT:
+                return response
+        return None
+
+
+    def read_changes(self, now=None) -> dict:
+        """
+        Reads like read() but returns only the values that moved by more than their deadband
+        since they were last returned, see deadband.DeadbandFilter.
+
+        returns:
+            changes (dict): {row: value} of the changed values. Empty if nothing changed or not connected.
+        """
+        registers = self.registers
+        register_data = self._read(registers, now)
+        return registers.deadband.changes(register_data) if register_data else {}
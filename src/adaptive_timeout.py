@@ -0,0 +1,132 @@
+"""
+This module sets the request timeout and retries of every device from the
+response times observed while polling it.
+
+A fixed timeout is either too long for a device that stopped answering,
+which then costs the whole timeout in every poll cycle, or too short for
+a slow device, which is then counted as failing although it answers.
+AdaptiveTimeout keeps the round-trip times of the last answered requests
+of one device and sets its timeout to ADAPTIVE_TIMEOUT_FACTOR times their
+ADAPTIVE_TIMEOUT_PERCENTILE, kept between a floor and a ceiling. Until
+enough requests were answered the ceiling is used.
+
+A request that timed out is sent again up to max_retries times, each time
+with twice the timeout, so a device that became slower is still read and
+its longer round-trip times raise the timeout. As in TCP (Karn's
+algorithm), the first answer after a timeout is not used as a round-trip
+time: it is not known which attempt was answered, and pymodbus waits out
+the whole timeout of a request to a slave that missed the one before. A
+device that did not answer a request and all its retries gets no more
+retries until it answers again, so it fails after one timeout per request.
+
+Round-trip times are taken by the polling thread, so on a shared serial
+bus or TCP gateway they include the wait for the other devices' requests.
+This errs towards longer timeouts; the timeout itself only applies to the
+device's own transaction.
+"""
+
+from collections import deque
+from serial import SerialBase
+from poll_stats import REQUEST_TIMEOUT
+from constants import DEFAULT_TIMEOUT_FLOOR_S, DEFAULT_TCP_TIMEOUT_S, DEFAULT_MAX_RETRIES, \
+        ADAPTIVE_TIMEOUT_PERCENTILE, ADAPTIVE_TIMEOUT_FACTOR, ADAPTIVE_TIMEOUT_WINDOW, \
+        ADAPTIVE_TIMEOUT_MIN_SAMPLES
+
+
+# Once the window of round-trip times is full, the timeout is computed again after this many new ones
+UPDATE_EVERY = 10
+
+
+def set_client_timeout(client, seconds):
+    """
+    Sets the response timeout of a pymodbus client, sync or async, for its next requests.
+    Serial clients also get it as the read timeout of their open port.
+    """
+    if client.comm_params.timeout_connect == seconds:
+        return
+    client.comm_params.timeout_connect = seconds
+    port = getattr(client, "socket", None)
+    if isinstance(port, SerialBase):
+        port.timeout = seconds
+
+
+class AdaptiveTimeout:
+    """
+    The timeout and retries of the requests of one device.
+
+    Like poll_stats.DeviceStats it is only used by the thread that reads the device.
+    """
+
+    def __init__(self, floor_s=DEFAULT_TIMEOUT_FLOOR_S, ceiling_s=DEFAULT_TCP_TIMEOUT_S,
+                 max_retries=DEFAULT_MAX_RETRIES, percentile=ADAPTIVE_TIMEOUT_PERCENTILE,
+                 factor=ADAPTIVE_TIMEOUT_FACTOR, window=ADAPTIVE_TIMEOUT_WINDOW):
+        """
+        args:
+            floor_s (float): The shortest timeout, in seconds.
+            ceiling_s (float): The longest timeout, also used until enough round-trip times are known.
+            max_retries (int): How often a request that timed out is sent again.
+            percentile (float): The fraction of round-trip times the timeout is based on.
+            factor (float): The timeout as a multiple of that round-trip time.
+            window (int): How many of the last round-trip times are kept.
+        """
+        self.floor_s = floor_s
+        self.ceiling_s = max(floor_s, ceiling_s)
+        self.max_retries = max(0, max_retries)
+        self.percentile = percentile
+        self.factor = factor
+        self.reset(window)
+
+
+    def reset(self, window=None):
+        """Forgets the round-trip times, so the ceiling is used again."""
+        self._samples = deque(maxlen=window or self._samples.maxlen)
+        self._new_samples = 0
+        self.timeout_s = self.ceiling_s
+        self.consecutive_timeouts = 0
+
+
+    def timeout(self, attempt=0) -> float:
+        """
+        Returns the timeout of an attempt at a request, in seconds. Retries wait twice as long as the attempt before.
+
+        args:
+            attempt (int): 0 for the first attempt, 1 for the first retry, and so on.
+        """
+        return min(self.ceiling_s, self.timeout_s * 2 ** attempt)
+
+
+    def retries(self) -> int:
+        """Returns how often the next request may be retried: none while the device is not answering."""
+        return 0 if self.consecutive_timeouts > self.max_retries else self.max_retries
+
+
+    def record(self, seconds, outcome):
+        """
+        Records one attempt at a request.
+
+        args:
+            seconds (float): The time from sending the request to receiving the response or giving up.
+            outcome (int): One of the poll_stats outcomes. Any answer, even a Modbus exception, is a round-trip time.
+        """
+        if outcome == REQUEST_TIMEOUT:
+            self.consecutive_timeouts += 1
+            return
+        after_timeout = self.consecutive_timeouts
+        self.consecutive_timeouts = 0
+        if after_timeout:
+            return
+        self._samples.append(seconds)
+        self._new_samples += 1
+        if len(self._samples) < self._samples.maxlen:
+            # Still learning: the timeout leaves the ceiling as soon as there are enough samples
+            if len(self._samples) >= ADAPTIVE_TIMEOUT_MIN_SAMPLES:
+                self._update()
+        elif self._new_samples >= UPDATE_EVERY:
+            self._update()
+
+
+    def _update(self):
+        self._new_samples = 0
+        samples = sorted(self._samples)
+        round_trip = samples[min(len(samples) - 1, int(self.percentile * len(samples)))]
+        self.timeout_s = min(self.ceiling_s, max(self.floor_s, round_trip * self.factor))
@@ -0,0 +1,438 @@
+"""
+This module implements an alternative polling engine that drives every
+connected device from a single asyncio event loop using the pymodbus
+async clients, instead of one QThread per device.
+
+AsyncPollCoordinator emits the same synchronized_snapshot signal as
+register_reader.PollCoordinator, or the same result signal as
+register_reader.DeviceWorker in independent mode, so MainWindow can use
+either engine.
+
+The timeout of every request comes from the device's
+adaptive_timeout.AdaptiveTimeout and is enforced with asyncio.wait_for,
+so a request that times out does not make pymodbus drop the connection
+that other devices share. The timeout set on the pymodbus clients only
+backs it up, and they do not retry by themselves.
+"""
+
+import time
+import asyncio
+import threading
+from time import perf_counter
+from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot
+from pymodbus.client import AsyncModbusTcpClient, AsyncModbusSerialClient
+from pymodbus.exceptions import ConnectionException, ModbusIOException
+from bus_manager import inter_frame_delay
+from read_planner import ScanPlan
+from poll_stats import DeviceStats, REQUEST_TIMEOUT, request_outcome
+from adaptive_timeout import AdaptiveTimeout
+from circuit_breaker import CircuitBreaker
+from constants import TCP_METHOD, RTU_METHOD, HOST, PORT, SERIAL_PORT, BAUD_RATE, \
+        PARITY, STOP_BITS, BYTESIZE, TIMEOUT, PIPELINE_WINDOW, DEFAULT_PIPELINE_WINDOW, \
+        TCP_RECONNECT_DELAY_MIN_S, TCP_RECONNECT_DELAY_MAX_S, DEFAULT_TCP_TIMEOUT_S
+
+
+async def request_with_timeout(client, timeout, method_name, *args, **kwargs):
+    """
+    Awaits a request of an async pymodbus client for at most timeout seconds.
+
+    raises:
+        ModbusIOException: If no response arrived in time.
+    """
+    try:
+        return await asyncio.wait_for(getattr(client, method_name)(*args, **kwargs), timeout)
+    except asyncio.TimeoutError:
+        # pymodbus keeps waiting for the abandoned request's response. Forget it, or a serial client,
+        # whose responses carry no transaction ID, would hand the next response to it.
+        transactions = client.transaction.transactions
+        for tid in [tid for tid, response in transactions.items() if response.done()]:
+            del transactions[tid]
+        raise ModbusIOException(f"No response within {timeout:.3f} s") from None
+
+
+class AsyncSerialLine:
+    """
+    One async serial client shared by every device on a serial port.
+
+    Requests are serialized with a lock and separated by the RTU inter-frame gap,
+    like bus_manager.SerialBus does for the threaded engine.
+    """
+
+    def __init__(self, connection_params):
+        baudrate = int(connection_params[BAUD_RATE])
+        bytesize = int(connection_params[BYTESIZE])
+        stopbits = int(connection_params[STOP_BITS])
+        parity = connection_params[PARITY]
+        self.timeout = float(connection_params[TIMEOUT])
+        self.client = AsyncModbusSerialClient(
+            connection_params[SERIAL_PORT],
+            baudrate=baudrate,
+            parity=parity,
+            stopbits=stopbits,
+            bytesize=bytesize,
+            timeout=self.timeout,
+            retries=0
+        )
+        self.inter_frame_delay = inter_frame_delay(baudrate, bytesize, parity, stopbits)
+        self.lock = asyncio.Lock()
+        self._last_frame_end = 0.0
+
+    async def execute(self, method_name, *args, timeout=None, **kwargs):
+        async with self.lock:
+            remaining = self._last_frame_end + self.inter_frame_delay - perf_counter()
+            if remaining > 0:
+                await asyncio.sleep(remaining)
+            try:
+                return await request_with_timeout(self.client, timeout or self.timeout, method_name, *args, **kwargs)
+            finally:
+                self._last_frame_end = perf_counter()
+
+
+class AsyncTcpGateway:
+    """
+    One async TCP client shared by every device at the same host and port,
+    e.g. the slaves behind a Modbus TCP gateway.
+
+    At most `window` requests of all its devices are in flight at once; the
+    others wait their turn in the order they were made, like the queue of
+    tcp_pool.TcpConnection for the threaded engine.
+    """
+
+    def __init__(self, host, port, window=DEFAULT_PIPELINE_WINDOW):
+        # pymodbus reconnects async clients itself, with the same backoff as tcp_pool
+        self.client = AsyncModbusTcpClient(host, port=port, timeout=DEFAULT_TCP_TIMEOUT_S, retries=0,
+                                           reconnect_delay=TCP_RECONNECT_DELAY_MIN_S,
+                                           reconnect_delay_max=TCP_RECONNECT_DELAY_MAX_S)
+        self.timeout = DEFAULT_TCP_TIMEOUT_S
+        self.window = max(1, window)
+        self._in_flight = None
+
+    async def execute(self, method_name, *args, timeout=None, **kwargs):
+        if self._in_flight is None:
+            # Created on first use, inside the event loop
+            self._in_flight = asyncio.Semaphore(self.window)
+        async with self._in_flight:
+            return await request_with_timeout(self.client, timeout or self.timeout, method_name, *args, **kwargs)
+
+
+class AsyncDevicePoller:
+    """
+    Reads the due scan classes of one device's ScanPlan with an async client.
+
+    For Modbus TCP devices up to pipeline_window requests are sent before
+    waiting for their responses. Modbus TCP matches each response to its
+    request by transaction ID, so a device with many chunks completes in
+    roughly one round trip instead of one round trip per chunk.
+    Serial devices always read one request at a time. Requests go through
+    the device's AsyncTcpGateway or AsyncSerialLine, shared with the other
+    devices on the same connection, or straight to its own client.
+    Their timeout and retries come from timeout_policy, and breaker
+    quarantines the device while it keeps failing, like in acquisition.Device.
+    """
+
+    def __init__(self, device_number, slave_address, scan_plan, decoder, client=None, serial_line=None,
+                 pipeline_window=DEFAULT_PIPELINE_WINDOW, deadband=None, stats=None, gateway=None,
+                 timeout_policy=None, breaker=None):
+        self.device_number = device_number
+        self.slave_address = slave_address
+        self.scan_plan = scan_plan
+        self.decoder = decoder
+        self.deadband = deadband
+        self.stats = stats if stats is not None else DeviceStats()
+        self.timeout_policy = timeout_policy if timeout_policy is not None else AdaptiveTimeout()
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self.client = client if gateway is None else gateway.client
+        self.serial_line = serial_line
+        self.gateway = gateway
+        self.pipeline_window = max(1, pipeline_window) if serial_line is None else 1
+
+    async def _request(self, method_name, *args, timeout=None, **kwargs):
+        if self.serial_line is not None:
+            return await self.serial_line.execute(method_name, *args, timeout=timeout, **kwargs)
+        if self.gateway is not None:
+            return await self.gateway.execute(method_name, *args, timeout=timeout, **kwargs)
+        return await request_with_timeout(self.client, timeout, method_name, *args, **kwargs)
+
+    async def _timed_request(self, request):
+        """
+        Sends one compiled request, and again while it times out and retries are left,
+        like acquisition.Device does. Returns the response, or None if the device did not answer.
+        """
+        policy = self.timeout_policy
+        stats = self.stats
+        for attempt in range(policy.retries() + 1):
+            if attempt:
+                stats.record_retry()
+            start = perf_counter()
+            try:
+                response = await self._request(request.method, request.start, request.quantity,
+                                               slave=self.slave_address, timeout=policy.timeout(attempt))
+                outcome = request_outcome(response)
+            except ModbusIOException:
+                response = None
+                outcome = REQUEST_TIMEOUT
+            except ConnectionException:
+                stats.record_request(perf_counter() - start, REQUEST_TIMEOUT)
+                raise
+            seconds = perf_counter() - start
+            stats.record_request(seconds, outcome)
+            policy.record(seconds, outcome)
+            if outcome != REQUEST_TIMEOUT:
+                return response
+        return None
+
+    async def _read_chunk(self, request, in_flight=None):
+        """
+        Returns the response of one compiled request, or None if the device did not answer it.
+        """
+        if in_flight is None:
+            return await self._timed_request(request)
+        async with in_flight:
+            return await self._timed_request(request)
+
+    async def read(self):
+        """
+        Executes the requests of every due scan class and returns the register values in the same order as acquisition.Device.read().
+        With a deadband filter, only the changed values are returned, as {row: value}, like acquisition.Device.read_changes().
+        Returns None while the device is quarantined.
+
+        raises:
+            ConnectionException: If the connection was lost.
+        """
+        scan_plan = self.scan_plan
+        breaker = self.breaker
+        read_start = perf_counter()
+        if not breaker.allow(read_start):
+            return None
+        failing = breaker.failing
+        read_requests = scan_plan.due_requests()
+
+        try:
+            if self.pipeline_window > 1 and len(read_requests) > 1 and not failing:
+                in_flight = asyncio.Semaphore(self.pipeline_window)
+                responses = await asyncio.gather(*(self._read_chunk(request, in_flight) for request in read_requests))
+            else:
+                responses = []
+                for request in read_requests:
+                    response = await self._read_chunk(request)
+                    responses.append(response)
+                    if failing and (response is None or response.isError()) and len(responses) == 1:
+                        # A device that is not answering, or is being probed, costs one timeout per read
+                        break
+        except ConnectionException:
+            if breaker.record(False, read_start):
+                self.stats.record_quarantine()
+            raise
+
+        for request, response in zip(read_requests, responses):
+            scan_plan.store(request, response)
+        register_data = self.decoder.decode(scan_plan.values)
+        if read_requests:
+            self.stats.record_read(perf_counter() - read_start)
+            answered = any(response is not None and not response.isError() for response in responses)
+            if breaker.record(answered, read_start):
+                self.stats.record_quarantine()
+        if self.deadband is not None:
+            return self.deadband.changes(register_data)
+        return register_data
+
+
+class AsyncPollCoordinator(QObject):
+    """
+    Polls all devices from one asyncio event loop.
+
+    Cycle flow
+    ----------
+    1. Every device's read() coroutine runs concurrently (asyncio.gather)
+    2. When all devices have returned → emit synchronized_snapshot
+    3. Sleep for the rest of the interval, or until a stop is requested
+
+    Quarantined devices (see circuit_breaker) are left out of the gather
+    and probed by a task of their own, which the cycle does not wait for.
+
+    In independent mode (intervals given) every device runs its own loop
+    instead: read → emit result → sleep for the rest of its own interval.
+
+    The event loop runs inside start(), which is connected to the started
+    signal of a QThread. request_stop() is thread-safe and makes start()
+    return, after which the QThread can quit normally.
+    """
+
+    # Same contract as PollCoordinator.synchronized_snapshot
+    synchronized_snapshot = pyqtSignal(dict, float)   # data_dict, timestamp
+    # Same contract as DeviceWorker.result (independent mode)
+    result                = pyqtSignal(int, object)   # device_number, data
+    error                 = pyqtSignal(int, str)      # device_number, message
+    # Same contract as DeviceWorker.quarantine_changed
+    quarantine_changed    = pyqtSignal(int, bool)     # device_number, quarantined
+
+    def __init__(self, devices: dict, interval_ms: int, intervals: dict = None, report_by_exception=False, stats=None):
+        """
+        Parameters
+        ----------
+        devices             : {device_number: acquisition.Device}
+        interval_ms         : target poll cycle time in milliseconds
+        intervals           : {device_number: interval_ms} to poll every device
+                              independently, or None for synchronized cycles
+        report_by_exception : emit only the values that moved by more than
+                              their deadband, like DeviceWorker
+        stats               : poll_stats.CycleStats recording every synchronized
+                              cycle, or None. Requests and reads are recorded
+                              in the stats of each device.
+        """
+        super().__init__()
+        self.interval_ms = interval_ms
+        self.stats = stats
+        self.intervals = intervals
+        self.report_by_exception = report_by_exception
+
+        # Copy everything needed from the devices now, on the GUI thread.
+        self._device_settings = []
+        for device_number, device in devices.items():
+            method = device.default_method
+            registers = device.registers
+            if report_by_exception:
+                # Used only by this coordinator while it polls. The first read passes on every value.
+                registers.deadband.reset()
+            self._device_settings.append((
+                device_number,
+                device.slave_address,
+                ScanPlan(registers.registers_to_read, registers.max_read_gap, registers.forbidden_ranges),
+                # The decoder holds no state, so it can be shared with the device
+                registers.decoder,
+                method,
+                device.connection_params.get(method, {}),
+                registers.deadband if report_by_exception else None,
+                device.stats,
+                device.timeout_policy,
+                device.breaker,
+            ))
+
+        self._loop = None
+        self._wake_up = None
+        self._stop_flag = threading.Event()
+
+    # ------------------------------------------------------------------
+    # Public API (thread-safe)
+    # ------------------------------------------------------------------
+
+    def request_stop(self):
+        """Call from any thread; ends the event loop after the current cycle."""
+        self._stop_flag.set()
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            try:
+                loop.call_soon_threadsafe(self._wake_up.set)
+            except RuntimeError:
+                pass
+
+    # ------------------------------------------------------------------
+    # Event loop
+    # ------------------------------------------------------------------
+
+    @pyqtSlot()
+    def start(self):
+        """Connected to the coordinator thread's started signal. Blocks until stopped."""
+        asyncio.run(self._run())
+
+    def _create_pollers(self):
+        serial_lines = {}
+        gateways = {}
+        pollers = []
+        for device_number, slave_address, scan_plan, decoder, method, params, deadband, stats, timeout_policy, \
+                breaker in self._device_settings:
+            if method == TCP_METHOD:
+                pipeline_window = int(params.get(PIPELINE_WINDOW, DEFAULT_PIPELINE_WINDOW))
+                # Devices at the same host and port share one client. The gateway keeps
+                # the smallest pipeline window of its devices, since it serves them all.
+                key = (params[HOST], int(params[PORT]))
+                gateway = gateways.get(key)
+                if gateway is None:
+                    gateway = gateways[key] = AsyncTcpGateway(*key, window=pipeline_window)
+                gateway.window = min(gateway.window, max(1, pipeline_window))
+                pollers.append(AsyncDevicePoller(device_number, slave_address, scan_plan, decoder, gateway=gateway,
+                                                 pipeline_window=pipeline_window, deadband=deadband, stats=stats,
+                                                 timeout_policy=timeout_policy, breaker=breaker))
+            elif method == RTU_METHOD:
+                port = params[SERIAL_PORT]
+                if port not in serial_lines:
+                    serial_lines[port] = AsyncSerialLine(params)
+                pollers.append(AsyncDevicePoller(device_number, slave_address, scan_plan, decoder,
+                                                 serial_line=serial_lines[port], deadband=deadband, stats=stats,
+                                                 timeout_policy=timeout_policy, breaker=breaker))
+        clients = [gateway.client for gateway in gateways.values()]
+        clients.extend(line.client for line in serial_lines.values())
+        return pollers, clients
+
+    async def _read_device(self, poller, results):
+        was_quarantined = poller.breaker.quarantined
+        try:
+            data = await poller.read()
+            if data is not None and (data or poller.deadband is None):
+                results[poller.device_number] = data
+        except ConnectionException:
+            poller.stats.record_connection_loss()
+            self.error.emit(poller.device_number, "Connection lost")
+        except Exception as e:
+            self.error.emit(poller.device_number, str(e))
+        if was_quarantined != poller.breaker.quarantined:
+            self.quarantine_changed.emit(poller.device_number, poller.breaker.quarantined)
+
+    async def _wait(self, start, interval_ms):
+        """Sleeps for the rest of an interval that began at start, or until a stop is requested."""
+        elapsed_ms = (perf_counter() - start) * 1000
+        next_ms = max(0, interval_ms - elapsed_ms)
+        try:
+            await asyncio.wait_for(self._wake_up.wait(), timeout=next_ms / 1000)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _poll_device(self, poller, interval_ms):
+        """Independent mode: polls one device at its own interval."""
+        poller.stats.cycles.reset(interval_ms)
+        while not self._stop_flag.is_set():
+            start = perf_counter()
+            results = {}
+            await self._read_device(poller, results)
+            poller.stats.cycles.record(start, perf_counter() - start)
+            if poller.device_number in results:
+                self.result.emit(poller.device_number, results[poller.device_number])
+            await self._wait(start, interval_ms)
+
+    async def _run(self):
+        self._loop = asyncio.get_running_loop()
+        self._wake_up = asyncio.Event()
+        if self._stop_flag.is_set():
+            return
+
+        pollers, clients = self._create_pollers()
+        await asyncio.gather(*(client.connect() for client in clients), return_exceptions=True)
+        probes = {}
+
+        try:
+            if self.intervals is not None:
+                await asyncio.gather(*(
+                    self._poll_device(poller, self.intervals.get(poller.device_number, self.interval_ms))
+                    for poller in pollers
+                ))
+            while not self._stop_flag.is_set():
+                cycle_start = perf_counter()
+                results = {}
+                in_cycle = []
+                for poller in pollers:
+                    if not poller.breaker.quarantined:
+                        in_cycle.append(poller)
+                    elif poller not in probes or probes[poller].done():
+                        # Probed outside the cycle, so a probe does not hold up the other devices.
+                        # A device that recovers is read again from the next cycle.
+                        probes[poller] = asyncio.ensure_future(self._read_device(poller, {}))
+                await asyncio.gather(*(self._read_device(poller, results) for poller in in_cycle))
+                if self.stats is not None:
+                    self.stats.record(cycle_start, perf_counter() - cycle_start)
+                self.synchronized_snapshot.emit(results, time.time())
+                await self._wait(cycle_start, self.interval_ms)
+        finally:
+            for probe in probes.values():
+                probe.cancel()
+            for client in clients:
+                client.close()
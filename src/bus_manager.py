@@ -0,0 +1,247 @@
+"""
+This module shares one serial client between all Modbus RTU slaves on the
+same physical port.
+
+Every device on an RS485 line talks through the same SerialBus. Requests
+from all devices are queued and executed one at a time, in the order they
+were submitted, by the bus's own thread. The bus also waits for the RTU
+inter-frame gap (3.5 character times) between transactions so that
+back-to-back requests to different slaves are framed correctly.
+"""
+
+import queue
+import threading
+from time import perf_counter, sleep
+from concurrent.futures import Future
+from pymodbus.client import ModbusSerialClient
+from adaptive_timeout import set_client_timeout
+from constants import RTU_METHOD
+
+
+# Above 19200 baud the Modbus specification uses a fixed 1.75 ms inter-frame gap.
+FIXED_INTER_FRAME_BAUD_RATE = 19200
+FIXED_INTER_FRAME_DELAY = 0.00175
+
+# Client methods that result in a transaction on the bus.
+REQUEST_METHODS = (
+    "read_coils",
+    "read_discrete_inputs",
+    "read_holding_registers",
+    "read_input_registers",
+    "write_coil",
+    "write_register",
+    "write_coils",
+    "write_registers",
+)
+
+
+def inter_frame_delay(baudrate, bytesize=8, parity='N', stopbits=1) -> float:
+    """
+    Returns the silent interval (3.5 character times) required between two RTU frames.
+
+    arguments:
+        baudrate (int): The line speed in bits per second.
+        bytesize (int): Data bits per character.
+        parity (str): 'N' for no parity, anything else adds a parity bit.
+        stopbits (float): Stop bits per character.
+
+    returns:
+        delay (float): The delay in seconds.
+    """
+    if baudrate > FIXED_INTER_FRAME_BAUD_RATE:
+        return FIXED_INTER_FRAME_DELAY
+    bits_per_character = 1 + bytesize + (0 if parity == 'N' else 1) + stopbits
+    return 3.5 * bits_per_character / baudrate
+
+
+class SerialBus:
+    """
+    Owns the serial client of one physical port and executes every request
+    made on that port through a single ordered queue.
+    """
+
+    def __init__(self, port, baudrate, parity, stopbits, bytesize, timeout):
+        self.port = port
+        self.settings = (baudrate, parity, stopbits, bytesize)
+        self.timeout = timeout
+        self.client = ModbusSerialClient(
+            method=RTU_METHOD,
+            port=port,
+            baudrate=baudrate,
+            parity=parity,
+            stopbits=stopbits,
+            bytesize=bytesize,
+            timeout=timeout
+        )
+        self.inter_frame_delay = inter_frame_delay(baudrate, bytesize, parity, stopbits)
+
+        self._requests = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._users = set()
+        self._last_frame_end = 0.0
+
+
+    def submit(self, method_name, *args, **kwargs) -> Future:
+        """
+        Queues a client call and returns a future for its result.
+
+        arguments:
+            method_name (str): Name of the ModbusSerialClient method, e.g. 'read_holding_registers'.
+            args, kwargs: The arguments passed to that method. A 'timeout' keyword sets the response
+                timeout of this call only, in seconds; the timeout of the port is used otherwise.
+
+        returns:
+            future (Future): Resolves to the pymodbus response or raises the client's exception.
+        """
+        future = Future()
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"SerialBus {self.port}", daemon=True)
+                self._thread.start()
+        self._requests.put((future, method_name, args, kwargs))
+        return future
+
+
+    def execute(self, method_name, *args, **kwargs):
+        """
+        Queues a client call and blocks until the bus has executed it.
+        """
+        return self.submit(method_name, *args, **kwargs).result()
+
+
+    def _run(self):
+        """
+        Runs on the bus thread. Executes queued requests one at a time.
+        """
+        while True:
+            item = self._requests.get()
+            if item is None:
+                # Stopped by close()
+                return
+            future, method_name, args, kwargs = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            set_client_timeout(self.client, kwargs.pop("timeout", None) or self.timeout)
+            # Respect the silent interval since the end of the previous frame.
+            remaining = self._last_frame_end + self.inter_frame_delay - perf_counter()
+            if remaining > 0:
+                sleep(remaining)
+            try:
+                future.set_result(getattr(self.client, method_name)(*args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                self._last_frame_end = perf_counter()
+
+
+    def open(self, user) -> bool:
+        """
+        Registers a device as a user of the bus and opens the port if needed.
+
+        arguments:
+            user (object): The object using the bus, usually a BusClient.
+
+        returns:
+            bool: True if the port is open.
+        """
+        with self._lock:
+            self._users.add(user)
+        if self.client.is_socket_open():
+            return True
+        return self.execute("connect")
+
+
+    def release(self, user):
+        """
+        Removes a device from the bus and closes the port once no device uses it.
+        """
+        with self._lock:
+            self._users.discard(user)
+            if self._users:
+                return
+        self.execute("close")
+
+
+    def close(self):
+        """
+        Stops the bus thread once it has executed the queued requests, and closes the port.
+        """
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None:
+            self._requests.put(None)
+            thread.join()
+        self.client.close()
+
+
+    def is_open(self) -> bool:
+        return self.client.is_socket_open()
+
+
+    def in_use(self) -> bool:
+        with self._lock:
+            return bool(self._users)
+
+
+class BusClient:
+    """
+    Stands in for a ModbusSerialClient for a single device.
+
+    It exposes the client methods used by the rest of the application, but
+    routes them through the shared SerialBus of the device's port.
+    """
+
+    def __init__(self, bus):
+        self.bus = bus
+
+
+    def connect(self) -> bool:
+        return self.bus.open(self)
+
+
+    def close(self):
+        self.bus.release(self)
+
+
+    def is_socket_open(self) -> bool:
+        return self.bus.is_open()
+
+
+    def __getattr__(self, name):
+        if name in REQUEST_METHODS:
+            return lambda *args, **kwargs: self.bus.execute(name, *args, **kwargs)
+        raise AttributeError(name)
+
+
+class SerialBusManager:
+    """
+    Keeps one SerialBus per serial port.
+    """
+
+    _buses = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_client(cls, port, baudrate, parity, stopbits, bytesize, timeout) -> BusClient:
+        """
+        Returns a client for a device on a serial port, sharing the port's bus with other devices.
+
+        While a port is open, the port settings of the device that opened it are kept
+        and a warning is printed if another device asks for different settings.
+        """
+        settings = (baudrate, parity, stopbits, bytesize)
+        with cls._lock:
+            bus = cls._buses.get(port)
+            if bus is not None and bus.settings != settings:
+                if bus.in_use():
+                    print(f"Serial port {port} is already in use with settings {bus.settings}; ignoring {settings}")
+                else:
+                    # Stop the old bus so the port can be opened again with the new settings
+                    bus.close()
+                    bus = None
+            if bus is None:
+                bus = SerialBus(port, baudrate, parity, stopbits, bytesize, timeout)
+                cls._buses[port] = bus
+        return BusClient(bus)
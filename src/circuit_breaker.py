@@ -0,0 +1,114 @@
+"""
+This module takes devices that keep failing out of the poll cycle.
+
+Without it, a device that no longer answers is read at the full poll rate
+and costs a timeout on every request of every cycle, which delays the
+synchronized snapshot of all the healthy devices.
+
+Every device has a CircuitBreaker with three states:
+
+    closed      The device is read in every cycle. After
+                CIRCUIT_FAILURE_THRESHOLD reads in a row in which no request
+                was answered, the breaker opens. A read after one that was
+                not answered stops at the first request the device does not
+                answer, so the failing reads cost one timeout each.
+    open        The device is quarantined: reads return at once without
+                sending anything, until its probe is due.
+    half open   The next read is a probe, which also stops at the first
+                request the device does not answer. If any request is answered
+                the breaker closes and the device is back in the cycle;
+                otherwise it opens again and the next probe waits twice
+                as long, from CIRCUIT_PROBE_DELAY_MIN_S up to
+                CIRCUIT_PROBE_DELAY_MAX_S.
+
+Modbus exception responses count as unanswered here, since they carry no
+values either.
+"""
+
+from tcp_pool import backoff_delay
+from constants import CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_PROBE_DELAY_MIN_S, CIRCUIT_PROBE_DELAY_MAX_S
+
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half open"
+
+
+class CircuitBreaker:
+    """
+    The circuit breaker of one device.
+
+    Like poll_stats.DeviceStats it is only used by the thread that reads the device.
+    """
+
+    def __init__(self, failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+                 probe_delay_min_s=CIRCUIT_PROBE_DELAY_MIN_S, probe_delay_max_s=CIRCUIT_PROBE_DELAY_MAX_S):
+        """
+        args:
+            failure_threshold (int): The number of failed reads in a row that opens the breaker.
+            probe_delay_min_s (float): The delay before the first probe, in seconds.
+            probe_delay_max_s (float): The longest delay between probes, in seconds.
+        """
+        self.failure_threshold = max(1, failure_threshold)
+        self.probe_delay_min_s = probe_delay_min_s
+        self.probe_delay_max_s = probe_delay_max_s
+        self.reset()
+
+
+    def reset(self):
+        """Closes the breaker and forgets the failures."""
+        self.state = CIRCUIT_CLOSED
+        self.failures = 0
+        self.failed_probes = 0
+        self._next_probe = 0.0
+
+
+    @property
+    def quarantined(self) -> bool:
+        """True while the device is out of the poll cycle, i.e. the breaker is open or half open."""
+        return self.state != CIRCUIT_CLOSED
+
+
+    @property
+    def failing(self) -> bool:
+        """True if the last read was not answered, which includes every probe. Such a read stops at the first failed request."""
+        return self.failures > 0
+
+
+    def allow(self, now) -> bool:
+        """
+        Returns whether the device may be read now. An open breaker becomes half open once its probe is due.
+
+        args:
+            now (float): The perf_counter time of the read.
+        """
+        if self.state == CIRCUIT_OPEN:
+            if now < self._next_probe:
+                return False
+            self.state = CIRCUIT_HALF_OPEN
+        return True
+
+
+    def record(self, answered, now) -> bool:
+        """
+        Records the outcome of one read.
+
+        args:
+            answered (bool): True if the device answered at least one request of the read.
+            now (float): The perf_counter time of the read.
+
+        returns:
+            bool: True if this read took the device out of the poll cycle.
+        """
+        if answered:
+            self.reset()
+            return False
+        self.failures += 1
+        tripped = self.state == CIRCUIT_CLOSED
+        if self.state == CIRCUIT_HALF_OPEN:
+            self.failed_probes += 1
+        elif self.failures < self.failure_threshold:
+            return False
+        self.state = CIRCUIT_OPEN
+        self._next_probe = now + backoff_delay(self.failed_probes + 1, self.probe_delay_min_s, self.probe_delay_max_s)
+        return tripped
@@ -0,0 +1,367 @@
+"""
+This module keeps the register map file in memory.
+
+The json file is parsed once and shared by every FileHandler instance that
+points at the same path. The cached data is invalidated when the file's
+modification time or size changes on disk, or when reload() is called.
+
+Edits are written behind: save() only marks the data as dirty and a background
+thread writes the file once the save window has elapsed, so a burst of edits
+costs a single write. Files are replaced atomically through a temporary file.
+
+The store also indexes device keys by their integer tag so that tag lookups
+and allocation of new tags do not scan the whole register map.
+"""
+
+import os
+import re
+import json
+import stat
+import time
+import atexit
+import tempfile
+import threading
+from contextlib import contextmanager
+from constants import SAVE_DELAY_MS
+
+
+# Read once at import: os.umask() can only be read by setting it, which is not safe once threads run
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+class ConfigStore:
+    """
+    A shared, in-memory copy of the register map file.
+
+    Use ConfigStore.instance(file_path) rather than the constructor so that
+    all FileHandler objects share a single parsed copy of the same file.
+    """
+
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    @classmethod
+    def instance(cls, file_path):
+        """
+        Returns the shared store for a file path, creating it on first use.
+
+        arguments:
+            file_path (str): Path to the json register map file.
+
+        returns:
+            ConfigStore: The store associated with the file path.
+        """
+        key = os.path.abspath(str(file_path))
+        with cls._instances_lock:
+            store = cls._instances.get(key)
+            if store is None:
+                store = cls(key)
+                cls._instances[key] = store
+            return store
+
+
+    def __init__(self, file_path, save_delay_ms=SAVE_DELAY_MS):
+        self.file_path = file_path
+        self.save_delay = save_delay_ms / 1000
+        self._lock = threading.RLock()
+        self._data = None
+        self._signature = None
+
+        # Device tag index: {device key: tag}, plus the tags available for reuse.
+        self._tags = {}
+        self._free_tags = []
+        self._next_tag = 1
+
+        # Write-behind state
+        self._dirty = False
+        self._writing = False
+        self._write_lock = threading.Lock()
+        self._flush_requested = threading.Condition(self._lock)
+        self._writer_thread = None
+        atexit.register(self.flush)
+
+
+    def _file_signature(self):
+        """
+        Returns a (mtime, size) tuple identifying the file's current version, or None if the file is missing.
+        """
+        try:
+            stat = os.stat(self.file_path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+
+    def _load(self, signature):
+        data = {}
+        if signature is not None:
+            try:
+                with open(self.file_path, 'r') as file:
+                    content = file.read()
+                if content:
+                    data = json.loads(content)
+            except FileNotFoundError:
+                print("File not found")
+            except json.decoder.JSONDecodeError as e:
+                print(f"Error decoding: {e}")
+        self._data = data
+        self._signature = signature
+        self._build_index()
+
+
+    def _build_index(self):
+        """
+        Rebuilds the device tag index. This is the only place that walks every device key.
+        """
+        self._tags = {}
+        for key in self._data:
+            match = re.search(r'\d+', key)
+            if match:
+                self._tags[key] = int(match.group())
+        used_tags = set(self._tags.values())
+        self._next_tag = max(used_tags, default=0) + 1
+        # Reversed so that pop() hands out the lowest numbers first.
+        self._free_tags = sorted(set(range(1, self._next_tag)) - used_tags, reverse=True)
+
+
+    def get_data(self) -> dict:
+        """
+        Returns the cached register map, re-reading the file only if it has changed on disk.
+
+        The returned dictionary is shared. Callers that mutate it must do so inside mutate() and call save().
+
+        returns:
+            data (dict): The register map or an empty dictionary if no data is available.
+        """
+        with self._lock:
+            # Unsaved edits are newer than whatever is on disk.
+            if self._dirty or self._writing:
+                return self._data
+            signature = self._file_signature()
+            if self._data is None or signature != self._signature:
+                self._load(signature)
+            return self._data
+
+
+    @contextmanager
+    def mutate(self):
+        """
+        Holds the data lock while the caller edits the cached register map in place, so the
+        background writer never serializes a half-applied edit. Call save() before leaving.
+
+        Usage:
+            with store.mutate() as data:
+                data[key][name] = value
+                store.save()
+        """
+        with self._lock:
+            yield self.get_data()
+
+
+    def reload(self) -> dict:
+        """
+        Discards the cached data and parses the file again.
+
+        Pending edits are written first so they are not lost.
+        """
+        self.flush()
+        with self._lock:
+            self._load(self._file_signature())
+            return self._data
+
+
+    def replace(self, data) -> bool:
+        """
+        Replaces the cached register map with new data and schedules a write.
+
+        arguments:
+            data (dict): The complete register map.
+
+        returns:
+            bool: True once the data has been accepted.
+        """
+        with self._lock:
+            self._data = data
+            self._build_index()
+            return self.save()
+
+
+    def device_tags(self) -> list:
+        """
+        Returns the integer tags of all devices in the order they are stored.
+        """
+        with self._lock:
+            self.get_data()
+            return list(self._tags.values())
+
+
+    def device_items(self) -> list:
+        """
+        Returns a list of (tag, device data) tuples for all devices.
+        """
+        with self._lock:
+            data = self.get_data()
+            return [(tag, data[key]) for key, tag in self._tags.items()]
+
+
+    def next_free_tag(self) -> int:
+        """
+        Returns the tag that add_device() will assign next, without reserving it.
+        """
+        with self._lock:
+            self.get_data()
+            return self._free_tags[-1] if self._free_tags else self._next_tag
+
+
+    def add_device(self, prefix, device) -> int:
+        """
+        Stores a new device under the next free tag and schedules a write.
+
+        arguments:
+            prefix (str): The device key prefix, e.g. 'device_'.
+            device (dict): The device data.
+
+        returns:
+            tag (int): The tag assigned to the new device.
+        """
+        with self._lock:
+            data = self.get_data()
+            if self._free_tags:
+                tag = self._free_tags.pop()
+            else:
+                tag = self._next_tag
+                self._next_tag += 1
+            key = f'{prefix}{tag}'
+            data[key] = device
+            self._tags[key] = tag
+            self.save()
+            return tag
+
+
+    def remove_device(self, key) -> bool:
+        """
+        Removes a device, releases its tag for reuse and schedules a write.
+
+        arguments:
+            key (str): The device key, e.g. 'device_3'.
+
+        returns:
+            bool: True if the device existed and was removed or False otherwise.
+        """
+        with self._lock:
+            data = self.get_data()
+            if key not in data:
+                return False
+            del data[key]
+            tag = self._tags.pop(key, None)
+            if tag is not None:
+                self._free_tags.append(tag)
+            return self.save()
+
+
+    def save(self) -> bool:
+        """
+        Marks the cached register map as modified and schedules a write.
+
+        Every edit made within the save window is written together by the background writer.
+
+        returns:
+            bool: True once the write has been scheduled.
+        """
+        with self._lock:
+            if not self._dirty:
+                self._dirty = True
+                self._flush_requested.notify()
+            if self._writer_thread is None:
+                self._writer_thread = threading.Thread(target=self._writer_loop, name="ConfigStoreWriter", daemon=True)
+                self._writer_thread.start()
+            return True
+
+
+    def flush(self) -> bool:
+        """
+        Writes pending edits to the file immediately.
+
+        returns:
+            bool: True if there was nothing to write or the write succeeded, False otherwise.
+        """
+        return self._write()
+
+
+    def _writer_loop(self):
+        """
+        Runs on the writer thread. Waits for the first edit, lets the save window elapse, then writes.
+        """
+        while True:
+            with self._lock:
+                while not self._dirty:
+                    self._flush_requested.wait()
+                # Edits made before the deadline are coalesced into this write.
+                deadline = time.monotonic() + self.save_delay
+                remaining = self.save_delay
+                while remaining > 0:
+                    self._flush_requested.wait(remaining)
+                    remaining = deadline - time.monotonic()
+            if not self._write():
+                # Do not spin on a persistent error; retry after another window.
+                with self._lock:
+                    self._flush_requested.wait(self.save_delay)
+
+
+    def _write(self) -> bool:
+        """
+        Serializes the cached data to a temporary file and atomically moves it over the register map file.
+
+        Only a compact snapshot of the data is taken under the data lock; indenting it and the file I/O do not block readers.
+        """
+        with self._write_lock:
+            with self._lock:
+                if not self._dirty:
+                    return True
+                try:
+                    # json only uses its C encoder for compact output, so the lock is held for a
+                    # compact snapshot only, which is indented for the file outside the lock.
+                    snapshot = json.dumps(self._data)
+                except TypeError as e:
+                    print(f"Error serializing data to json: {e}")
+                    return False
+                self._dirty = False
+                self._writing = True
+
+            content = json.dumps(json.loads(snapshot), indent=4)
+
+            directory = os.path.dirname(self.file_path)
+            temp_path = None
+            success = False
+            try:
+                with tempfile.NamedTemporaryFile('w', dir=directory, prefix='.register_map_', suffix='.tmp', delete=False) as file:
+                    temp_path = file.name
+                    file.write(content)
+                    file.flush()
+                    os.fsync(file.fileno())
+                # The temporary file is created private; keep the permissions of the file it replaces
+                try:
+                    mode = stat.S_IMODE(os.stat(self.file_path).st_mode)
+                except FileNotFoundError:
+                    mode = 0o666 & ~_UMASK
+                os.chmod(temp_path, mode)
+                os.replace(temp_path, self.file_path)
+                temp_path = None
+                success = True
+            except OSError as e:
+                print(f"Error Writing to file: {e}")
+            finally:
+                if temp_path is not None:
+                    try:
+                        os.remove(temp_path)
+                    except OSError:
+                        pass
+
+            with self._lock:
+                self._writing = False
+                if success:
+                    self._signature = self._file_signature()
+                else:
+                    self._dirty = True
+            return success
@@ -57,6 +57,7 @@ PARITY = 'parity'
 STOP_BITS = 'stopbits'
 BYTESIZE = 'bytesize'
 TIMEOUT = 'timeout'
+PIPELINE_WINDOW = 'pipeline_window'
 REGISTERS = 'registers'
 REGISTER_PREFIX = 'register_'
 REGISTER_ADDRESS = 'address'
@@ -66,18 +67,65 @@ FUNCTION_CODE = 'function_code'
 UNITS = 'units'
 GAIN = 'gain'
 DATA_TYPE = 'data_type'
+OFFSET = 'offset'
+BYTE_ORDER = 'byte_order'
+WORD_ORDER = 'word_order'
+STRING_LENGTH = 'string_length'
 ACCESS_TYPE = 'access_type'
 HIDDEN_STATUS = 'hidden_status'
+POLL_INTERVAL = 'poll_interval_ms'
+SCAN_CLASS = 'scan_class'
+MAX_READ_GAP = 'max_read_gap'
+FORBIDDEN_RANGES = 'forbidden_ranges'
+DEADBAND = 'deadband'
+DEADBAND_TYPE = 'deadband_type'
+TIMEOUT_FLOOR = 'timeout_floor_s'
+TIMEOUT_CEILING = 'timeout_ceiling_s'
+MAX_RETRIES = 'max_retries'
 
 
 
+# Scan classes and the interval in milliseconds at which registers of each class are read.
+# A class is read at most once per poll of its device, so classes faster than the
+# device's poll interval are read on every poll.
+SCAN_CLASSES = {
+    "Fast": 100,
+    "Normal": 1000,
+    "Slow": 10000
+}
+SCAN_CLASS_ITEMS = list(SCAN_CLASSES)
+DEFAULT_SCAN_CLASS = "Normal"
+
+
+# Data types registers of function codes 3 and 4 can be decoded as.
+# Types longer than one register also use the registers that follow.
+RAW_DATA_TYPE = "N/A"
+STRING_DATA_TYPE = "string"
+DATA_TYPE_ITEMS = [RAW_DATA_TYPE, "int16", "uint16", "int32", "uint32", "float32", "int64", "uint64", "float64", STRING_DATA_TYPE]
+
+# Byte order within a register and register (word) order within a value.
+BIG_ENDIAN = "Big"
+LITTLE_ENDIAN = "Little"
+ENDIAN_ITEMS = [BIG_ENDIAN, LITTLE_ENDIAN]
+
+# Report by exception: a value is passed on only when it moved by more than its deadband
+# since it was last passed on. Absolute deadbands are in engineering units, percent
+# deadbands are relative to the last value passed on. A deadband of 0 passes on every change.
+DEADBAND_ABSOLUTE = "Absolute"
+DEADBAND_PERCENT = "Percent"
+DEADBAND_TYPE_ITEMS = [DEADBAND_ABSOLUTE, DEADBAND_PERCENT]
+
+
 REGISTER_TEMPLATE = {
     REGISTER_NAME: "",
     FUNCTION_CODE: 0,
     UNITS: "N/A",
     GAIN: 0,
-    DATA_TYPE: "N/A",
-    ACCESS_TYPE: "R/O"
+    DATA_TYPE: RAW_DATA_TYPE,
+    ACCESS_TYPE: "R/O",
+    SCAN_CLASS: DEFAULT_SCAN_CLASS,
+    DEADBAND_TYPE: DEADBAND_ABSOLUTE,
+    DEADBAND: 0
 }
 
 # Modbus RTU settings
@@ -104,6 +152,18 @@ READ_FUNCTION_CODES = {
     "READ_INPUT_REGISTERS (04)": 4
 }
 
+# Maximum number of items a single read request may return, per function code.
+MAX_READ_QUANTITY = {
+    1: 2000,
+    2: 2000,
+    3: 125,
+    4: 125
+}
+
+# Unused registers a single read request may span to join two groups of registers.
+# 0 only merges groups that touch. Filler values are discarded.
+DEFAULT_MAX_READ_GAP = 0
+
 WRITE_FUNCTION_CODES = {
     "WRITE_SINGLE_COIL (05)": 5,
     "WRITE_SINGLE_REGISTER (06)": 6,
@@ -111,6 +171,10 @@ WRITE_FUNCTION_CODES = {
     "WRITE_MULTIPLE_REGISTERS (16)": 16
 }
 
+# Number of Modbus TCP requests a device may have in flight at once (asyncio engine).
+# 1 sends requests strictly one after another.
+DEFAULT_PIPELINE_WINDOW = 1
+
 TCP_METHOD = "tcp"
 RTU_METHOD = "rtu"
 DEFAULT_METHOD = "default_method"
@@ -123,8 +187,11 @@ CONNECT = "Connect"
 DISCONNECT = "Disconnect"
 HIDE_DEVICE = "Hide Device"
 DELETE_DEVICE = "Delete Device"
+SET_SCAN_CLASS = "Set Scan Class"
+SET_DATA_TYPE = "Set Data Type"
+SET_DEADBAND = "Set Deadband"
 
-ACTION_ITEMS = [SELECT_ACTION, ADD_REGISTERS, REMOVE_REGISTERS, CONNECT, HIDE_DEVICE, DELETE_DEVICE]
+ACTION_ITEMS = [SELECT_ACTION, ADD_REGISTERS, REMOVE_REGISTERS, CONNECT, HIDE_DEVICE, DELETE_DEVICE, SET_SCAN_CLASS, SET_DATA_TYPE, SET_DEADBAND]
 
 SELECT_ACTION_ID = 0
 ADD_REGISTERS_ID = 1
@@ -132,18 +199,95 @@ REMOVE_REGISTERS_ID = 2
 CONNECT_ID = 3
 HIDE_DEVICE_ID = 4
 DELETE_DEVICE_ID = 5
+SET_SCAN_CLASS_ID = 6
+SET_DATA_TYPE_ID = 7
+SET_DEADBAND_ID = 8
 
 
 STATUS = "status"
 WIDGET = "widget"
 
+# Polling engines selectable from the toolbar.
+POLL_ENGINE_THREADS = "Threads"
+POLL_ENGINE_ASYNCIO = "Asyncio"
+POLL_ENGINE_ITEMS = [POLL_ENGINE_THREADS, POLL_ENGINE_ASYNCIO]
+
+# Polling modes selectable from the toolbar.
+# Synchronized: every device is read once per cycle and the table is updated together.
+# Independent: every device is read on its own timer, at its own poll interval.
+POLL_MODE_SYNCHRONIZED = "Synchronized"
+POLL_MODE_INDEPENDENT = "Independent"
+POLL_MODE_ITEMS = [POLL_MODE_SYNCHRONIZED, POLL_MODE_INDEPENDENT]
+
+# Rates, in Hz, at which polled values are shown in the tables, independent of the poll rate.
+UI_REFRESH_RATE_ITEMS = ["1", "2", "5", "10", "20"]
+DEFAULT_UI_REFRESH_HZ = 5
+
+# Poll interval used when a device has none stored in the register map.
+DEFAULT_POLL_INTERVAL_MS = 1000
+MIN_POLL_INTERVAL_MS = 10
+
 CONNECTED = "Connected"
 DISCONNECTED = "Disconnected"
+QUARANTINED = "Quarantined"
 
 LIGHT_GREEN = "rgb(144, 238, 144)"
 GRAY = "rgb(219,220,220)"
+ORANGE = "rgb(255, 200, 120)"
+
+# Device tags and register lookups are indexed, so these are sanity limits
+# rather than performance limits. MAX_REGISTERS applies per device.
+MAX_DEVICES = 10000
+MAX_REGISTERS = 65536
+
+NO_COM_PORTS = "No COM ports available"
+
+# Register map persistence.
+# Edits are kept in memory and written to disk at most once per window.
+SAVE_DELAY_MS = 500
+
+# Historian, see historian.py.
+# Samples are buffered and written as one block per device at most once per
+# flush interval, or as soon as a device has HISTORIAN_BLOCK_ROWS samples.
+HISTORY_DIR = get_data_dir() / "history"
+HISTORIAN_FLUSH_S = 1.0
+HISTORIAN_BLOCK_ROWS = 1000
+HISTORIAN_QUEUE_SIZE = 10000
+
+# Exporter, see exporter.py.
+# At most EXPORT_QUEUE_SIZE samples wait for the writer thread; Parquet files are
+# written in row groups of EXPORT_CHUNK_ROWS values.
+CSV_FORMAT = "csv"
+PARQUET_FORMAT = "parquet"
+EXPORT_FORMATS = [CSV_FORMAT, PARQUET_FORMAT]
+EXPORT_QUEUE_SIZE = 1000
+EXPORT_CHUNK_ROWS = 50000
+EXPORT_FILE_FILTER = "CSV (*.csv);;Parquet (*.parquet)"
+
+# How often the Poll Statistics dialog is refreshed
+STATS_REFRESH_MS = 1000
+
+# Reconnecting lost Modbus TCP connections, see tcp_pool.py.
+# The delay between attempts doubles from the minimum up to the maximum.
+TCP_RECONNECT_DELAY_MIN_S = 0.1
+TCP_RECONNECT_DELAY_MAX_S = 30.0
 
-MAX_DEVICES = 5
-MAX_REGISTERS = 20
+# Adaptive request timeouts, see adaptive_timeout.py.
+# The timeout of a device is ADAPTIVE_TIMEOUT_FACTOR times the ADAPTIVE_TIMEOUT_PERCENTILE
+# of its last ADAPTIVE_TIMEOUT_WINDOW round-trip times, kept between its floor and ceiling.
+# The ceiling defaults to the RTU timeout of the device, or DEFAULT_TCP_TIMEOUT_S.
+DEFAULT_TIMEOUT_FLOOR_S = 0.05
+DEFAULT_TCP_TIMEOUT_S = 3.0
+DEFAULT_MAX_RETRIES = 1
+ADAPTIVE_TIMEOUT_PERCENTILE = 0.99
+ADAPTIVE_TIMEOUT_FACTOR = 2.0
+ADAPTIVE_TIMEOUT_WINDOW = 200
+ADAPTIVE_TIMEOUT_MIN_SAMPLES = 5
 
-NO_COM_PORTS = "No COM ports available"
\ No newline at end of file
+# Circuit breaker, see circuit_breaker.py.
+# A device whose last CIRCUIT_FAILURE_THRESHOLD reads were all unanswered is taken out of the
+# poll cycle and probed after CIRCUIT_PROBE_DELAY_MIN_S, then after a delay that doubles up
+# to CIRCUIT_PROBE_DELAY_MAX_S while it keeps failing.
+CIRCUIT_FAILURE_THRESHOLD = 3
+CIRCUIT_PROBE_DELAY_MIN_S = 5.0
+CIRCUIT_PROBE_DELAY_MAX_S = 60.0
@@ -1,11 +1,13 @@
 
 from file_handler import FileHandler
 from  modbus_group_boxes import RtuGroupBox, TcpGroupBox 
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtWidgets import  QPushButton,  QVBoxLayout, QLabel, QLineEdit, \
-    QDialog, QHBoxLayout, QCheckBox, QSizePolicy, QFrame, QSpacerItem
+    QDialog, QHBoxLayout, QCheckBox, QSizePolicy, QFrame, QSpacerItem, QComboBox, \
+    QTableWidget, QTableWidgetItem, QFileDialog
 
 from notifications import Notification
+from read_planner import parse_forbidden_ranges, format_forbidden_ranges
 import re
 
 
@@ -15,7 +17,13 @@ from constants import NO_COM_PORTS, SLAVE_ADDRESS, \
         TCP_PARAMETERS, DEVICE_PREFIX, BYTESIZE, \
         TIMEOUT, PARITY, STOP_BITS, BYTESIZE, \
         DEFAULT_METHOD, SERIAL_PORT, REGISTERS,\
-        TCP_METHOD, RTU_METHOD, HIDDEN_STATUS
+        TCP_METHOD, RTU_METHOD, HIDDEN_STATUS, \
+        PIPELINE_WINDOW, DEFAULT_PIPELINE_WINDOW, \
+        POLL_INTERVAL, MIN_POLL_INTERVAL_MS, \
+        SCAN_CLASS, SCAN_CLASSES, SCAN_CLASS_ITEMS, DEFAULT_SCAN_CLASS, \
+        MAX_READ_GAP, FORBIDDEN_RANGES, DATA_TYPE, GAIN, OFFSET, BYTE_ORDER, \
+        WORD_ORDER, STRING_LENGTH, DATA_TYPE_ITEMS, ENDIAN_ITEMS, DEADBAND_TYPE_ITEMS, \
+        STATS_REFRESH_MS
 
 
 
@@ -171,6 +179,7 @@ class AddNewDevice(QDialog):
             temp_port_value = int(port_value)
             tcp_client_dict[PORT] = temp_port_value
             tcp_client_dict[HOST] = ipv4_address_value
+            tcp_client_dict[PIPELINE_WINDOW] = self.modbus_tcp_group_box.get_pipeline_window()
             temp_dict = {SLAVE_ADDRESS: slave_address_value, DEVICE_NAME: device_name_value, DEFAULT_METHOD: {}, HIDDEN_STATUS: hidden_status, CONNECTION_PARAMETERS: {RTU_PARAMETERS: {}, TCP_PARAMETERS:tcp_client_dict}, REGISTERS:{}}
 
 
@@ -217,6 +226,7 @@ class AddNewDevice(QDialog):
 
             tcp_client_dict[HOST] = self.modbus_tcp_group_box.ip_address.text()
             tcp_client_dict[PORT] = self.modbus_tcp_group_box.port.text()
+            tcp_client_dict[PIPELINE_WINDOW] = self.modbus_tcp_group_box.get_pipeline_window()
 
             temp_dict = {SLAVE_ADDRESS: slave_address, DEVICE_NAME: device_name, DEFAULT_METHOD: {}, HIDDEN_STATUS: hidden_status, CONNECTION_PARAMETERS: {RTU_PARAMETERS: rtu_client_dict, TCP_PARAMETERS: tcp_client_dict}, REGISTERS:{}}
 
@@ -249,8 +259,32 @@ class EditConnection(QDialog):
         self.submit_button.clicked.connect(self.submit_user_input)
         # self.submit_button.setVisible(False)
 
+        # Interval at which this device is read in independent poll mode
+        self.poll_interval_layout = QHBoxLayout()
+        self.poll_interval_label = QLabel("Poll Interval (ms)")
+        self.poll_interval = QLineEdit(str(self.file_handler.get_poll_interval(self.device_number)))
+        self.poll_interval_layout.addWidget(self.poll_interval_label)
+        self.poll_interval_layout.addWidget(self.poll_interval)
+
+        # Unused registers a read request may span, and ranges it must never read
+        self.max_read_gap_layout = QHBoxLayout()
+        self.max_read_gap_label = QLabel("Max Read Gap")
+        self.max_read_gap = QLineEdit(str(self.file_handler.get_max_read_gap(self.device_number)))
+        self.max_read_gap_layout.addWidget(self.max_read_gap_label)
+        self.max_read_gap_layout.addWidget(self.max_read_gap)
+
+        self.forbidden_ranges_layout = QHBoxLayout()
+        self.forbidden_ranges_label = QLabel("Forbidden Ranges")
+        self.forbidden_ranges = QLineEdit(format_forbidden_ranges(self.file_handler.get_forbidden_ranges(self.device_number)))
+        self.forbidden_ranges.setPlaceholderText("e.g. 3:100-119, 4:7")
+        self.forbidden_ranges_layout.addWidget(self.forbidden_ranges_label)
+        self.forbidden_ranges_layout.addWidget(self.forbidden_ranges)
+
         self.device_setup_main_layout.addWidget(self.rtu_groupbox)
         self.device_setup_main_layout.addWidget(self.tcp_groupbox)
+        self.device_setup_main_layout.addLayout(self.poll_interval_layout)
+        self.device_setup_main_layout.addLayout(self.max_read_gap_layout)
+        self.device_setup_main_layout.addLayout(self.forbidden_ranges_layout)
         self.device_setup_main_layout.addWidget(self.submit_button)
 
         # self.device_setup_main_layout.setSizeConstraint(QVBoxLayout.SetFixedSize)  # Set size constraint
@@ -270,6 +304,7 @@ class EditConnection(QDialog):
             self.tcp_groupbox.tcp_slave_id.setText(str(self.tcp_initial_parameters[TCP_METHOD].get(SLAVE_ADDRESS)))
             self.tcp_groupbox.ip_address.setText(self.tcp_initial_parameters[TCP_METHOD].get(HOST))
             self.tcp_groupbox.port.setText(str(self.tcp_initial_parameters[TCP_METHOD].get(PORT)))
+            self.tcp_groupbox.pipeline_window.setText(str(self.tcp_initial_parameters[TCP_METHOD].get(PIPELINE_WINDOW, DEFAULT_PIPELINE_WINDOW)))
         if not RTU_METHOD in self.tcp_initial_parameters:
             self.rtu_groupbox.setVisible(False)
 
@@ -328,6 +363,7 @@ class EditConnection(QDialog):
                     device_data[device][CONNECTION_PARAMETERS][TCP_METHOD][HOST] = ip_address
                 if device_data[device][CONNECTION_PARAMETERS][TCP_METHOD][PORT] is not port:
                     device_data[device][CONNECTION_PARAMETERS][TCP_METHOD][PORT] = port
+                device_data[device][CONNECTION_PARAMETERS][TCP_METHOD][PIPELINE_WINDOW] = self.tcp_groupbox.get_pipeline_window()
 
             if RTU_METHOD in self.rtu_initial_parameters:
                 device_name = self.rtu_groupbox.rtu_custom_name.text()
@@ -359,6 +395,23 @@ class EditConnection(QDialog):
                 if device_data[device][CONNECTION_PARAMETERS][RTU_METHOD][TIMEOUT] is not timeout:
                     device_data[device][CONNECTION_PARAMETERS][RTU_METHOD][TIMEOUT] = timeout 
 
+            poll_interval = self.poll_interval.text()
+            if not poll_interval.isdigit() or int(poll_interval) < MIN_POLL_INTERVAL_MS:
+                Notification().set_warning_message("Invalid poll interval", f"Please enter a poll interval of at least {MIN_POLL_INTERVAL_MS} ms")
+                return
+            device_data[device][POLL_INTERVAL] = int(poll_interval)
+
+            max_read_gap = self.max_read_gap.text()
+            if not max_read_gap.isdigit():
+                Notification().set_warning_message("Invalid read gap", "Please enter the read gap as a positive integer or 0")
+                return
+            device_data[device][MAX_READ_GAP] = int(max_read_gap)
+
+            try:
+                device_data[device][FORBIDDEN_RANGES] = parse_forbidden_ranges(self.forbidden_ranges.text())
+            except ValueError:
+                Notification().set_warning_message("Invalid forbidden ranges", "Please enter ranges as function_code:start-end, separated by commas")
+                return
 
             if self.file_handler.save_device_data(device_data):
                 self.accept()
@@ -463,4 +516,320 @@ class DeleteRegisters(QDialog):
         if self.registers_to_delete:
             print("Registers to delete", self.registers_to_delete)
             self.file_handler.delete_registers(self.device_number, self.registers_to_delete)
-            self.accept()
\ No newline at end of file
+            self.accept()
+
+
+class RegisterSelectionDialog(QDialog):
+    """
+    A list of register checkboxes, a settings layout and Cancel/Apply buttons.
+
+    Subclasses fill self.settings_layout and implement apply(), which is
+    called with the selected register addresses.
+    """
+
+    def __init__(self, device_number, title):
+        super().__init__()
+
+        self.setWindowTitle(title)
+        self.setFixedWidth(400)
+        self.file_handler = FileHandler()
+        self.device_number = device_number
+        self.selected_registers = []
+
+        # Checkboxes
+        self.checkboxes = []
+        self.checkbox_layout = QVBoxLayout()
+
+        # Select all checkbox
+        self.select_all_checkbox = QCheckBox("Select All")
+        self.select_all_checkbox.setLayoutDirection(Qt.RightToLeft)
+        self.select_all_checkbox.stateChanged.connect(self.select_all_checkboxes)
+        self.checkbox_layout.addWidget(self.select_all_checkbox)
+
+        # Create a horizontal line
+        horizontal_line = QFrame()
+        horizontal_line.setFrameShape(QFrame.HLine)
+        horizontal_line.setFrameShadow(QFrame.Sunken)
+        self.checkbox_layout.addWidget(horizontal_line)
+        self.checkbox_layout.addSpacing(10)
+
+        # Settings applied to the selected registers
+        self.settings_layout = QVBoxLayout()
+
+        # Buttons
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.clicked.connect(self.reject)
+        self.apply_button = QPushButton("Apply")
+        self.apply_button.clicked.connect(self.on_apply_clicked)
+
+        button_layout = QHBoxLayout()
+        button_layout.addWidget(self.cancel_button)
+        button_layout.addWidget(self.apply_button)
+
+        # Main layout
+        main_layout = QVBoxLayout()
+        main_layout.addLayout(self.checkbox_layout)
+        main_layout.addSpacing(20)
+        main_layout.addLayout(self.settings_layout)
+        main_layout.addSpacing(20)
+        main_layout.addLayout(button_layout)
+
+        spacer = QSpacerItem(20, 40, vPolicy=QSizePolicy.Expanding)
+        main_layout.addItem(spacer)
+
+        self.setLayout(main_layout)
+
+
+    def add_register_checkbox(self, register, text):
+        checkbox = QCheckBox(text)
+        checkbox.setProperty('register', register)
+        checkbox.stateChanged.connect(self.add_register_to_list)
+        self.checkboxes.append(checkbox)
+        self.checkbox_layout.addWidget(checkbox)
+
+
+    def add_setting(self, label, widget):
+        layout = QHBoxLayout()
+        layout.addWidget(QLabel(label))
+        layout.addWidget(widget)
+        self.settings_layout.addLayout(layout)
+
+
+    def add_register_to_list(self, state):
+        register = self.sender().property('register')
+        if state == Qt.Checked:
+            if register not in self.selected_registers:
+                self.selected_registers.append(register)
+        elif register in self.selected_registers:
+            self.selected_registers.remove(register)
+
+
+    def select_all_checkboxes(self, state):
+        for checkbox in self.checkboxes:
+            checkbox.setChecked(state == 2)
+
+
+    def on_apply_clicked(self):
+        if self.selected_registers and self.apply(self.selected_registers):
+            self.accept()
+
+
+    def apply(self, registers) -> bool:
+        raise NotImplementedError
+
+
+class SetScanClass(RegisterSelectionDialog):
+    def __init__(self, device_number):
+        super().__init__(device_number, "Set Scan Class")
+
+        registers = self.file_handler.get_registers_to_read(self.device_number) or {}
+        for register, attributes in registers.items():
+            self.add_register_checkbox(register, f"Register {register} ({attributes[SCAN_CLASS]})")
+
+        # Scan class dropdown list
+        self.scan_class = QComboBox()
+        for scan_class in SCAN_CLASS_ITEMS:
+            self.scan_class.addItem(f"{scan_class} ({SCAN_CLASSES[scan_class]} ms)", scan_class)
+        self.scan_class.setCurrentIndex(SCAN_CLASS_ITEMS.index(DEFAULT_SCAN_CLASS))
+        self.add_setting("Scan Class", self.scan_class)
+
+
+    def apply(self, registers) -> bool:
+        return self.file_handler.set_scan_class(self.device_number, registers, self.scan_class.currentData())
+
+
+class SetDataType(RegisterSelectionDialog):
+    def __init__(self, device_number):
+        super().__init__(device_number, "Set Data Type")
+        self.notification = Notification()
+
+        formats = self.file_handler.get_register_formats(self.device_number) or {}
+        for register, attributes in formats.items():
+            self.add_register_checkbox(register, f"Register {register} ({attributes[DATA_TYPE]})")
+
+        self.data_type = QComboBox()
+        self.data_type.addItems(DATA_TYPE_ITEMS)
+        self.add_setting("Data Type", self.data_type)
+
+        self.gain = QLineEdit("1")
+        self.add_setting("Gain", self.gain)
+
+        self.offset = QLineEdit("0")
+        self.add_setting("Offset", self.offset)
+
+        self.byte_order = QComboBox()
+        self.byte_order.addItems(ENDIAN_ITEMS)
+        self.add_setting("Byte Order", self.byte_order)
+
+        self.word_order = QComboBox()
+        self.word_order.addItems(ENDIAN_ITEMS)
+        self.add_setting("Word Order", self.word_order)
+
+        # Number of registers holding a string
+        self.string_length = QLineEdit("1")
+        self.add_setting("String Registers", self.string_length)
+
+
+    def apply(self, registers) -> bool:
+        try:
+            gain = float(self.gain.text())
+            offset = float(self.offset.text())
+        except ValueError:
+            self.notification.set_warning_message("Invalid scaling", "Please enter the gain and offset as numbers")
+            return False
+        if not self.string_length.text().isdigit() or int(self.string_length.text()) < 1:
+            self.notification.set_warning_message("Invalid string length", "Please enter the number of string registers as a positive integer")
+            return False
+
+        data_format = {
+            DATA_TYPE: self.data_type.currentText(),
+            GAIN: int(gain) if gain.is_integer() else gain,
+            OFFSET: int(offset) if offset.is_integer() else offset,
+            BYTE_ORDER: self.byte_order.currentText(),
+            WORD_ORDER: self.word_order.currentText(),
+            STRING_LENGTH: int(self.string_length.text()),
+        }
+        return self.file_handler.set_data_type(self.device_number, registers, data_format)
+
+
+class SetDeadband(RegisterSelectionDialog):
+    def __init__(self, device_number):
+        super().__init__(device_number, "Set Deadband")
+        self.notification = Notification()
+
+        deadbands = self.file_handler.get_deadbands(self.device_number) or {}
+        for register, (deadband_type, deadband) in deadbands.items():
+            self.add_register_checkbox(register, f"Register {register} ({deadband_type} {deadband})")
+
+        self.deadband_type = QComboBox()
+        self.deadband_type.addItems(DEADBAND_TYPE_ITEMS)
+        self.add_setting("Deadband Type", self.deadband_type)
+
+        # 0 reports every change
+        self.deadband = QLineEdit("0")
+        self.add_setting("Deadband", self.deadband)
+
+
+    def apply(self, registers) -> bool:
+        try:
+            deadband = float(self.deadband.text())
+        except ValueError:
+            deadband = -1
+        if not deadband >= 0:
+            self.notification.set_warning_message("Invalid deadband", "Please enter the deadband as a number of 0 or more")
+            return False
+        deadband = int(deadband) if deadband.is_integer() else deadband
+        return self.file_handler.set_deadband(self.device_number, registers, self.deadband_type.currentText(), deadband)
+
+
+class PollStatsDialog(QDialog):
+    """
+    Shows the statistics of the current polling session, see poll_stats.PollStats,
+    refreshed every STATS_REFRESH_MS while open. The report can be exported as JSON.
+    """
+
+    COLUMNS = ["Requests", "Timeouts", "Errors", "Retries", "Lost", "Reconnects", "Quarantined", "Timeout (ms)",
+               "p50 (ms)", "p95 (ms)", "p99 (ms)", "Max (ms)", "Rate (Hz)", "Target (Hz)", "Overruns"]
+
+    def __init__(self, stats_source):
+        """
+        args:
+            stats_source (callable): Returns the PollStats to show, or None while nothing was polled.
+        """
+        super().__init__()
+        self.setWindowTitle("Poll Statistics")
+        self.resize(900, 300)
+        self.stats_source = stats_source
+        self.notification = Notification()
+
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+
+        self.summary_label = QLabel()
+
+        self.reset_button = QPushButton("Reset")
+        self.reset_button.clicked.connect(self.on_reset_clicked)
+        self.export_button = QPushButton("Export Report")
+        self.export_button.clicked.connect(self.on_export_clicked)
+        self.close_button = QPushButton("Close")
+        self.close_button.clicked.connect(self.accept)
+
+        button_layout = QHBoxLayout()
+        button_layout.addWidget(self.reset_button)
+        button_layout.addWidget(self.export_button)
+        button_layout.addStretch()
+        button_layout.addWidget(self.close_button)
+
+        main_layout = QVBoxLayout()
+        main_layout.addWidget(self.summary_label)
+        main_layout.addWidget(self.table)
+        main_layout.addLayout(button_layout)
+        self.setLayout(main_layout)
+
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.timeout.connect(self.refresh)
+
+
+    def refresh(self):
+        stats = self.stats_source()
+        if stats is None:
+            self.summary_label.setText("Start polling to collect statistics")
+            self.table.setRowCount(0)
+            return
+
+        report = stats.report()
+        self.summary_label.setText(f"Polling for {report['duration_s']:.0f} s")
+        rows = []
+        if "cycles" in report:
+            rows.append(("All devices", None, report["cycles"]))
+        for device_number, device_report in report["devices"].items():
+            rows.append((f"Device {device_number}", device_report, device_report.get("cycles")))
+
+        self.table.setRowCount(len(rows))
+        self.table.setVerticalHeaderLabels([row[0] for row in rows])
+        for row, (_, device_report, cycles) in enumerate(rows):
+            cells = [""] * len(self.COLUMNS)
+            if device_report is not None:
+                latency = device_report["request_latency"]
+                cells[0:8] = [device_report["requests"], device_report["timeouts"], device_report["error_responses"],
+                              device_report["retries"], device_report["connection_losses"], device_report["reconnects"],
+                              device_report["quarantines"], device_report.get("timeout_ms", "")]
+            else:
+                latency = cycles["duration"]
+            cells[8:12] = [latency.get(key, "") for key in ("p50_ms", "p95_ms", "p99_ms", "max_ms")]
+            if cycles is not None:
+                cells[12:15] = [cycles["achieved_hz"], cycles["target_hz"], cycles["overruns"]]
+            for column, value in enumerate(cells):
+                self.table.setItem(row, column, QTableWidgetItem(str(value)))
+
+
+    def on_reset_clicked(self):
+        stats = self.stats_source()
+        if stats is not None:
+            stats.reset()
+        self.refresh()
+
+
+    def on_export_clicked(self):
+        stats = self.stats_source()
+        if stats is None:
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "Export poll statistics", "", "JSON (*.json)")
+        if not path:
+            return
+        try:
+            stats.write_report(path)
+        except OSError as e:
+            self.notification.set_warning_message("Export failed", str(e))
+
+
+    def showEvent(self, event):
+        self.refresh()
+        self.refresh_timer.start(STATS_REFRESH_MS)
+        super().showEvent(event)
+
+
+    def hideEvent(self, event):
+        self.refresh_timer.stop()
+        super().hideEvent(event)
@@ -0,0 +1,80 @@
+"""
+This module implements report by exception for the values of one device.
+
+In change-only mode a poll does not pass on the full register list, only
+the rows whose value moved by more than the register's deadband since it
+was last passed on. Consumers such as the table, the historian and the
+exporters then only handle the values that changed.
+"""
+
+from constants import DEADBAND_PERCENT
+
+
+class DeadbandFilter:
+    """
+    Keeps the last value passed on for every row and filters new values against it.
+    """
+
+    def __init__(self, deadbands):
+        """
+        args:
+            deadbands (dict): {address: (deadband type, deadband)} in table row order, see FileHandler.get_deadbands().
+        """
+        # (absolute band, relative band) of every row, or None to pass on every change
+        self.bands = []
+        for deadband_type, deadband in deadbands.values():
+            if not deadband:
+                self.bands.append(None)
+            elif deadband_type == DEADBAND_PERCENT:
+                self.bands.append((0, deadband / 100))
+            else:
+                self.bands.append((deadband, 0))
+        self.size = len(self.bands)
+        self.has_bands = any(band is not None for band in self.bands)
+        self.reset()
+
+
+    def reset(self):
+        """Forgets the values passed on, so the next call to changes() passes on every row."""
+        self.reported = [None] * self.size
+
+
+    def changes(self, values) -> dict:
+        """
+        Returns the values that moved by more than their deadband since they were last passed on,
+        and remembers them as passed on.
+
+        A value that is not a number, e.g. 'Error', is passed on whenever it differs from the last one.
+
+        args:
+            values (list): The value of every row.
+
+        returns:
+            changed (dict): {row: value} of the values to pass on.
+        """
+        reported = self.reported
+        if len(values) != self.size:
+            return {}
+        if values == reported:
+            # Nothing changed, the common case for static registers
+            return {}
+
+        changed = {}
+        if not self.has_bands:
+            for row, (value, last) in enumerate(zip(values, reported)):
+                if value != last:
+                    changed[row] = value
+        else:
+            bands = self.bands
+            for row, (value, last) in enumerate(zip(values, reported)):
+                if value == last:
+                    continue
+                band = bands[row]
+                if band is not None and isinstance(value, (int, float)) and isinstance(last, (int, float)) \
+                        and abs(value - last) <= band[0] + abs(last) * band[1]:
+                    continue
+                changed[row] = value
+
+        for row, value in changed.items():
+            reported[row] = value
+        return changed
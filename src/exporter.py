@@ -0,0 +1,165 @@
+"""
+This module streams polled values to a CSV or Parquet file while polling.
+
+Every value becomes one row with timestamp, device, register and value
+columns, so full snapshots and change-only snapshots are written the same
+way. Samples are put on a bounded queue and written by a background
+thread, so polling never waits for the disk and memory use stays capped.
+
+Parquet files need the optional pyarrow package and are written in row
+groups of EXPORT_CHUNK_ROWS values. In Parquet the value column is a
+float64, null where the value is not a number (e.g. 'Error').
+"""
+
+import os
+import csv
+import queue
+import threading
+from datetime import datetime
+from constants import CSV_FORMAT, PARQUET_FORMAT, EXPORT_FORMATS, EXPORT_QUEUE_SIZE, EXPORT_CHUNK_ROWS
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+EXPORT_HEADER = ["timestamp", "device", "register", "value"]
+
+
+def export_format(path) -> str:
+    """Returns the export format matching the extension of a file path, CSV by default."""
+    extension = os.path.splitext(str(path))[1].lstrip('.').lower()
+    return extension if extension in EXPORT_FORMATS else CSV_FORMAT
+
+
+class _CsvWriter:
+    def __init__(self, path):
+        exists = os.path.isfile(path) and os.path.getsize(path) > 0
+        self.file = open(path, 'a', newline='')
+        self.writer = csv.writer(self.file)
+        if not exists:
+            self.writer.writerow(EXPORT_HEADER)
+
+    def write(self, timestamp, device_number, items):
+        time_text = datetime.fromtimestamp(timestamp).isoformat(timespec='milliseconds')
+        self.writer.writerows((time_text, device_number, address, value) for address, value in items)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class _ParquetWriter:
+    def __init__(self, path, chunk_rows):
+        self.schema = pyarrow.schema([
+            ("timestamp", pyarrow.timestamp('us')),
+            ("device", pyarrow.int32()),
+            ("register", pyarrow.int32()),
+            ("value", pyarrow.float64()),
+        ])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+        self.chunk_rows = chunk_rows
+        self._columns = ([], [], [], [])
+
+    def write(self, timestamp, device_number, items):
+        timestamps, devices, registers, values = self._columns
+        timestamp_us = int(timestamp * 1e6)
+        for address, value in items:
+            timestamps.append(timestamp_us)
+            devices.append(device_number)
+            registers.append(int(address))
+            values.append(float(value) if isinstance(value, (int, float)) else None)
+        if len(values) >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        if self._columns[0]:
+            self.writer.write_table(pyarrow.Table.from_arrays(
+                [pyarrow.array(column, type=field.type) for column, field in zip(self._columns, self.schema)],
+                schema=self.schema
+            ))
+            self._columns = ([], [], [], [])
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+class SnapshotExporter:
+    """
+    Writes polled values to a file from a background thread.
+
+    record() never blocks the poll loop. If the writer falls behind by more
+    than queue_size samples, new samples are dropped and counted in
+    self.dropped.
+    """
+
+    def __init__(self, path, file_format=None, queue_size=EXPORT_QUEUE_SIZE, chunk_rows=EXPORT_CHUNK_ROWS):
+        """
+        args:
+            path (str): The file to write. CSV files are appended to, Parquet files are replaced.
+            file_format (str): One of EXPORT_FORMATS, or None to choose by the file extension.
+            queue_size (int): The number of samples that may wait for the writer thread.
+            chunk_rows (int): The number of values per Parquet row group.
+
+        raises:
+            ValueError: If Parquet is requested and pyarrow is not installed.
+            OSError: If the file cannot be opened.
+        """
+        self.path = str(path)
+        self.file_format = file_format or export_format(path)
+        if self.file_format == PARQUET_FORMAT:
+            if pyarrow is None:
+                raise ValueError("Exporting to Parquet needs the pyarrow package")
+            self._writer = _ParquetWriter(self.path, chunk_rows)
+        else:
+            self._writer = _CsvWriter(self.path)
+        self.dropped = 0
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, name="Exporter", daemon=True)
+        self._thread.start()
+
+
+    def record(self, device_number, timestamp, addresses, values):
+        """
+        Queues one sample of a device, with the same arguments as historian.Historian.record().
+        values is either the value of every register or {row: value} of the changed values.
+        """
+        try:
+            self._queue.put_nowait((device_number, timestamp, addresses, values))
+        except queue.Full:
+            self.dropped += 1
+
+
+    def close(self):
+        """Writes every queued sample and closes the file."""
+        self._queue.put(None)
+        self._thread.join()
+
+
+    def _run(self):
+        writer = self._writer
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            device_number, timestamp, addresses, values = item
+            try:
+                if isinstance(values, dict):
+                    items = [(addresses[row], value) for row, value in values.items() if row < len(addresses)]
+                else:
+                    items = zip(addresses, values)
+                writer.write(timestamp, device_number, items)
+                if self._queue.empty():
+                    writer.flush()
+            except (OSError, ValueError) as e:
+                print(f"Failed to export to {self.path}: {e}")
+        try:
+            writer.close()
+        except OSError as e:
+            print(f"Failed to export to {self.path}: {e}")
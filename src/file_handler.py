@@ -4,15 +4,21 @@ It acts as link between the file system and other classes in their modules.
 """
 
 import os
-import json
-import re
 import copy
+from config_store import ConfigStore
 from constants import SLAVE_ADDRESS, \
         DEVICE_NAME, CONNECTION_PARAMETERS,  \
         DEVICE_PREFIX, REGISTERS, REGISTER_ADDRESS, \
         REGISTER_NAME, REGISTER_PREFIX, FILE_PATH, \
         FUNCTION_CODE, REGISTER_TEMPLATE, DEFAULT_METHOD, \
-        REGISTER_QUANTITY, MAX_DEVICES, MAX_REGISTERS, HIDDEN_STATUS, resource_path
+        REGISTER_QUANTITY, MAX_DEVICES, MAX_REGISTERS, HIDDEN_STATUS, resource_path, \
+        POLL_INTERVAL, DEFAULT_POLL_INTERVAL_MS, MIN_POLL_INTERVAL_MS, \
+        SCAN_CLASS, SCAN_CLASSES, DEFAULT_SCAN_CLASS, \
+        MAX_READ_GAP, DEFAULT_MAX_READ_GAP, FORBIDDEN_RANGES, \
+        DATA_TYPE, GAIN, OFFSET, BYTE_ORDER, WORD_ORDER, STRING_LENGTH, \
+        DATA_TYPE_ITEMS, RAW_DATA_TYPE, BIG_ENDIAN, ENDIAN_ITEMS, \
+        DEADBAND, DEADBAND_TYPE, DEADBAND_TYPE_ITEMS, DEADBAND_ABSOLUTE, \
+        TIMEOUT_FLOOR, TIMEOUT_CEILING, MAX_RETRIES, DEFAULT_TIMEOUT_FLOOR_S, DEFAULT_MAX_RETRIES
 
 
 
@@ -30,10 +36,11 @@ class FileHandler:
 
 
 
-    def __init__(self):
-        self.file_path = resource_path(FILE_PATH)
+    def __init__(self, file_path=None):
+        self.file_path = resource_path(FILE_PATH) if file_path is None else str(file_path)
         self.directory = os.path.dirname(self.file_path)
         self.max_devices = MAX_DEVICES
+        self.store = ConfigStore.instance(self.file_path)
 
 
     def data_directory_exists(self) -> bool:
@@ -90,7 +97,9 @@ class FileHandler:
 
     def get_raw_device_data(self) -> dict:
         """
-        This method returns all register data stored in our json file.
+        This method returns a copy of all register data stored in our json file.
+
+        The copy can be modified freely and passed back to save_device_data().
 
         arguments:
             None
@@ -98,23 +107,27 @@ class FileHandler:
         returns:
             data (dict): A dictionary full of register data or an empty dictionary if no data is available. 
         """
-        if not self.data_path_exists():
-            print("Data directory does not exist")
-            return {}
-        try:
-            with open(self.file_path, 'r') as file:
-                # Check if there is content in the file
-                content = file.read()
-            if not content:
-                return {}
-            data = json.loads(content)
-            return data
-        except FileNotFoundError:
-            print("File not found")
-            return {}
-        except json.decoder.JSONDecodeError as e:
-            print(f"Error decoding: {e}")
-            return {}
+        return copy.deepcopy(self.store.get_data())
+
+
+    def _get_device(self, device_number) -> dict:
+        """
+        This method returns the cached data of a single device without copying it.
+
+        arguments:
+            device_number (int): The device number (always unique)
+
+        returns:
+            device (dict): The device data or None if the device does not exist.
+        """
+        return self.store.get_data().get(f'{DEVICE_PREFIX}{device_number}')
+
+
+    def reload_device_data(self) -> dict:
+        """
+        This method discards the in-memory register data and reads the json file again.
+        """
+        return self.store.reload()
         
 
     def save_device_data(self, data):
@@ -122,6 +135,8 @@ class FileHandler:
         This method takes in the register data and saves it into
         the register data file.
 
+        The write happens in the background shortly afterwards, see ConfigStore.
+
         arguments: 
             data (dict): The register data
 
@@ -129,41 +144,31 @@ class FileHandler:
             bool: True if successful in saving the register data or False otherwise
 
         """
-        try:
-            with open(self.file_path, 'w') as file:
-                json.dump(data, file, indent=4)
-            return True
-        except TypeError as e:
-            print(f"Error serializing data to json: {e}")
-            return False
-        except IOError as e:
-            print(f"Error Writing to file: {e}")
-            return False
+        return self.store.replace(data)
+
+
+    def flush_device_data(self) -> bool:
+        """
+        This method writes any pending register data to the file immediately.
+        """
+        return self.store.flush()
         
 
     def get_slave_address(self, device_number) -> int:
-        if not self.data_path_exists():
-            print("Data path does not exist")
-            return None
-        data = self.get_raw_device_data()
-        if not data:
+        device = self._get_device(device_number)
+        if device is None:
             return None
-        device = DEVICE_PREFIX + f'{device_number}'
-        slave_address = data.get(device, {}).get(SLAVE_ADDRESS, None)
+        slave_address = device.get(SLAVE_ADDRESS, None)
         if slave_address is not None:
             return int(slave_address)
         return -1
     
 
     def get_device_name(self, device_number) -> str:
-        if not self.data_path_exists():
-            print("Data path does not exist")
+        device = self._get_device(device_number)
+        if device is None:
             return None
-        data = self.get_raw_device_data()
-        if not data:
-            return None
-        device = DEVICE_PREFIX + f'{device_number}'
-        return data.get(device, {}).get(DEVICE_NAME, None)
+        return device.get(DEVICE_NAME, None)
 
 
 
@@ -177,16 +182,7 @@ class FileHandler:
         returns:
             count (int): The total number of devices.
         """
-        # If the path for our data does not exist, return
-        if not self.data_path_exists():
-            print("Data file not found")
-            return 0
-        # Read all data from the stored json file
-        data = self.get_raw_device_data()
-        if not data:
-            return 0
-        device_count = len(data.keys())
-        return device_count
+        return len(self.store.get_data())
 
 
     def get_string_device_tags(self):
@@ -199,16 +195,10 @@ class FileHandler:
         returns:
             device_keys (list): A list containing all device keys.
         """
-        # If the path for our data does not exist, return
-        if not self.data_path_exists():
-            print("Data file not found")
-            return 0
-        # Read all data from the stored json file
-        data = self.get_raw_device_data()
+        data = self.store.get_data()
         if not data:
             return None
-        device_keys = data.keys()
-        return device_keys
+        return list(data.keys())
 
 
     
@@ -222,16 +212,10 @@ class FileHandler:
         returns:
             count (int): The number of registers in the device.
         """
-        if not self.data_path_exists():
-            print("Data path not found")
+        device = self._get_device(device_number)
+        if device is None:
             return None
-        data = self.get_raw_device_data()
-        if not data:
-            return None
-        
-        device = f'{DEVICE_PREFIX}{device_number}'
-        count = len(data[device][REGISTERS])
-        return count
+        return len(device[REGISTERS])
 
 
     def get_register_attributes(self, device_number: int, *args) -> dict:
@@ -249,21 +233,13 @@ class FileHandler:
         Example:
         register_1: [register_name, register_address]
         """
-        if not self.data_path_exists():
-            print("Data path not found")
-            return None
-        data = self.get_raw_device_data()
-        if not data:
+        device = self._get_device(device_number)
+        if device is None:
             return None
-        # First find the device with the device number.
-        device = f'{DEVICE_PREFIX}{device_number}'
 
         result = {}
-        for address in data[device][REGISTERS]:
-            temp_dict = {} 
-            for register_attribute in args:
-                temp_dict[register_attribute] = data[device][REGISTERS][address][register_attribute]
-            result[address] = temp_dict
+        for address, register in device[REGISTERS].items():
+            result[address] = {attribute: register[attribute] for attribute in args}
         return result
    
 
@@ -276,35 +252,28 @@ class FileHandler:
             device_number (int): This is used as the unique identifier for the stored devices.
 
         returns:
-            result (dict): A dictionary containing the register address as the key and function codes as the value.
+            result (dict): A dictionary containing the register address as the key and the function code and scan class as the value.
 
         Example:
             result = {
-                '10': {'function_code': 3}, 
-                '11': {'function_code': 3}, 
-                '12': {'function_code': 3} 
+                '10': {'function_code': 3, 'scan_class': 'Normal'}, 
+                '11': {'function_code': 3, 'scan_class': 'Normal'}, 
+                '12': {'function_code': 3, 'scan_class': 'Fast'} 
             }
         """
-        if not self.data_path_exists():
-            print("Data path not found")
-            return None
-        data = self.get_raw_device_data()
-        if not data:
+        device = self._get_device(device_number)
+        if device is None:
             return None
 
-        device = f'{DEVICE_PREFIX}{device_number}'
         result = dict()
-        for register in data[device][REGISTERS]:
-                temp_dict = {}
-                temp_dict[FUNCTION_CODE] = data[device][REGISTERS][register].get(FUNCTION_CODE)
-                result[register] = temp_dict
+        for address, register in device[REGISTERS].items():
+            result[address] = {FUNCTION_CODE: register.get(FUNCTION_CODE), SCAN_CLASS: register.get(SCAN_CLASS, DEFAULT_SCAN_CLASS)}
         return result
 
 
     def get_connection_params(self, device_number: int) -> dict: 
         """
-        This method reads the stored json data from the default filepath 
-        and gets the connection parameters. eg: RTU and/or TCP
+        This method gets the stored connection parameters. eg: RTU and/or TCP
 
         args:
             device_number: This is used as the unique identifier for the stored devices.
@@ -316,23 +285,16 @@ class FileHandler:
         Example:
         {'tcp': {'host': '127.0.0.1', 'port': 503}}
         """
-        if not self.data_path_exists():
-            print("Data path not found")
-            return None
-        data = self.get_raw_device_data()
-        if not data:
+        device = self._get_device(device_number)
+        if device is None:
             return None
         
         protocol_dict = dict()
-        # First find the device with the device number.
-        for key in data:
-            device = DEVICE_PREFIX + f'{device_number}'
-            if re.search(device, key):
-                # Loop through the device's connection parameters and store each registered protocol inside the protocol_dict variable.
-                for protocol in data[device][CONNECTION_PARAMETERS]:
-                    # Store the protocol only if it is not empty.
-                    if data[device][CONNECTION_PARAMETERS].get(protocol):
-                        protocol_dict[protocol] = data[device][CONNECTION_PARAMETERS].get(protocol)
+        # Store each registered protocol only if it is not empty.
+        # The parameters are copied so callers can modify them without touching the stored data.
+        for protocol, params in device[CONNECTION_PARAMETERS].items():
+            if params:
+                protocol_dict[protocol] = copy.deepcopy(params)
         return protocol_dict
     
 
@@ -368,19 +330,10 @@ class FileHandler:
         returns:
             addresses (list): A list containing all the registers in a particular device
         """
-        # If the path for our data does not exist, return
-        if not self.data_path_exists():
-            print("Data file not found")
-            return 0
-        # Read all data from the stored json file
-        data = self.get_raw_device_data()
-        if not data:
+        device = self._get_device(device_number)
+        if device is None:
             return None
-        
-        device = f'{DEVICE_PREFIX}{device_number}'
-        addresses = data[device][REGISTERS].keys()
-        addresses = [int(value) for value in addresses]
-        return  addresses
+        return [int(value) for value in device[REGISTERS].keys()]
 
 
 
@@ -395,30 +348,30 @@ class FileHandler:
         returns:
             bool: True if the the register was added successfully or false otherwise
         """
-        data = self.get_raw_device_data()
-        if not data:
-            return None
-        device = f'{DEVICE_PREFIX}{device_number}'
-        existing_addresses =  self.get_existing_register_addresses(device_number)
-        print("User input", user_input)
-        quantity = int(user_input[REGISTER_QUANTITY]) 
-        start_address = int(user_input[REGISTER_ADDRESS]) 
-        for i in range(quantity):
-            address = start_address + i
-            if address not in existing_addresses:
-                temp_dict = dict()
-                temp_register_template = copy.copy(REGISTER_TEMPLATE)
-                temp_register_template[FUNCTION_CODE] = user_input[FUNCTION_CODE]
-                temp_dict[address] = temp_register_template
-                data[device][REGISTERS].update(temp_dict)
-            else:
-                # Show a notification to the user that some registers were existing  and have been discarded
-                print(f'Register {address} is a duplicate and has been discarded')
-        
-        # Finally, save the new configuration
-        with open(self.file_path, 'w') as file:
-            json.dump(data, file, indent=4)
-        self.save_device_data(data)
+        with self.store.mutate():
+            device = self._get_device(device_number)
+            if device is None:
+                return None
+            registers = device[REGISTERS]
+            print("User input", user_input)
+            quantity = int(user_input[REGISTER_QUANTITY]) 
+            start_address = int(user_input[REGISTER_ADDRESS]) 
+            for i in range(quantity):
+                address = str(start_address + i)
+                if len(registers) >= MAX_REGISTERS:
+                    print(f'The device has reached the maximum of {MAX_REGISTERS} registers')
+                    break
+                if address not in registers:
+                    temp_register_template = copy.copy(REGISTER_TEMPLATE)
+                    temp_register_template[FUNCTION_CODE] = user_input[FUNCTION_CODE]
+                    temp_register_template[SCAN_CLASS] = user_input.get(SCAN_CLASS, DEFAULT_SCAN_CLASS)
+                    registers[address] = temp_register_template
+                else:
+                    # Show a notification to the user that some registers were existing  and have been discarded
+                    print(f'Register {address} is a duplicate and has been discarded')
+
+            # Finally, save the new configuration
+            return self.store.save()
 
 
     def update_register_name(self, device_number, register_address, register_name) -> bool:
@@ -434,15 +387,13 @@ class FileHandler:
             bool: True if the the register was renamed successfully or false otherwise
 
         """
-        data = self.get_raw_device_data()
-        if not data:
-            return None
-        device = f'{DEVICE_PREFIX}{device_number}'
-        data[device][REGISTERS][register_address][REGISTER_NAME] = register_name
-        # Save the new configuration
-        if self.save_device_data(data):
-            return True
-        return False
+        with self.store.mutate():
+            device = self._get_device(device_number)
+            if device is None:
+                return None
+            device[REGISTERS][register_address][REGISTER_NAME] = register_name
+            # Save the new configuration
+            return self.store.save()
 
 
 
@@ -461,56 +412,31 @@ class FileHandler:
             print("You have reached the maximum number of devices")
             return 0
 
-        new_tag = self.generate_new_device_tag()
-
-        if device_count < 1:
-            if new_tag:
-                user_input = {f'{DEVICE_PREFIX}{new_tag}': user_input}
-                if self.save_device_data(user_input):
-                    return new_tag
-                return 0
-
-        elif device_count < MAX_DEVICES:
-            data = self.get_raw_device_data()
-            if new_tag:
-                user_input = {f'{DEVICE_PREFIX}{new_tag}': user_input}
-                data.update(user_input)
-                if self.save_device_data(data):
-                    return new_tag
-                return 0
+        return self.store.add_device(DEVICE_PREFIX, user_input)
 
 
     def delete_device(self, device_number):
-        data = self.get_raw_device_data()
-        if not data:
-            return None
         delete_tag = f'{DEVICE_PREFIX}{device_number}'
-        del data[delete_tag]
-        self.save_device_data(data)
+        if not self.store.remove_device(delete_tag):
+            return None
         
 
     def update_hidden_status(self, device_number, new_status):
-        device_tag = f'{DEVICE_PREFIX}{device_number}'
-        data = self.get_raw_device_data()
-        if not data:
-            return None
-        old_status = data[device_tag].get(HIDDEN_STATUS)
-        # print("Old status",old_status)
-        if old_status is not None and old_status != new_status:
-            data[device_tag][HIDDEN_STATUS] = new_status
-            # print("New status",data[device_tag][HIDDEN_STATUS])
-            self.save_device_data(data)
+        with self.store.mutate():
+            device = self._get_device(device_number)
+            if device is None:
+                return None
+            old_status = device.get(HIDDEN_STATUS)
+            if old_status is not None and old_status != new_status:
+                device[HIDDEN_STATUS] = new_status
+                self.store.save()
 
 
     def get_hidden_status(self, device_number):
-        device_tag = f'{DEVICE_PREFIX}{device_number}'
-        data = self.get_raw_device_data()
-        if not data:
+        device = self._get_device(device_number)
+        if device is None:
             return None
-        status = data[device_tag].get(HIDDEN_STATUS)
-        if status is not None:
-            return status
-        return None
+        return device.get(HIDDEN_STATUS)
 
 
     
@@ -525,13 +451,13 @@ class FileHandler:
             hidden_devices (dict): a dictionary of all hidden device numbers as keys and device names as values.
 
         """
-        hidden_devices = {}
-        data = self.get_raw_device_data()
-        if not data:
+        device_items = self.store.device_items()
+        if not device_items:
             return None
-        for key in data.keys():
-            if data[key].get(HIDDEN_STATUS) is not None and data[key].get(HIDDEN_STATUS) == True:
-                hidden_devices[int(re.findall(r'\d+', key)[0])] = data[key].get(DEVICE_NAME)
+        hidden_devices = {}
+        for device_number, device in device_items:
+            if device.get(HIDDEN_STATUS) == True:
+                hidden_devices[device_number] = device.get(DEVICE_NAME)
         return hidden_devices
 
 
@@ -550,30 +476,16 @@ class FileHandler:
                 x will always be a unique number
 
         """
-        new_device_number = None
-        existing_tags = self.get_int_device_tags()
-
-        if not existing_tags:
-            new_device_number = 1
-        else:
-            for number in range(1, MAX_DEVICES + 1):
-                if not number in existing_tags:
-                    new_device_number = number
-                    break
-        
-        if isinstance(new_device_number, int):
-            if prefix_activated:
-                return f'{DEVICE_PREFIX}{new_device_number}'
-            else:
-                return new_device_number
-        else:
-            return None
+        new_device_number = self.store.next_free_tag()
+        if prefix_activated:
+            return f'{DEVICE_PREFIX}{new_device_number}'
+        return new_device_number
 
 
     def get_int_device_tags(self):
-        string_device_tags = self.get_string_device_tags()
-        if string_device_tags:
-            return [int(re.findall(r'\d+', item)[0]) for item in string_device_tags if re.findall(r'\d+', item)]
+        device_tags = self.store.device_tags()
+        if device_tags:
+            return device_tags
         else: return None
 
     def delete_registers(self, device_number, addresses) -> bool:
@@ -590,17 +502,202 @@ class FileHandler:
             print("Please enter a positive number.")
             return False
         
-        
-        device = f'{DEVICE_PREFIX}{device_number}'
+        with self.store.mutate():
+            device = self._get_device(device_number)
+            if device is None:
+                return False
 
-        data = self.get_raw_device_data()
-        if not data:
+            for address in addresses:
+                del device[REGISTERS][str(address)]
+
+            return self.store.save()
+
+
+    def get_register_formats(self, device_number: int) -> dict:
+        """
+        This method returns how the value of every register is decoded.
+
+        args:
+            device_number (int): This is used as the unique identifier for the stored devices.
+
+        returns:
+            result (dict): The register address as the key and the function code, data type, gain, offset,
+                byte order, word order and string length as the value. Missing or invalid settings are replaced by defaults.
+
+        Example:
+            result = {
+                '10': {'function_code': 3, 'data_type': 'float32', 'gain': 1, 'offset': 0,
+                       'byte_order': 'Big', 'word_order': 'Little', 'string_length': 1},
+                '11': {'function_code': 3, 'data_type': 'N/A', 'gain': 1, 'offset': 0,
+                       'byte_order': 'Big', 'word_order': 'Big', 'string_length': 1}
+            }
+        """
+        device = self._get_device(device_number)
+        if device is None:
+            return None
+
+        def number(value, default):
+            if isinstance(value, (int, float)):
+                return value
+            if value is None:
+                return default
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                return default
+            return int(value) if value.is_integer() else value
+
+        result = dict()
+        for address, register in device[REGISTERS].items():
+            data_type = register.get(DATA_TYPE)
+            byte_order = register.get(BYTE_ORDER)
+            word_order = register.get(WORD_ORDER)
+            result[address] = {
+                FUNCTION_CODE: register.get(FUNCTION_CODE),
+                DATA_TYPE: data_type if data_type in DATA_TYPE_ITEMS else RAW_DATA_TYPE,
+                # A gain of 0 is the template's "not set"
+                GAIN: number(register.get(GAIN), 1) or 1,
+                OFFSET: number(register.get(OFFSET), 0),
+                BYTE_ORDER: byte_order if byte_order in ENDIAN_ITEMS else BIG_ENDIAN,
+                WORD_ORDER: word_order if word_order in ENDIAN_ITEMS else BIG_ENDIAN,
+                STRING_LENGTH: max(1, int(number(register.get(STRING_LENGTH), 1))),
+            }
+        return result
+
+
+    def set_data_type(self, device_number, addresses, data_format) -> bool:
+        """
+        This method sets how the value of a list of registers is decoded.
+
+        arguments:
+            device_number (int): The unique device number whose registers we want to update
+
+            addresses (list): A list of register addresses
+
+            data_format (dict): Any of the data_type, gain, offset, byte_order, word_order and string_length settings
+
+        returns:
+            bool: True if the settings were saved or False otherwise
+        """
+        if data_format.get(DATA_TYPE, RAW_DATA_TYPE) not in DATA_TYPE_ITEMS:
+            print(f"Unknown data type {data_format.get(DATA_TYPE)}")
             return False
-        
-        for address in addresses:
-            del data[device][REGISTERS][str(address)]
 
-        self.save_device_data(data)
+        with self.store.mutate():
+            device = self._get_device(device_number)
+            if device is None:
+                return False
+
+            registers = device[REGISTERS]
+            for address in addresses:
+                register = registers.get(str(address))
+                if register is not None:
+                    register.update(data_format)
+
+            return self.store.save()
+
+
+    def get_deadbands(self, device_number: int) -> dict:
+        """
+        This method returns the deadband of every register, see DEADBAND_TYPE_ITEMS.
+
+        args:
+            device_number (int): This is used as the unique identifier for the stored devices.
+
+        returns:
+            result (dict): The register address as the key and a (deadband type, deadband) tuple as the value.
+                Missing or invalid deadbands are replaced by an absolute deadband of 0.
+
+        Example:
+            result = {
+                '10': ('Absolute', 0.5),
+                '11': ('Percent', 2)
+            }
+        """
+        device = self._get_device(device_number)
+        if device is None:
+            return None
+
+        result = dict()
+        for address, register in device[REGISTERS].items():
+            deadband_type = register.get(DEADBAND_TYPE)
+            deadband = register.get(DEADBAND, 0)
+            if not isinstance(deadband, (int, float)):
+                try:
+                    deadband = float(deadband)
+                except (TypeError, ValueError):
+                    deadband = 0
+            if deadband_type not in DEADBAND_TYPE_ITEMS or deadband < 0:
+                deadband_type, deadband = DEADBAND_ABSOLUTE, 0
+            result[address] = (deadband_type, deadband)
+        return result
+
+
+    def set_deadband(self, device_number, addresses, deadband_type, deadband) -> bool:
+        """
+        This method sets the deadband of a list of registers.
+
+        arguments:
+            device_number (int): The unique device number whose registers we want to update
+
+            addresses (list): A list of register addresses
+
+            deadband_type (str): One of DEADBAND_TYPE_ITEMS
+
+            deadband (float): The deadband, 0 or more
+
+        returns:
+            bool: True if the deadbands were saved or False otherwise
+        """
+        if deadband_type not in DEADBAND_TYPE_ITEMS or deadband < 0:
+            print(f"Invalid deadband {deadband_type} {deadband}")
+            return False
+
+        with self.store.mutate():
+            device = self._get_device(device_number)
+            if device is None:
+                return False
+
+            registers = device[REGISTERS]
+            for address in addresses:
+                register = registers.get(str(address))
+                if register is not None:
+                    register[DEADBAND_TYPE] = deadband_type
+                    register[DEADBAND] = deadband
+
+            return self.store.save()
+
+
+    def set_scan_class(self, device_number, addresses, scan_class) -> bool:
+        """
+        This method sets the scan class of a list of registers.
+
+        arguments:
+            device_number (int): The unique device number whose registers we want to update
+
+            addresses (list): A list of register addresses
+
+            scan_class (str): One of the SCAN_CLASSES keys, e.g. 'Fast'
+
+        returns:
+            bool: True if the scan classes were saved or False otherwise
+        """
+        if scan_class not in SCAN_CLASSES:
+            print(f"Unknown scan class {scan_class}")
+            return False
+
+        with self.store.mutate():
+            device = self._get_device(device_number)
+            if device is None:
+                return False
+
+            registers = device[REGISTERS]
+            for address in addresses:
+                register = registers.get(str(address))
+                if register is not None:
+                    register[SCAN_CLASS] = scan_class
+
+            return self.store.save()
 
 
     def __save_connection_params(self, device_number) -> bool: ######################
@@ -617,22 +714,10 @@ class FileHandler:
         returns:
             The default modbus method (rtu or tcp), or None if it has not been defined.
         """
-        if not self.data_path_exists():
-            print("Data path not found")
-            return None
-        data = self.get_raw_device_data()
-        if not data:
+        device = self._get_device(device_number)
+        if device is None:
             return None
-        
-
-        # First find the device with the device number.
-        for key in data:
-            device = DEVICE_PREFIX + f'{device_number}'
-            if re.search(device, key):
-                # Get and return the default modbus method
-                default_method = data[device].get(DEFAULT_METHOD)
-                return default_method
-        return None
+        return device.get(DEFAULT_METHOD)
     
 
     def set_default_modbus_method(self, device_number: int, default_method: str) -> bool:
@@ -647,17 +732,122 @@ class FileHandler:
         return:
             None
         """ 
-        data = self.get_raw_device_data()
-        if not data:
-            return False
-        device = DEVICE_PREFIX + f'{device_number}'
+        with self.store.mutate():
+            device = self._get_device(device_number)
+            if device is None:
+                return False
+            if device.get(DEFAULT_METHOD) == default_method:
+                return True
 
-        data[device][DEFAULT_METHOD] = default_method
+            device[DEFAULT_METHOD] = default_method
+
+            # Finally, save new modbus method
+            return self.store.save()
 
-        # Finally, save new modbus method
-        if self.save_device_data(data):
-            return True
-        
-        return False
 
+    def get_poll_interval(self, device_number) -> int:
+        """
+        This method returns the interval at which a device is polled in independent poll mode.
+
+        arguments:
+            device_number (int): The device number.
+
+        returns:
+            interval (int): The poll interval in milliseconds, or DEFAULT_POLL_INTERVAL_MS if none has been set.
+        """
+        device = self._get_device(device_number)
+        if device is None:
+            return DEFAULT_POLL_INTERVAL_MS
+        try:
+            return max(MIN_POLL_INTERVAL_MS, int(device.get(POLL_INTERVAL, DEFAULT_POLL_INTERVAL_MS)))
+        except (TypeError, ValueError):
+            return DEFAULT_POLL_INTERVAL_MS
+
+
+    def set_poll_interval(self, device_number: int, interval_ms: int) -> bool:
+        """
+        This method sets the interval at which a device is polled in independent poll mode.
+
+        arguments:
+            device_number (int): The device number.
+
+            interval_ms (int): The poll interval in milliseconds.
+
+        return:
+            bool: True if the interval was saved or False otherwise.
+        """
+        with self.store.mutate():
+            device = self._get_device(device_number)
+            if device is None:
+                return False
+            try:
+                interval_ms = max(MIN_POLL_INTERVAL_MS, int(interval_ms))
+            except (TypeError, ValueError):
+                print("Please enter the poll interval in milliseconds.")
+                return False
+            if device.get(POLL_INTERVAL) == interval_ms:
+                return True
+            device[POLL_INTERVAL] = interval_ms
+            return self.store.save()
+
+
+    def get_max_read_gap(self, device_number) -> int:
+        """
+        This method returns the number of unused registers a single read request of the device may span.
 
+        arguments:
+            device_number (int): The device number.
+
+        returns:
+            max_gap (int): The stored gap, or DEFAULT_MAX_READ_GAP if none has been set.
+        """
+        device = self._get_device(device_number)
+        if device is None:
+            return DEFAULT_MAX_READ_GAP
+        try:
+            return max(0, int(device.get(MAX_READ_GAP, DEFAULT_MAX_READ_GAP)))
+        except (TypeError, ValueError):
+            return DEFAULT_MAX_READ_GAP
+
+
+    def get_timeout_limits(self, device_number) -> tuple:
+        """
+        This method returns the limits of the adaptive request timeout of the device, see adaptive_timeout.
+
+        arguments:
+            device_number (int): The device number.
+
+        returns:
+            limits (tuple): (floor in seconds, ceiling in seconds or None, max retries).
+                The ceiling is None if none has been set, to use the timeout of the device's connection.
+        """
+        device = self._get_device(device_number) or {}
+        try:
+            floor_s = max(0.0, float(device.get(TIMEOUT_FLOOR, DEFAULT_TIMEOUT_FLOOR_S)))
+        except (TypeError, ValueError):
+            floor_s = DEFAULT_TIMEOUT_FLOOR_S
+        try:
+            ceiling_s = float(device[TIMEOUT_CEILING]) if device.get(TIMEOUT_CEILING) else None
+        except (TypeError, ValueError):
+            ceiling_s = None
+        try:
+            max_retries = max(0, int(device.get(MAX_RETRIES, DEFAULT_MAX_RETRIES)))
+        except (TypeError, ValueError):
+            max_retries = DEFAULT_MAX_RETRIES
+        return floor_s, ceiling_s, max_retries
+
+
+    def get_forbidden_ranges(self, device_number) -> list:
+        """
+        This method returns the address ranges that read requests of the device must not span.
+
+        arguments:
+            device_number (int): The device number.
+
+        returns:
+            ranges (list): A list of (function_code, start, end) tuples, ends inclusive.
+        """
+        device = self._get_device(device_number)
+        if device is None:
+            return []
+        return [tuple(forbidden_range) for forbidden_range in device.get(FORBIDDEN_RANGES, [])]
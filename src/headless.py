@@ -0,0 +1,160 @@
+"""
+Polls the devices of a register map without a GUI.
+
+Every device in the register map is connected with its default Modbus
+method and read with the same compiled read plans and decoders as the
+GUI, see acquisition.Device. Each poll cycle reads all devices
+concurrently and writes one JSON line:
+
+    {"timestamp": 1700000000.123, "devices": {"1": {"100": 12, "101": 3.5}}}
+
+where every device maps register addresses to decoded values. Devices
+that could not be read in a cycle are left out of that line. With
+--changes-only a line only holds the values that moved by more than their
+deadband, and cycles without changes write no line. With --history the
+values are also recorded by historian.Historian, and with --export they
+are also written to a CSV or Parquet file by exporter.SnapshotExporter.
+With --stats a poll_stats report is written when polling ends.
+Nothing in the loop imports Qt.
+
+Usage:
+    python src/headless.py --interval-ms 500 --output samples.jsonl
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from time import perf_counter
+from concurrent.futures import ThreadPoolExecutor
+from file_handler import FileHandler
+from acquisition import Device
+from historian import Historian
+from exporter import SnapshotExporter
+from poll_stats import PollStats
+from constants import FILE_PATH, DEFAULT_POLL_INTERVAL_MS, MIN_POLL_INTERVAL_MS
+
+
+def read_device(device, now, changes_only=False):
+    """
+    Reads one device, reconnecting first if its connection was lost.
+    TCP devices reconnect with a backoff delay in the read itself, see acquisition.Device.reconnect().
+
+    returns:
+        The values of every register, or {row: value} of the changed values if changes_only.
+    """
+    if not device.connected and not device.auto_reconnect and not device.connect():
+        return {} if changes_only else []
+    return device.read_changes(now) if changes_only else device.read(now)
+
+
+def poll(devices, interval_ms, output, count=None, historian=None, changes_only=False, exporter=None, stats=None):
+    """
+    Reads every device once per interval and writes a JSON line per cycle until count cycles have been written.
+
+    args:
+        devices (list): The Device objects to read.
+        interval_ms (int): The poll cycle time in milliseconds.
+        output (file): Where to write the JSON lines.
+        count (int): The number of cycles to poll, or None to poll until interrupted.
+        historian (Historian): Records every value read, if given.
+        changes_only (bool): Write only the values that moved by more than their deadband.
+        exporter (SnapshotExporter): Exports every value written, if given.
+        stats (PollStats): Records every cycle, if given. Requests and reads are recorded by the devices.
+    """
+    cycles = 0
+    with ThreadPoolExecutor(max_workers=max(1, len(devices)), thread_name_prefix="poll") as executor:
+        while count is None or cycles < count:
+            cycle_start = perf_counter()
+            results = list(executor.map(lambda device: read_device(device, cycle_start, changes_only), devices))
+            if stats is not None:
+                stats.cycles.record(cycle_start, perf_counter() - cycle_start)
+            if changes_only:
+                snapshot = {
+                    str(device.device_number): {device.addresses[row]: value for row, value in data.items()}
+                    for device, data in zip(devices, results) if data
+                }
+            else:
+                snapshot = {
+                    str(device.device_number): dict(zip(device.addresses, data))
+                    for device, data in zip(devices, results) if data
+                }
+            timestamp = time.time()
+            if snapshot or not changes_only:
+                output.write(json.dumps({"timestamp": timestamp, "devices": snapshot}) + "\n")
+                output.flush()
+            for recorder in (historian, exporter):
+                if recorder is not None:
+                    for device, data in zip(devices, results):
+                        if data:
+                            recorder.record(device.device_number, timestamp, device.addresses, data)
+            cycles += 1
+
+            elapsed_ms = (perf_counter() - cycle_start) * 1000
+            if count is None or cycles < count:
+                time.sleep(max(0, interval_ms - elapsed_ms) / 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", default=str(FILE_PATH), help="register map file")
+    parser.add_argument("--devices", type=int, nargs="+", help="device numbers to poll, all devices by default")
+    parser.add_argument("--interval-ms", type=int, default=DEFAULT_POLL_INTERVAL_MS, help="poll cycle time")
+    parser.add_argument("--output", default="-", help="file the JSON lines are appended to, stdout by default")
+    parser.add_argument("--count", type=int, help="number of cycles to poll, until interrupted by default")
+    parser.add_argument("--history", metavar="DIRECTORY", help="also record the values to history files in this directory")
+    parser.add_argument("--export", metavar="PATH", help="also write the values to a .csv or .parquet file")
+    parser.add_argument("--stats", metavar="PATH", help="write a JSON report of the poll statistics to this file at the end")
+    parser.add_argument("--changes-only", action="store_true", help="only write values that moved by more than their deadband")
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.config):
+        parser.error(f"register map {args.config} not found")
+    if args.interval_ms < MIN_POLL_INTERVAL_MS:
+        parser.error(f"--interval-ms must be at least {MIN_POLL_INTERVAL_MS}")
+
+    output = sys.stdout if args.output == "-" else open(args.output, "a")
+    # Messages printed by the other modules go to stderr, so the output only holds JSON lines.
+    sys.stdout = sys.stderr
+
+    file_handler = FileHandler(args.config)
+    device_numbers = args.devices or file_handler.get_int_device_tags() or []
+    devices = [Device(device_number, file_handler) for device_number in device_numbers]
+    if not devices:
+        parser.error("no devices to poll")
+
+    try:
+        exporter = SnapshotExporter(args.export) if args.export else None
+    except (OSError, ValueError) as e:
+        parser.error(f"cannot export to {args.export}: {e}")
+
+    for device in devices:
+        if device.connect():
+            print(f"Connected to device {device.device_number} ({device.name}) using {device.default_method}")
+
+    historian = Historian(args.history) if args.history else None
+    stats = PollStats({device.device_number: device.stats for device in devices}, args.interval_ms)
+    stats.reset()
+    try:
+        poll(devices, args.interval_ms, output, args.count, historian, args.changes_only, exporter, stats)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for device in devices:
+            device.disconnect()
+        if historian is not None:
+            historian.close()
+        if exporter is not None:
+            exporter.close()
+        if args.stats:
+            try:
+                stats.write_report(args.stats)
+            except OSError as e:
+                print(f"Failed to write the poll statistics: {e}")
+        if output is not sys.__stdout__:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
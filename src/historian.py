@@ -0,0 +1,389 @@
+"""
+This module records polled register values to disk and reads them back by
+time range.
+
+Every device has one file per day (UTC) in its own directory:
+
+    <history directory>/device_<n>/<YYYY-MM-DD>.hist
+
+A file is a sequence of blocks. Each block holds a batch of samples of one
+device, stored column by column:
+
+    header        magic, row count, column count, first and last timestamp
+    addresses     one int32 register address per column
+    type codes    one byte per column, b'f' (float32) or b'd' (float64)
+    timestamps    one int64 per row, microseconds since the epoch
+    columns       one float32 or float64 per row, for every column
+
+A column is stored as float32 when all of its values in the block fit one
+exactly, which holds for 16 bit registers, coils and float32 values, and as
+float64 otherwise. Values that are not numbers, such as 'Error', are stored
+as NaN. Everything is little endian.
+
+Historian writes the blocks from a background thread, so recording a sample
+from the poll loop only puts it on a queue. It has no GUI dependencies.
+"""
+
+import os
+import sys
+import time
+import queue
+import struct
+import threading
+from array import array
+from time import perf_counter
+from bisect import bisect_left, bisect_right
+from constants import HISTORY_DIR, HISTORIAN_FLUSH_S, HISTORIAN_BLOCK_ROWS, HISTORIAN_QUEUE_SIZE
+
+
+BLOCK_MAGIC = b'MCH1'
+BLOCK_HEADER = struct.Struct('<4sIIqq')   # magic, rows, columns, first timestamp, last timestamp
+FILE_SUFFIX = '.hist'
+ITEM_SIZES = {ord('f'): 4, ord('d'): 8}
+NAN = float('nan')
+
+# Arrays are written in the machine's byte order, so swap them on big endian machines.
+SWAP_BYTES = sys.byteorder != 'little'
+
+
+def _day(timestamp) -> str:
+    """Returns the UTC day of a time.time() timestamp, which names its file."""
+    return time.strftime('%Y-%m-%d', time.gmtime(timestamp))
+
+
+def _number(value) -> float:
+    """Returns a register value as a float, or NaN if it is not a number."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    return NAN
+
+
+def _to_bytes(values) -> bytes:
+    if SWAP_BYTES:
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_bytes(typecode, data) -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    if SWAP_BYTES:
+        values.byteswap()
+    return values
+
+
+def encode_block(timestamps, addresses, rows) -> bytes:
+    """
+    Encodes a batch of samples of one device as a block.
+
+    args:
+        timestamps (list): The timestamp of every row, in microseconds since the epoch.
+        addresses (list): The register address of every column.
+        rows (list): One list of register values per row, as long as addresses.
+
+    returns:
+        block (bytes): The encoded block.
+    """
+    type_codes = bytearray()
+    columns = []
+    for column in zip(*rows):
+        try:
+            wide = array('d', column)
+        except TypeError:
+            wide = array('d', map(_number, column))
+        narrow = array('f', wide)
+        if array('d', narrow).tobytes() == wide.tobytes():
+            type_codes.append(ord('f'))
+            columns.append(_to_bytes(narrow))
+        else:
+            type_codes.append(ord('d'))
+            columns.append(_to_bytes(wide))
+
+    header = BLOCK_HEADER.pack(BLOCK_MAGIC, len(rows), len(addresses), timestamps[0], timestamps[-1])
+    return b''.join((
+        header,
+        _to_bytes(array('i', (int(address) for address in addresses))),
+        bytes(type_codes),
+        _to_bytes(array('q', timestamps)),
+        *columns,
+    ))
+
+
+def read_blocks(file, start_us=None, end_us=None):
+    """
+    Yields the (timestamps, addresses, columns) of every block in an open history file
+    that has samples between start_us and end_us (microseconds, inclusive).
+    Other blocks are skipped without reading their samples.
+
+    A block cut short, e.g. by a power loss while writing, ends the file.
+    """
+    while True:
+        header = file.read(BLOCK_HEADER.size)
+        if len(header) < BLOCK_HEADER.size:
+            return
+        magic, row_count, column_count, first, last = BLOCK_HEADER.unpack(header)
+        if magic != BLOCK_MAGIC:
+            print(f"History file {file.name} is corrupt; ignoring the rest of it")
+            return
+        address_bytes = file.read(4 * column_count)
+        type_codes = file.read(column_count)
+        if len(type_codes) < column_count:
+            return
+        body_size = row_count * (8 + sum(ITEM_SIZES[code] for code in type_codes))
+
+        if (start_us is not None and last < start_us) or (end_us is not None and first > end_us):
+            file.seek(body_size, os.SEEK_CUR)
+            continue
+
+        body = file.read(body_size)
+        if len(body) < body_size:
+            return
+        timestamps = _from_bytes('q', body[:8 * row_count])
+        columns = []
+        offset = 8 * row_count
+        for code in type_codes:
+            size = ITEM_SIZES[code] * row_count
+            columns.append(_from_bytes(chr(code), body[offset:offset + size]))
+            offset += size
+        yield timestamps, _from_bytes('i', address_bytes), columns
+
+
+def read_history(directory, device_number, start, end, addresses=None):
+    """
+    Reads the recorded samples of a device between two times.
+
+    args:
+        directory (str): The history directory.
+        device_number (int): The device whose samples to read.
+        start, end (float): The time range, as time.time() timestamps, ends inclusive.
+        addresses (list): The register addresses to read, or None for all.
+
+    returns:
+        timestamps (array): The time.time() timestamp of every sample, in order.
+        columns (dict): {address (str): array of float values}, one value per
+            timestamp. NaN where the register had no value, or was not in the
+            register map at that time.
+    """
+    device_directory = os.path.join(str(directory), f'device_{device_number}')
+    if not os.path.isdir(device_directory):
+        return array('d'), {}
+
+    first_day, last_day = _day(start), _day(end)
+    paths = sorted(
+        os.path.join(device_directory, name) for name in os.listdir(device_directory)
+        if name.endswith(FILE_SUFFIX) and first_day <= name[:-len(FILE_SUFFIX)] <= last_day
+    )
+    wanted = None if addresses is None else {int(address) for address in addresses}
+    start_us, end_us = int(start * 1e6), int(end * 1e6)
+
+    timestamps = array('q')
+    columns = {}   # {int address: array('d')}
+    for path in paths:
+        with open(path, 'rb') as file:
+            for block_timestamps, block_addresses, block_columns in read_blocks(file, start_us, end_us):
+                low = bisect_left(block_timestamps, start_us)
+                high = bisect_right(block_timestamps, end_us)
+                if low >= high:
+                    continue
+                count = len(timestamps)
+                timestamps.extend(block_timestamps[low:high])
+                for address, column in zip(block_addresses, block_columns):
+                    if wanted is not None and address not in wanted:
+                        continue
+                    values = columns.get(address)
+                    if values is None:
+                        values = columns[address] = array('d', [NAN]) * count
+                    values.fromlist(column[low:high].tolist())
+                # Registers missing from this block
+                total = len(timestamps)
+                for values in columns.values():
+                    if len(values) < total:
+                        values.extend(array('d', [NAN]) * (total - len(values)))
+
+    return array('d', (timestamp / 1e6 for timestamp in timestamps)), \
+        {str(address): values for address, values in columns.items()}
+
+
+class _Batch:
+    """The samples of one device waiting to be written as a block."""
+
+    __slots__ = ('day', 'addresses', 'timestamps', 'rows')
+
+    def __init__(self, day, addresses):
+        self.day = day
+        self.addresses = addresses
+        self.timestamps = []
+        self.rows = []
+
+
+class Historian:
+    """
+    Appends polled values to the history files from a background thread.
+
+    record() never blocks the poll loop. If the writer falls behind by more
+    than queue_size samples, new samples are dropped and counted in
+    self.dropped rather than stalling acquisition.
+    """
+
+    def __init__(self, directory=HISTORY_DIR, flush_s=HISTORIAN_FLUSH_S,
+                 block_rows=HISTORIAN_BLOCK_ROWS, queue_size=HISTORIAN_QUEUE_SIZE):
+        """
+        args:
+            directory (str): Where the history files are kept.
+            flush_s (float): The longest time samples are buffered before they are written.
+            block_rows (int): The number of samples of a device written as soon as they are buffered.
+            queue_size (int): The number of samples that may wait for the writer thread.
+        """
+        self.directory = str(directory)
+        self.flush_s = flush_s
+        self.block_rows = block_rows
+        self.dropped = 0
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._batches = {}   # {device_number: _Batch}, writer thread only
+        self._files = {}     # {device_number: (day, open file)}, writer thread only
+        self._last_rows = {} # {device_number: (addresses, values)}, writer thread only
+        self._thread = threading.Thread(target=self._run, name="Historian", daemon=True)
+        self._thread.start()
+
+
+    # ------------------------------------------------------------------
+    # Public API (thread-safe)
+    # ------------------------------------------------------------------
+
+    def record(self, device_number, timestamp, addresses, values):
+        """
+        Queues one sample of a device.
+
+        args:
+            device_number (int): The device the values were read from.
+            timestamp (float): When the values were read, as a time.time() timestamp.
+            addresses (list): The register address of every value. Pass the same list
+                for every sample of a device while its registers do not change.
+            values (list): The register values, which must not be modified afterwards.
+                Or {row: value} of the values that changed since the last sample,
+                see acquisition.Device.read_changes(); the other registers keep their last values.
+        """
+        try:
+            self._queue.put_nowait((device_number, timestamp, addresses, values))
+        except queue.Full:
+            self.dropped += 1
+
+
+    def flush(self, timeout=None) -> bool:
+        """
+        Writes every queued sample to disk.
+
+        returns:
+            bool: True if the samples were written before the timeout.
+        """
+        done = threading.Event()
+        self._queue.put((done,))
+        return done.wait(timeout)
+
+
+    def close(self):
+        """Writes every queued sample and stops the writer thread."""
+        self._queue.put(None)
+        self._thread.join()
+
+
+    def query(self, device_number, start, end, addresses=None):
+        """
+        Reads the samples of a device between two times, see read_history().
+        Samples still buffered are written first.
+        """
+        if self._thread.is_alive():
+            self.flush()
+        return read_history(self.directory, device_number, start, end, addresses)
+
+
+    # ------------------------------------------------------------------
+    # Writer thread
+    # ------------------------------------------------------------------
+
+    def _run(self):
+        next_flush = perf_counter() + self.flush_s
+        running = True
+        while running:
+            flushed = None
+            try:
+                item = self._queue.get(timeout=max(0.0, next_flush - perf_counter()))
+            except queue.Empty:
+                item = ()
+            if item is None:
+                running = False
+            elif len(item) == 1:
+                flushed = item[0]
+            elif item:
+                self._append(*item)
+
+            if not running or flushed is not None or perf_counter() >= next_flush:
+                try:
+                    for device_number in list(self._batches):
+                        self._write(device_number)
+                except OSError as e:
+                    print(f"Failed to write history: {e}")
+                next_flush = perf_counter() + self.flush_s
+                if flushed is not None:
+                    flushed.set()
+
+        for _, file in self._files.values():
+            file.close()
+        self._files.clear()
+
+
+    def _append(self, device_number, timestamp, addresses, values):
+        day = _day(timestamp)
+        batch = self._batches.get(device_number)
+        if batch is not None and (batch.day != day or (batch.addresses is not addresses and batch.addresses != addresses)):
+            # A block holds one day and one register list
+            try:
+                self._write(device_number)
+            except OSError as e:
+                print(f"Failed to write history: {e}")
+            batch = None
+        if batch is None:
+            batch = self._batches[device_number] = _Batch(day, addresses)
+
+        if isinstance(values, dict):
+            # Apply the changes to the last values of the device
+            last = self._last_rows.get(device_number)
+            if last is None or (last[0] is not addresses and last[0] != addresses):
+                row = [NAN] * len(addresses)
+            else:
+                row = list(last[1])
+            for index, value in values.items():
+                if index < len(row):
+                    row[index] = value
+            values = row
+        elif len(values) != len(addresses):
+            values = (list(values) + [NAN] * len(addresses))[:len(addresses)]
+        self._last_rows[device_number] = (addresses, values)
+        batch.timestamps.append(int(timestamp * 1e6))
+        batch.rows.append(values)
+        if len(batch.rows) >= self.block_rows:
+            try:
+                self._write(device_number)
+            except OSError as e:
+                print(f"Failed to write history: {e}")
+
+
+    def _write(self, device_number):
+        """Writes the buffered samples of a device as one block."""
+        batch = self._batches.pop(device_number, None)
+        if batch is None or not batch.rows or not batch.addresses:
+            return
+
+        day, file = self._files.get(device_number, (None, None))
+        if day != batch.day:
+            if file is not None:
+                file.close()
+            device_directory = os.path.join(self.directory, f'device_{device_number}')
+            os.makedirs(device_directory, exist_ok=True)
+            file = open(os.path.join(device_directory, batch.day + FILE_SUFFIX), 'ab')
+            self._files[device_number] = (batch.day, file)
+
+        file.write(encode_block(batch.timestamps, batch.addresses, batch.rows))
+        file.flush()
@@ -1,30 +1,38 @@
+import os
 import sys
-from PyQt5.QtCore import Qt, QThreadPool, QThread, pyqtSlot
+import time
+from PyQt5.QtCore import Qt, QThread, QTimer, pyqtSlot
 from PyQt5 import QtWidgets
 from PyQt5.QtGui import QIcon
 from file_handler import FileHandler
 from tableview import TableWidget as tablewidget
-from custom_dialogs import EditConnection, AddNewDevice
+from custom_dialogs import EditConnection, AddNewDevice, PollStatsDialog
 from register_reader import Observer, DeviceWorker, PollCoordinator
+from async_poller import AsyncPollCoordinator
+from historian import Historian
+from exporter import SnapshotExporter, export_format
+from poll_stats import PollStats
 import threading
 from notifications import Notification
 from constants import (
     APP_NAME, STATUS, WIDGET, DISCONNECT, CONNECT,
     SELECT_ACTION_ID, ADD_REGISTERS_ID, REMOVE_REGISTERS_ID,
-    CONNECT_ID, HIDE_DEVICE_ID, DELETE_DEVICE_ID, MAX_DEVICES,
+    CONNECT_ID, HIDE_DEVICE_ID, DELETE_DEVICE_ID, SET_SCAN_CLASS_ID, SET_DATA_TYPE_ID,
+    SET_DEADBAND_ID,
+    MAX_DEVICES,
+    POLL_ENGINE_THREADS, POLL_ENGINE_ASYNCIO, POLL_ENGINE_ITEMS,
+    POLL_MODE_SYNCHRONIZED, POLL_MODE_INDEPENDENT, POLL_MODE_ITEMS,
+    UI_REFRESH_RATE_ITEMS, DEFAULT_UI_REFRESH_HZ, EXPORT_FILE_FILTER, CSV_FORMAT, PARQUET_FORMAT,
     resource_path,
 )
 
 from PyQt5.QtWidgets import (
     QScrollArea, QWidget, QAction,
-    QVBoxLayout, QDialog, QHBoxLayout, QTableWidget,
-    QTableWidgetItem, QToolBar, QCheckBox, QLabel,
-    QSizePolicy, QSpacerItem,
+    QVBoxLayout, QDialog, QHBoxLayout,
+    QToolBar, QCheckBox, QLabel,
+    QSizePolicy, QSpacerItem, QComboBox, QFileDialog,
 )
 
-# Column index that displays the value of read registers.
-VALUE_COLUMN = 2
-
 
 class MainWindow(QtWidgets.QMainWindow):
 
@@ -43,7 +51,6 @@ class MainWindow(QtWidgets.QMainWindow):
         # Core state
         self.main_widget    = None
         self.observer       = Observer()
-        self.threadpool     = QThreadPool()
 
         # worker_dict: {device_number: (QThread, DeviceWorker)}
         self.worker_dict    = {}
@@ -53,12 +60,31 @@ class MainWindow(QtWidgets.QMainWindow):
         self.finish_signal_count = 0
         self.connected_device_count = 0
 
-        self.poll_mode        = "synchronized"   # or "independent"
+        self.poll_mode        = POLL_MODE_SYNCHRONIZED   # or POLL_MODE_INDEPENDENT
+        self.poll_engine      = POLL_ENGINE_THREADS   # or POLL_ENGINE_ASYNCIO
+        # Pass on only the values that moved by more than their deadband
+        self.report_by_exception = False
         self.global_interval_ms = 1000
 
         self.coordinator_thread = None   # type: QThread | None
         self.coordinator        = None   # type: PollCoordinator | None
 
+        # Polled values are buffered and shown at the UI refresh rate, not at the poll rate.
+        # pending_values: {device_number: latest register_data not shown yet}
+        self.pending_values   = {}
+        self.ui_refresh_hz    = DEFAULT_UI_REFRESH_HZ
+        self.ui_refresh_timer = QTimer(self)
+        self.ui_refresh_timer.setInterval(1000 // self.ui_refresh_hz)
+        self.ui_refresh_timer.timeout.connect(self.refresh_tables)
+
+        # Records polled values to disk while 'Record History' is checked
+        self.historian = None   # type: Historian | None
+        # Streams polled values to a CSV or Parquet file while 'Export' is checked
+        self.exporter = None    # type: SnapshotExporter | None
+        # Statistics of the last polling session, shown by the Statistics dialog
+        self.poll_stats = None  # type: PollStats | None
+        self.poll_stats_dialog = None
+
         # UI setup
         self.setWindowTitle(APP_NAME)
         self.setGeometry(100, 100, 1100, 1100)
@@ -116,6 +142,73 @@ class MainWindow(QtWidgets.QMainWindow):
         stop_action.triggered.connect(self.stop_polling)
         self.toolbar.addAction(stop_action)
 
+        gap_before_stats = QWidget()
+        gap_before_stats.setFixedWidth(SPACE_BETWEEN_POLL)
+        self.toolbar.addWidget(gap_before_stats)
+
+        stats_action = QAction('Statistics', self)
+        stats_action.triggered.connect(self.show_poll_stats)
+        self.toolbar.addAction(stats_action)
+
+        gap_before_engine = QWidget()
+        gap_before_engine.setFixedWidth(SPACE_BETWEEN_POLL)
+        self.toolbar.addWidget(gap_before_engine)
+
+        # Takes effect the next time polling is started.
+        self.toolbar.addWidget(QLabel('Engine '))
+        self.poll_engine_menu = QComboBox()
+        self.poll_engine_menu.addItems(POLL_ENGINE_ITEMS)
+        self.poll_engine_menu.setCurrentText(self.poll_engine)
+        self.poll_engine_menu.currentTextChanged.connect(self.on_poll_engine_changed)
+        self.toolbar.addWidget(self.poll_engine_menu)
+
+        gap_before_mode = QWidget()
+        gap_before_mode.setFixedWidth(SPACE_BETWEEN_POLL)
+        self.toolbar.addWidget(gap_before_mode)
+
+        self.toolbar.addWidget(QLabel('Mode '))
+        self.poll_mode_menu = QComboBox()
+        self.poll_mode_menu.addItems(POLL_MODE_ITEMS)
+        self.poll_mode_menu.setCurrentText(self.poll_mode)
+        self.poll_mode_menu.currentTextChanged.connect(self.on_poll_mode_changed)
+        self.toolbar.addWidget(self.poll_mode_menu)
+
+        gap_before_refresh = QWidget()
+        gap_before_refresh.setFixedWidth(SPACE_BETWEEN_POLL)
+        self.toolbar.addWidget(gap_before_refresh)
+
+        self.toolbar.addWidget(QLabel('Refresh (Hz) '))
+        self.ui_refresh_menu = QComboBox()
+        self.ui_refresh_menu.addItems(UI_REFRESH_RATE_ITEMS)
+        self.ui_refresh_menu.setCurrentText(str(DEFAULT_UI_REFRESH_HZ))
+        self.ui_refresh_menu.currentTextChanged.connect(self.on_ui_refresh_rate_changed)
+        self.toolbar.addWidget(self.ui_refresh_menu)
+
+        gap_before_history = QWidget()
+        gap_before_history.setFixedWidth(SPACE_BETWEEN_POLL)
+        self.toolbar.addWidget(gap_before_history)
+
+        self.record_history_checkbox = QCheckBox('Record History')
+        self.record_history_checkbox.toggled.connect(self.on_record_history_toggled)
+        self.toolbar.addWidget(self.record_history_checkbox)
+
+        gap_before_changes = QWidget()
+        gap_before_changes.setFixedWidth(SPACE_BETWEEN_POLL)
+        self.toolbar.addWidget(gap_before_changes)
+
+        # Takes effect the next time polling is started.
+        self.changes_only_checkbox = QCheckBox('Changes Only')
+        self.changes_only_checkbox.toggled.connect(self.on_changes_only_toggled)
+        self.toolbar.addWidget(self.changes_only_checkbox)
+
+        gap_before_export = QWidget()
+        gap_before_export.setFixedWidth(SPACE_BETWEEN_POLL)
+        self.toolbar.addWidget(gap_before_export)
+
+        self.export_checkbox = QCheckBox('Export')
+        self.export_checkbox.toggled.connect(self.on_export_toggled)
+        self.toolbar.addWidget(self.export_checkbox)
+
         spacer = QWidget()
         spacer.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
         self.toolbar.addWidget(spacer)
@@ -153,6 +246,7 @@ class MainWindow(QtWidgets.QMainWindow):
 
         if self.ready_to_poll_event.is_set():
             self.start_tasks()
+            self.ui_refresh_timer.start()
         else:
             self.notification.set_warning_message(
                 "No connected devices",
@@ -164,7 +258,25 @@ class MainWindow(QtWidgets.QMainWindow):
         1. Spawn one QThread per connected device, move a DeviceWorker into it.
         2. In synchronized mode, create a PollCoordinator in its own QThread and
            wire its trigger_workers signal to every worker's do_read slot.
+           In independent mode, start each worker's own timer at the device's
+           poll interval instead.
+
+        With the asyncio engine, a single AsyncPollCoordinator thread polls
+        every connected device instead.
+
+        Either way a new PollStats session collects the statistics of the devices polled.
         """
+        self.poll_stats = PollStats({
+            table.device_number: table.device.stats
+            for table in self.observer.table_widgets.values()
+            if table.connection_status
+        }, self.global_interval_ms)
+        self.poll_stats.reset()
+
+        if self.poll_engine == POLL_ENGINE_ASYNCIO:
+            self.start_async_tasks()
+            return
+
         workers = {}
 
         for device in self.observer.table_widgets.values():
@@ -172,11 +284,14 @@ class MainWindow(QtWidgets.QMainWindow):
                 continue
 
             thread = QThread()
-            worker = DeviceWorker(device)
+            worker = DeviceWorker(device.device, self.report_by_exception)
             worker.moveToThread(thread)
 
             # Error feedback (optional – connect to UI if desired)
             worker.error.connect(self._on_worker_error)
+            worker.connection_lost.connect(self._on_connection_lost)
+            worker.connection_restored.connect(self._on_connection_restored)
+            worker.quarantine_changed.connect(self._on_quarantine_changed)
 
             thread.start()
             self.worker_dict[device.device_number] = (thread, worker)
@@ -185,16 +300,15 @@ class MainWindow(QtWidgets.QMainWindow):
         if not workers:
             return
 
-        if self.poll_mode == "independent":
+        if self.poll_mode == POLL_MODE_INDEPENDENT:
             for device_number, (_, worker) in self.worker_dict.items():
                 worker.result.connect(self.update_device_table)
-                # Independent mode: each worker would need its own QTimer here.
-                # Left as an extension point.
+                worker.start_polling(self.file_handler.get_poll_interval(device_number))
 
         else:
             # ---- SYNCHRONIZED MODE ----
             self.coordinator_thread = QThread()
-            self.coordinator = PollCoordinator(workers, self.global_interval_ms)
+            self.coordinator = PollCoordinator(workers, self.global_interval_ms, self.poll_stats.cycles)
 
             # Wire coordinator trigger to every worker's do_read slot.
             # Qt automatically uses a QueuedConnection because they live in
@@ -215,6 +329,43 @@ class MainWindow(QtWidgets.QMainWindow):
             self.coordinator_thread.started.connect(self.coordinator.start)
             self.coordinator_thread.start()
 
+    def start_async_tasks(self):
+        """
+        Polls every connected device from one asyncio event loop running in
+        the coordinator thread. The async clients open their own connections,
+        so the devices' sync clients are closed to free serial ports.
+        """
+        devices = {
+            table.device_number: table.device
+            for table in self.observer.table_widgets.values()
+            if table.connection_status
+        }
+        if not devices:
+            return
+
+        for device in devices.values():
+            device.client.close()
+
+        intervals = None
+        if self.poll_mode == POLL_MODE_INDEPENDENT:
+            intervals = {
+                device_number: self.file_handler.get_poll_interval(device_number)
+                for device_number in devices
+            }
+
+        self.coordinator_thread = QThread()
+        self.coordinator = AsyncPollCoordinator(devices, self.global_interval_ms, intervals, self.report_by_exception,
+                                                self.poll_stats.cycles if intervals is None else None)
+        self.coordinator.synchronized_snapshot.connect(
+            self.handle_synchronized_snapshot
+        )
+        self.coordinator.result.connect(self.update_device_table)
+        self.coordinator.error.connect(self._on_worker_error)
+        self.coordinator.quarantine_changed.connect(self._on_quarantine_changed)
+        self.coordinator.moveToThread(self.coordinator_thread)
+        self.coordinator_thread.started.connect(self.coordinator.start)
+        self.coordinator_thread.start()
+
     # ------------------------------------------------------------------
     # Polling – stop
     # ------------------------------------------------------------------
@@ -255,6 +406,10 @@ class MainWindow(QtWidgets.QMainWindow):
 
         self.worker_dict.clear()
 
+        # --- 5. Show the last values ---
+        self.ui_refresh_timer.stop()
+        self.refresh_tables()
+
     # ------------------------------------------------------------------
     # Data handlers
     # ------------------------------------------------------------------
@@ -262,27 +417,82 @@ class MainWindow(QtWidgets.QMainWindow):
     @pyqtSlot(dict, float)
     def handle_synchronized_snapshot(self, data_dict: dict, timestamp: float):
         for device_number, register_data in data_dict.items():
+            self._record_history(device_number, timestamp, register_data)
             self._update_table(device_number, register_data)
-        print(f"Synchronized sample at {timestamp:.3f}")
 
-    @pyqtSlot(int, list)
-    def update_device_table(self, device_number: int, register_data: list):
+    @pyqtSlot(int, object)
+    def update_device_table(self, device_number: int, register_data):
         """Used by independent poll mode."""
+        self._record_history(device_number, time.time(), register_data)
         self._update_table(device_number, register_data)
 
-    def _update_table(self, device_number: int, register_data: list):
+    def _record_history(self, device_number: int, timestamp: float, register_data):
+        """Passes polled values to the historian and the exporter, if they are running."""
+        if (self.historian is None and self.exporter is None) or not register_data:
+            return
         table = self.observer.table_widgets.get(device_number)
         if table is None:
             return
-        for row, value in enumerate(register_data):
-            table.table_widget.setItem(
-                row, VALUE_COLUMN, QTableWidgetItem(str(value))
-            )
+        if self.historian is not None:
+            self.historian.record(device_number, timestamp, table.device.addresses, register_data)
+        if self.exporter is not None:
+            self.exporter.record(device_number, timestamp, table.device.addresses, register_data)
+
+    def _update_table(self, device_number: int, register_data):
+        # Only the latest values of a device are kept until the next refresh.
+        # Changes ({row: value}) are merged into the values not shown yet.
+        # The received objects may be shared with the historian, so they are copied before merging.
+        pending = self.pending_values.get(device_number)
+        if not isinstance(register_data, dict):
+            self.pending_values[device_number] = register_data
+        elif pending is None:
+            self.pending_values[device_number] = dict(register_data)
+        elif isinstance(pending, dict):
+            pending.update(register_data)
+        else:
+            pending = self.pending_values[device_number] = list(pending)
+            for row, value in register_data.items():
+                if row < len(pending):
+                    pending[row] = value
+        if not self.ui_refresh_timer.isActive():
+            # Not polling, e.g. results delivered after stop_polling()
+            self.refresh_tables()
+
+    @pyqtSlot()
+    def refresh_tables(self):
+        """Shows the values received since the last refresh. Runs at the UI refresh rate."""
+        pending, self.pending_values = self.pending_values, {}
+        for device_number, register_data in pending.items():
+            table = self.observer.table_widgets.get(device_number)
+            if table is not None:
+                table.show_register_values(register_data)
 
     @pyqtSlot(int, str)
     def _on_worker_error(self, device_number: int, message: str):
         print(f"Device {device_number} error: {message}")
 
+    @pyqtSlot(int)
+    def _on_connection_lost(self, device_number: int):
+        table = self.observer.table_widgets.get(device_number)
+        if table is not None:
+            table.set_connection_status(False)
+
+    @pyqtSlot(int)
+    def _on_connection_restored(self, device_number: int):
+        table = self.observer.table_widgets.get(device_number)
+        if table is not None:
+            table.set_connection_status(True)
+
+    @pyqtSlot(int, bool)
+    def _on_quarantine_changed(self, device_number: int, quarantined: bool):
+        if quarantined:
+            print(f"Device {device_number} is not answering; probing it until it recovers")
+        else:
+            print(f"Device {device_number} recovered")
+        table = self.observer.table_widgets.get(device_number)
+        if table is not None:
+            table.set_quarantined(quarantined)
+
     # ------------------------------------------------------------------
     # Resume helper
     # ------------------------------------------------------------------
@@ -295,6 +505,54 @@ class MainWindow(QtWidgets.QMainWindow):
     # Toolbar / UI callbacks
     # ------------------------------------------------------------------
 
+    def on_poll_engine_changed(self, engine):
+        self.poll_engine = engine
+
+    def on_poll_mode_changed(self, mode):
+        self.poll_mode = mode
+
+    def on_changes_only_toggled(self, checked):
+        self.report_by_exception = checked
+
+    def on_record_history_toggled(self, checked):
+        if checked and self.historian is None:
+            self.historian = Historian()
+            print(f"Recording history to {self.historian.directory}")
+        elif not checked and self.historian is not None:
+            self.historian.close()
+            self.historian = None
+
+    def show_poll_stats(self):
+        if self.poll_stats_dialog is None:
+            self.poll_stats_dialog = PollStatsDialog(lambda: self.poll_stats)
+        self.poll_stats_dialog.show()
+        self.poll_stats_dialog.raise_()
+
+    def on_export_toggled(self, checked):
+        if checked and self.exporter is None:
+            path, selected_filter = QFileDialog.getSaveFileName(self, "Export polled values", "", EXPORT_FILE_FILTER)
+            if '.' in os.path.basename(path):
+                file_format = export_format(path)
+            else:
+                file_format = PARQUET_FORMAT if PARQUET_FORMAT in selected_filter.lower() else CSV_FORMAT
+            try:
+                self.exporter = SnapshotExporter(path, file_format) if path else None
+            except (OSError, ValueError) as e:
+                self.notification.set_warning_message("Export failed", str(e))
+            if self.exporter is None:
+                self.export_checkbox.blockSignals(True)
+                self.export_checkbox.setChecked(False)
+                self.export_checkbox.blockSignals(False)
+                return
+            print(f"Exporting polled values to {self.exporter.path}")
+        elif not checked and self.exporter is not None:
+            self.exporter.close()
+            self.exporter = None
+
+    def on_ui_refresh_rate_changed(self, rate):
+        self.ui_refresh_hz = int(rate)
+        self.ui_refresh_timer.setInterval(1000 // self.ui_refresh_hz)
+
     def on_checkbox_state_changed(self):
         checkbox = self.sender()
         name = checkbox.text()
@@ -325,6 +583,7 @@ class MainWindow(QtWidgets.QMainWindow):
             w.update_device_name()
             w.set_active_connection()
             w.on_connection_settings_updated()
+            w.update_registers_to_read()
 
     def on_drop_down_menu_selected(self, device_number, position):
         current_table = self.observer.table_widgets[device_number]
@@ -337,6 +596,15 @@ class MainWindow(QtWidgets.QMainWindow):
         elif position == REMOVE_REGISTERS_ID:
             current_table.delete_registers()
 
+        elif position == SET_SCAN_CLASS_ID:
+            current_table.set_scan_classes()
+
+        elif position == SET_DATA_TYPE_ID:
+            current_table.set_data_types()
+
+        elif position == SET_DEADBAND_ID:
+            current_table.set_deadbands()
+
         elif position == CONNECT_ID:
             current_text = current_table.action_menu.currentText()
             if current_text == CONNECT:
@@ -439,6 +707,15 @@ class MainWindow(QtWidgets.QMainWindow):
         cb.stateChanged.connect(self.on_checkbox_state_changed)
         self.toolbar.addWidget(cb)
 
+    def closeEvent(self, event):
+        if self.historian is not None:
+            self.historian.close()
+            self.historian = None
+        if self.exporter is not None:
+            self.exporter.close()
+            self.exporter = None
+        super().closeEvent(event)
+
     def check_for_connected_devices(self):
         return any(d.connection_status for d in self.observer.table_widgets.values())
 
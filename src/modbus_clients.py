@@ -2,8 +2,9 @@
 This is an abstract class from which we will inherit when implementing
 methods used for connecting to modbus protocols.
 """
-from pymodbus.client import ModbusTcpClient, ModbusSerialClient
 from file_handler import FileHandler
+from bus_manager import SerialBusManager
+from tcp_pool import TcpConnectionPool
 from constants import RTU_METHOD, TCP_METHOD, SERIAL_PORT, BAUD_RATE, PARITY, STOP_BITS, BYTESIZE, TIMEOUT, HOST, PORT
 
 
@@ -16,8 +17,8 @@ class ModbusClient:
     create an instance of of a modbus client.
     """
 
-    def __init__(self, device_number):
-            self.file_handler = FileHandler()
+    def __init__(self, device_number, file_handler=None):
+            self.file_handler = file_handler if file_handler is not None else FileHandler()
             self.device_number = device_number
             self.client = self._generate_client()
             
@@ -52,8 +53,8 @@ class ModbusRTU(ModbusClient):
             return None
         if RTU_METHOD in device_protocols:
             connection_attributes = self.file_handler.get_connection_params(self.device_number)[RTU_METHOD]
-            client = ModbusSerialClient(
-                method=RTU_METHOD,
+            # Slaves on the same serial port share one client, see bus_manager.
+            client = SerialBusManager.get_client(
                 port=connection_attributes[SERIAL_PORT], 
                 baudrate=int(connection_attributes[BAUD_RATE]), 
                 parity=connection_attributes[PARITY], 
@@ -80,7 +81,8 @@ class ModbusTCP(ModbusClient):
             connection_attributes = self.file_handler.get_connection_params(self.device_number)[TCP_METHOD]
             host = connection_attributes[HOST]
             port = connection_attributes[PORT]
-            client = ModbusTcpClient(host, port)
+            # Devices at the same host and port share one connection, see tcp_pool.
+            client = TcpConnectionPool.get_client(host, port)
             return client
         return None
     
@@ -6,7 +6,7 @@ from PyQt5.QtWidgets import  QGroupBox, QVBoxLayout, QLabel, \
 
 
 from constants import NO_COM_PORTS, PARITY_ITEMS, STOP_BIT_ITEMS, BAUD_RATE_ITEMS, \
-        BYTESIZE_ITEMS, TIMEOUT_ITEMS
+        BYTESIZE_ITEMS, TIMEOUT_ITEMS, DEFAULT_PIPELINE_WINDOW
 
 
 
@@ -161,6 +161,14 @@ class TcpGroupBox(QGroupBox):
         self.port_label = QLabel("Port Number")
         self.port = QLineEdit()
 
+        # Create the fourth horizontal layout for the number of requests that may be in flight at once
+        r_set_h_layout_4 = QHBoxLayout()
+        self.pipeline_window_label = QLabel("In-flight Requests")
+        self.pipeline_window = QLineEdit(str(DEFAULT_PIPELINE_WINDOW))
+        self.pipeline_window.setToolTip("Number of read requests sent before waiting for a response.\nUsed by the Asyncio polling engine.")
+        r_set_h_layout_4.addWidget(self.pipeline_window_label)
+        r_set_h_layout_4.addWidget(self.pipeline_window)
+
         # Add label and slave widgets to the first horizontal layout for "Modbus TCP"
         tcp_slave_id_h_layout.addWidget(self.tcp_slave_id_label)
         tcp_slave_id_h_layout.addWidget(self.tcp_slave_id)
@@ -192,6 +200,7 @@ class TcpGroupBox(QGroupBox):
         modbust_tcp_group_box_layout.addLayout(r_set_v_layout_1)
         modbust_tcp_group_box_layout.addLayout(r_set_v_layout_2)
         modbust_tcp_group_box_layout.addLayout(r_set_v_layout_3)
+        modbust_tcp_group_box_layout.addLayout(r_set_h_layout_4)
 
         # Set the layout of the "Modbus TCP" group box
         self.setLayout(modbust_tcp_group_box_layout)
@@ -205,4 +214,13 @@ class TcpGroupBox(QGroupBox):
     def set_slave_address_invisible(self, status):
         status = not status
         self.tcp_slave_id_label.setVisible(status)
-        self.tcp_slave_id.setVisible(status)
\ No newline at end of file
+        self.tcp_slave_id.setVisible(status)
+
+    def get_pipeline_window(self) -> int:
+        """
+        Returns the number of in-flight requests entered by the user, or the default if the entry is not a positive integer.
+        """
+        value = self.pipeline_window.text().strip()
+        if value.isdigit() and int(value) > 0:
+            return int(value)
+        return DEFAULT_PIPELINE_WINDOW
\ No newline at end of file
@@ -0,0 +1,279 @@
+"""
+This module collects poll statistics: how long requests, device reads and
+poll cycles take, how many requests timed out or were answered with a
+Modbus exception, how many were retried, how many cycles overran their
+interval, and the poll rate achieved against the target.
+
+Recording is meant for the poll loop: every record_*() call is a few
+integer updates and one bisect into a fixed list of latency buckets, with
+no locks, allocation or I/O. Each DeviceStats is only written by the
+thread that reads its device, and a CycleStats by the thread that runs
+the cycles, so reports taken from another thread are at most one sample
+behind. Nothing here imports Qt.
+"""
+
+import json
+import time
+from time import perf_counter
+from bisect import bisect_left
+from pymodbus.exceptions import ModbusIOException
+
+
+# Upper bounds of the latency buckets, in seconds: 1-2-5 steps from 0.1 ms to 10 s.
+# Longer latencies are counted in one more bucket.
+LATENCY_BUCKETS_S = [step * 10.0 ** exponent for exponent in range(-4, 1) for step in (1, 2, 5)] + [10.0]
+
+# Outcomes of a single Modbus request, see DeviceStats.record_request()
+REQUEST_OK = 0
+REQUEST_TIMEOUT = 1
+REQUEST_ERROR = 2
+
+
+def request_outcome(response) -> int:
+    """
+    Returns the outcome of a Modbus request from its pymodbus response.
+    No response, or a ModbusIOException returned instead of one, counts as a timeout.
+    """
+    if response is None or isinstance(response, ModbusIOException):
+        return REQUEST_TIMEOUT
+    if response.isError():
+        return REQUEST_ERROR
+    return REQUEST_OK
+
+
+class LatencyHistogram:
+    """Counts latencies in the buckets of LATENCY_BUCKETS_S."""
+
+    __slots__ = ('counts', 'count', 'total', 'min', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_S) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+
+    def record(self, seconds):
+        self.counts[bisect_left(LATENCY_BUCKETS_S, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if self.max is None or seconds > self.max:
+            self.max = seconds
+
+
+    def percentile(self, fraction) -> float:
+        """
+        Returns the latency below which the given fraction of the samples fall, in seconds,
+        interpolated within the bucket holding that sample and kept between the minimum and maximum.
+        """
+        if not self.count:
+            return 0.0
+        wanted = fraction * self.count
+        seen = 0
+        lower = self.min
+        for bound, count in zip(LATENCY_BUCKETS_S + [self.max], self.counts):
+            if count and seen + count >= wanted:
+                upper = min(bound, self.max)
+                lower = min(max(lower, self.min), upper)
+                return lower + (upper - lower) * (wanted - seen) / count
+            seen += count
+            lower = bound
+        return self.max
+
+
+    def summary(self) -> dict:
+        """Returns the count, mean, min, max and percentiles in milliseconds, and the bucket counts."""
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count * 1000, 3),
+            "min_ms": round(self.min * 1000, 3),
+            "p50_ms": round(self.percentile(0.50) * 1000, 3),
+            "p95_ms": round(self.percentile(0.95) * 1000, 3),
+            "p99_ms": round(self.percentile(0.99) * 1000, 3),
+            "max_ms": round(self.max * 1000, 3),
+            "buckets": {
+                (f"<={bound * 1000:g}ms" if index < len(LATENCY_BUCKETS_S) else f">{LATENCY_BUCKETS_S[-1] * 1000:g}ms"): count
+                for index, (bound, count) in enumerate(zip(LATENCY_BUCKETS_S + [None], self.counts)) if count
+            },
+        }
+
+
+class CycleStats:
+    """Statistics of poll cycles: their duration, overruns and the achieved rate."""
+
+    def __init__(self, interval_ms=0):
+        """
+        args:
+            interval_ms (int): The target cycle time.
+        """
+        self.interval_ms = interval_ms
+        self.reset()
+
+
+    def reset(self, interval_ms=None):
+        """Clears every statistic, and sets a new target cycle time if given."""
+        if interval_ms is not None:
+            self.interval_ms = interval_ms
+        self.latency = LatencyHistogram()
+        self.overruns = 0
+        self.first_start = None
+        self.last_start = None
+
+
+    def record(self, start, duration):
+        """
+        args:
+            start (float): The perf_counter time the cycle began.
+            duration (float): How long the cycle took, in seconds.
+        """
+        self.latency.record(duration)
+        if duration * 1000 > self.interval_ms:
+            self.overruns += 1
+        if self.first_start is None:
+            self.first_start = start
+        self.last_start = start
+
+
+    def achieved_hz(self) -> float:
+        """Returns the rate at which cycles began, or 0 before the second cycle."""
+        count = self.latency.count
+        if count < 2 or self.last_start <= self.first_start:
+            return 0.0
+        return (count - 1) / (self.last_start - self.first_start)
+
+
+    def summary(self) -> dict:
+        return {
+            "target_hz": round(1000 / self.interval_ms, 3) if self.interval_ms else None,
+            "achieved_hz": round(self.achieved_hz(), 3),
+            "overruns": self.overruns,
+            "duration": self.latency.summary(),
+        }
+
+
+class DeviceStats:
+    """Statistics of the requests and reads of one device."""
+
+    def __init__(self):
+        # Cycles of this device alone, in independent poll mode
+        self.cycles = CycleStats()
+        # The adaptive_timeout.AdaptiveTimeout of the device, whose current timeout is reported
+        self.timeout = None
+        self.reset()
+
+
+    def reset(self):
+        """Clears every statistic. The target cycle time is kept."""
+        self.request_latency = LatencyHistogram()
+        self.read_latency = LatencyHistogram()
+        self.timeouts = 0
+        self.error_responses = 0
+        self.retries = 0
+        self.connection_losses = 0
+        self.reconnects = 0
+        self.quarantines = 0
+        self.cycles.reset()
+
+
+    def record_request(self, seconds, outcome=REQUEST_OK):
+        """
+        Records one Modbus request.
+
+        args:
+            seconds (float): The time from sending the request to receiving the response or giving up.
+            outcome (int): REQUEST_OK, REQUEST_TIMEOUT if no valid response arrived,
+                or REQUEST_ERROR if the device answered with a Modbus exception.
+        """
+        self.request_latency.record(seconds)
+        if outcome == REQUEST_TIMEOUT:
+            self.timeouts += 1
+        elif outcome == REQUEST_ERROR:
+            self.error_responses += 1
+
+
+    def record_read(self, seconds):
+        """Records one read of the device, i.e. all of its due requests."""
+        self.read_latency.record(seconds)
+
+
+    def record_retry(self):
+        self.retries += 1
+
+
+    def record_connection_loss(self):
+        self.connection_losses += 1
+
+
+    def record_reconnect(self):
+        self.reconnects += 1
+
+
+    def record_quarantine(self):
+        """Records that the device was taken out of the poll cycle, see circuit_breaker."""
+        self.quarantines += 1
+
+
+    def summary(self) -> dict:
+        summary = {
+            "requests": self.request_latency.count,
+            "timeouts": self.timeouts,
+            "error_responses": self.error_responses,
+            "retries": self.retries,
+            "connection_losses": self.connection_losses,
+            "reconnects": self.reconnects,
+            "quarantines": self.quarantines,
+            "request_latency": self.request_latency.summary(),
+            "read_latency": self.read_latency.summary(),
+        }
+        if self.timeout is not None:
+            summary["timeout_ms"] = round(self.timeout.timeout_s * 1000, 3)
+        if self.cycles.latency.count:
+            summary["cycles"] = self.cycles.summary()
+        return summary
+
+
+class PollStats:
+    """The statistics of one polling session: its cycles and the DeviceStats of every device polled."""
+
+    def __init__(self, devices=None, interval_ms=0):
+        """
+        args:
+            devices (dict): {device_number: DeviceStats}, usually the stats of acquisition.Device objects.
+            interval_ms (int): The target cycle time of synchronized polling.
+        """
+        self.devices = dict(devices or {})
+        self.cycles = CycleStats(interval_ms)
+        self.started = time.time()
+        self.started_perf = perf_counter()
+
+
+    def reset(self):
+        """Clears every statistic and restarts the session."""
+        for stats in self.devices.values():
+            stats.reset()
+        self.cycles.reset()
+        self.started = time.time()
+        self.started_perf = perf_counter()
+
+
+    def report(self) -> dict:
+        """Returns every statistic as a dictionary that can be written as JSON."""
+        report = {
+            "started": self.started,
+            "duration_s": round(perf_counter() - self.started_perf, 3),
+            "devices": {str(device_number): stats.summary() for device_number, stats in self.devices.items()},
+        }
+        if self.cycles.latency.count:
+            report["cycles"] = self.cycles.summary()
+        return report
+
+
+    def write_report(self, path):
+        """Writes report() to a JSON file."""
+        with open(path, 'w') as file:
+            json.dump(self.report(), file, indent=2)
@@ -0,0 +1,343 @@
+"""
+This module turns a device's register list into the Modbus read requests
+needed to poll it, compiled once into a ScanPlan so that each poll only
+sends requests and copies slices of the responses into table rows.
+It has no GUI dependencies so it can be used and benchmarked without a
+QApplication.
+"""
+
+from time import perf_counter
+from bisect import bisect_right
+from constants import FUNCTION_CODE, REGISTER_QUANTITY, MAX_READ_QUANTITY, \
+        SCAN_CLASS, SCAN_CLASSES, DEFAULT_SCAN_CLASS, DEFAULT_MAX_READ_GAP
+
+
+# Name of the pymodbus client method used for each read function code.
+# The sync and async clients share these names.
+READ_METHODS = {
+    1: "read_coils",
+    2: "read_discrete_inputs",
+    3: "read_holding_registers",
+    4: "read_input_registers"
+}
+
+# Fraction of a scan class interval by which a poll may come early and still read the class.
+# Poll timers are not exact, and a class whose interval equals the poll interval
+# would otherwise be skipped every other poll.
+DUE_TOLERANCE = 0.1
+
+
+def extract_register_patterns(input_dict):
+    """
+    This lovely method looks for a pattern of contiguous registers that share a common function code for batch reading which saves time.
+    A pattern also ends where the scan class changes, so every pattern belongs to a single scan class.
+
+    args:
+        input_dict (dict): A dictionary of registers obtained from the register JSON file in the data directory.
+
+    returns:
+        output_dict (dict): A dictionary containing groups of registers that share a common function code, represented by the starting register.
+
+    example:
+        input_dict = {
+            '10': {'function_code': 3},
+            '11': {'function_code': 3},
+            '12': {'function_code': 3, 'scan_class': 'Fast'},
+            '13': {'function_code': 4},
+            '14': {'function_code': 2},
+            '15': {'function_code': 2},
+            '16': {'function_code': 1}
+        }
+
+        output_dict = {
+            10: {'function_code': 3, 'quantity': 2, 'scan_class': 'Normal'},
+            12: {'function_code': 3, 'quantity': 1, 'scan_class': 'Fast'},
+            13: {'function_code': 4, 'quantity': 1, 'scan_class': 'Normal'},
+            14: {'function_code': 2, 'quantity': 2, 'scan_class': 'Normal'},
+            16: {'function_code': 1, 'quantity': 1, 'scan_class': 'Normal'}
+        }
+    """
+    output_dict = {}
+    current_key = previous_register = previous_fx = previous_class = None
+
+    for key, attributes in input_dict.items():
+        current_register = int(key)
+        current_fx = attributes[FUNCTION_CODE]
+        current_class = attributes.get(SCAN_CLASS) or DEFAULT_SCAN_CLASS
+        if previous_register is not None and previous_register + 1 == current_register \
+                and previous_fx == current_fx and previous_class == current_class:
+            output_dict[current_key][REGISTER_QUANTITY] += 1
+        else:
+            current_key = current_register
+            output_dict[current_key] = {FUNCTION_CODE: current_fx, REGISTER_QUANTITY: 1, SCAN_CLASS: current_class}
+        previous_register = current_register
+        previous_fx = current_fx
+        previous_class = current_class
+    return output_dict
+
+
+def _bridges_forbidden(gap_start, gap_end, forbidden):
+    """
+    Returns True if any register in [gap_start, gap_end) lies in one of the forbidden (start, end) ranges, ends inclusive.
+    """
+    for start, end in forbidden:
+        if start < gap_end and end >= gap_start:
+            return True
+    return False
+
+
+def build_read_requests(registers_to_read, max_gap=DEFAULT_MAX_READ_GAP, forbidden_ranges=()):
+    """
+    Groups register patterns by function code and packs them into as few
+    read requests as possible.
+
+    A request may span up to max_gap unused registers to join two groups of
+    registers, as long as it stays within the Modbus quantity limit and does
+    not cross a forbidden range. The values read for those filler registers
+    are never copied to the table, see compile_requests().
+
+    Packing is greedy: each request starts at the first register not yet
+    covered and is extended as far as the constraints allow. Any part of a
+    valid request is itself valid, so this gives the fewest requests.
+
+    args:
+        registers_to_read (dict): The output of extract_register_patterns().
+        max_gap (int): The longest run of unused registers a request may span.
+        forbidden_ranges (list): (function_code, start, end) ranges, ends inclusive, that filler must never read.
+
+    returns:
+        requests (list): A list of (function_code, start, quantity, entries) tuples,
+            where entries is the sorted list of (address, quantity) patterns of that function code.
+
+    example:
+        registers_to_read = {10: {'function_code': 3, 'quantity': 1}, 12: {'function_code': 3, 'quantity': 1}}
+
+        build_read_requests(registers_to_read)              = [(3, 10, 1, entries), (3, 12, 1, entries)]
+        build_read_requests(registers_to_read, max_gap=1)   = [(3, 10, 3, entries)]
+    """
+    grouped = {}
+
+    # Group registers by function code
+    for address, attributes in registers_to_read.items():
+        if address is None:
+            continue
+        grouped.setdefault(attributes[FUNCTION_CODE], []).append(
+            (address, attributes[REGISTER_QUANTITY])
+        )
+
+    requests = []
+    for function_code, entries in grouped.items():
+        max_chunk = MAX_READ_QUANTITY.get(function_code)
+        if max_chunk is None:
+            continue
+
+        entries.sort(key=lambda x: x[0])
+        forbidden = [(start, end) for fc, start, end in forbidden_ranges if fc == function_code]
+
+        request_start = request_end = None
+        for address, quantity in entries:
+            block_start = address
+            block_end = address + quantity
+            if request_end is not None and block_start < request_end:
+                # Overlaps what is already covered
+                block_start = request_end
+            while block_start < block_end:
+                if request_start is not None \
+                        and block_start - request_end <= max_gap \
+                        and block_start < request_start + max_chunk \
+                        and not _bridges_forbidden(request_end, block_start, forbidden):
+                    # Extend the current request
+                    request_end = min(block_end, request_start + max_chunk)
+                else:
+                    if request_start is not None:
+                        requests.append((function_code, request_start, request_end - request_start, entries))
+                    request_start = block_start
+                    request_end = min(block_end, block_start + max_chunk)
+                block_start = request_end
+        if request_start is not None:
+            requests.append((function_code, request_start, request_end - request_start, entries))
+
+    return requests
+
+
+def parse_forbidden_ranges(text) -> list:
+    """
+    Parses forbidden ranges entered as comma separated 'function_code:start-end' items, e.g. '3:100-119, 4:7'.
+
+    returns:
+        ranges (list): A list of [function_code, start, end] lists, ends inclusive.
+
+    raises:
+        ValueError: If an item is not in the expected format.
+    """
+    ranges = []
+    for item in text.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        function_code, _, addresses = item.partition(':')
+        start, _, end = addresses.partition('-')
+        function_code, start = int(function_code), int(start)
+        end = int(end) if end else start
+        if function_code not in MAX_READ_QUANTITY or start < 0 or end < start:
+            raise ValueError(f"Invalid forbidden range '{item}'")
+        ranges.append([function_code, start, end])
+    return ranges
+
+
+def format_forbidden_ranges(ranges) -> str:
+    """
+    The reverse of parse_forbidden_ranges().
+    """
+    return ', '.join(
+        f'{function_code}:{start}' if start == end else f'{function_code}:{start}-{end}'
+        for function_code, start, end in ranges
+    )
+
+
+class ReadRequest:
+    """
+    One compiled read request.
+
+    slices holds (source start, source end, row) tuples: the values
+    response[source start:source end] belong to the table rows starting at row.
+    Filler values between the slices are never copied.
+    """
+
+    __slots__ = ('function_code', 'method', 'start', 'quantity', 'bits', 'slices')
+
+    def __init__(self, function_code, start, quantity, slices):
+        self.function_code = function_code
+        self.method = READ_METHODS[function_code]
+        self.start = start
+        self.quantity = quantity
+        self.bits = function_code in (1, 2)
+        self.slices = slices
+
+
+def compile_requests(requests, pattern_rows) -> list:
+    """
+    Turns the output of build_read_requests() into ReadRequest objects that copy values straight to table rows.
+
+    args:
+        requests (list): The output of build_read_requests().
+        pattern_rows (dict): {(function_code, address): row} for the first register of every pattern.
+
+    returns:
+        compiled (list): A ReadRequest for every request, in the same order.
+    """
+    compiled = []
+    for function_code, chunk_start, chunk_quantity, entries in requests:
+        chunk_end = chunk_start + chunk_quantity
+        # Entries are sorted and do not overlap, so only those from the first one ending after chunk_start can overlap.
+        index = bisect_right(entries, (chunk_start, float('inf')))
+        if index:
+            index -= 1
+        slices = []
+        for address, quantity in entries[index:]:
+            if address >= chunk_end:
+                break
+            start = max(address, chunk_start)
+            end = min(address + quantity, chunk_end)
+            if start < end:
+                row = pattern_rows[(function_code, address)] + start - address
+                if slices and slices[-1][1] == start - chunk_start and slices[-1][2] + slices[-1][1] - slices[-1][0] == row:
+                    # Continues the previous slice in both the response and the table
+                    slices[-1] = (slices[-1][0], end - chunk_start, slices[-1][2])
+                else:
+                    slices.append((start - chunk_start, end - chunk_start, row))
+        compiled.append(ReadRequest(function_code, chunk_start, chunk_quantity, slices))
+    return compiled
+
+
+class ScanPlan:
+    """
+    The compiled read plan of one device, split by scan class.
+
+    The plan is built once when the registers change. Polling then only
+    sends the requests of the classes that are due and copies slices of
+    each response into values, which holds one value per table row.
+    Registers whose class is not due keep the value from their last read.
+    """
+
+    def __init__(self, registers_to_read, max_gap=DEFAULT_MAX_READ_GAP, forbidden_ranges=()):
+        """
+        args:
+            registers_to_read (dict): The output of extract_register_patterns(), in table row order.
+            max_gap (int), forbidden_ranges (list): Passed on to build_read_requests().
+        """
+        self.max_gap = max_gap
+        self.forbidden_ranges = forbidden_ranges
+
+        # Table row of the first register of every pattern
+        pattern_rows = {}
+        row = 0
+        for address, attributes in registers_to_read.items():
+            pattern_rows[(attributes[FUNCTION_CODE], address)] = row
+            row += attributes[REGISTER_QUANTITY]
+        self.size = row
+
+        # Every register in one plan
+        self.requests = compile_requests(build_read_requests(registers_to_read, max_gap, forbidden_ranges), pattern_rows)
+
+        # {scan_class: (interval in seconds, requests)}
+        self.classes = {}
+        for scan_class in {attributes.get(SCAN_CLASS, DEFAULT_SCAN_CLASS) for attributes in registers_to_read.values()}:
+            patterns = {
+                address: attributes for address, attributes in registers_to_read.items()
+                if attributes.get(SCAN_CLASS, DEFAULT_SCAN_CLASS) == scan_class
+            }
+            requests = compile_requests(build_read_requests(patterns, max_gap, forbidden_ranges), pattern_rows)
+            interval = SCAN_CLASSES.get(scan_class, SCAN_CLASSES[DEFAULT_SCAN_CLASS]) / 1000
+            self.classes[scan_class] = (interval, requests)
+
+        self.values = [""] * self.size
+        self._next_due = {}
+
+
+    def due_classes(self, now=None) -> list:
+        """
+        Returns the scan classes that are due at time now (perf_counter seconds) and schedules their next read.
+        A class that has never been read is always due.
+        """
+        if now is None:
+            now = perf_counter()
+        due = []
+        for scan_class, (interval, _) in self.classes.items():
+            next_due = self._next_due.get(scan_class)
+            if next_due is None or now >= next_due - interval * DUE_TOLERANCE:
+                due.append(scan_class)
+                # Keep a fixed cadence, unless polling has fallen a whole interval behind.
+                next_due = now if next_due is None or now - next_due >= interval else next_due
+                self._next_due[scan_class] = next_due + interval
+        return due
+
+
+    def due_requests(self, now=None) -> list:
+        """
+        Returns the requests of every scan class that is due, see due_classes().
+        """
+        classes = self.classes
+        return [request for scan_class in self.due_classes(now) for request in classes[scan_class][1]]
+
+
+    def store(self, request, response):
+        """
+        Copies the values of one response into self.values.
+
+        args:
+            request (ReadRequest): The request that was sent.
+            response: The pymodbus response, or None if the request failed. Failed requests store 'Error'.
+        """
+        values = self.values
+        data = None
+        if response is not None and not response.isError():
+            data = response.bits if request.bits else response.registers
+        # A short response would shrink values when assigned to the slices
+        if data is None or len(data) < request.quantity:
+            for begin, end, row in request.slices:
+                values[row:row + end - begin] = ["Error"] * (end - begin)
+            return
+
+        for begin, end, row in request.slices:
+            values[row:row + end - begin] = data[begin:end]
@@ -0,0 +1,166 @@
+"""
+This module converts the raw register values of a device into engineering
+values, according to each register's data type, gain, offset and byte and
+word order.
+
+The decoding is compiled once per register list. Each poll then packs the
+raw words of the whole device into bytes once per byte order and unpacks
+all values that share a byte and word order with a single precompiled
+struct, so no register is decoded on its own.
+"""
+
+import struct
+from constants import FUNCTION_CODE, DATA_TYPE, GAIN, OFFSET, BYTE_ORDER, WORD_ORDER, \
+        STRING_LENGTH, STRING_DATA_TYPE, BIG_ENDIAN
+
+
+# struct format character and register count of each numeric data type
+DATA_TYPES = {
+    "int16": ('h', 1),
+    "uint16": ('H', 1),
+    "int32": ('i', 2),
+    "uint32": ('I', 2),
+    "float32": ('f', 2),
+    "int64": ('q', 4),
+    "uint64": ('Q', 4),
+    "float64": ('d', 4),
+}
+
+# Function codes whose values are 16 bit registers
+REGISTER_FUNCTION_CODES = (3, 4)
+
+
+def _orders(byte_big, word_big):
+    """
+    Returns the (pack order, read order) struct prefixes that decode a value with the given byte and word order.
+
+    The words are packed big or little endian, which swaps the bytes of each
+    register or not, and the packed bytes are then read as one big or little
+    endian value, which reverses the registers or not:
+        ABCD: byte big,    word big    -> pack '>', read '>'
+        DCBA: byte little, word little -> pack '>', read '<'
+        CDAB: byte big,    word little -> pack '<', read '<'
+        BADC: byte little, word big    -> pack '<', read '>'
+    """
+    pack_order = '>' if byte_big == word_big else '<'
+    read_order = '>' if word_big else '<'
+    return pack_order, read_order
+
+
+class RegisterDecoder:
+    """
+    Decodes the per-row values of one device, see ScanPlan.values.
+
+    Rows without a data type, coils and discrete inputs are returned as they
+    are. A value longer than one register is shown in the row of its first
+    register; the rows of the registers that follow are left blank.
+    """
+
+    def __init__(self, registers):
+        """
+        args:
+            registers (dict): {address: attributes} in table row order, see FileHandler.get_register_formats().
+        """
+        rows = [(int(address), attributes) for address, attributes in registers.items()]
+        self.size = len(rows)
+
+        # {(pack order, read order): [(row, count, gain, offset, kind), ...]}
+        groups = {}
+        next_row = 0
+        for row, (address, attributes) in enumerate(rows):
+            if row < next_row:
+                # Part of the previous value
+                continue
+            data_type = attributes.get(DATA_TYPE)
+            function_code = attributes.get(FUNCTION_CODE)
+            if function_code not in REGISTER_FUNCTION_CODES:
+                continue
+            if data_type == STRING_DATA_TYPE:
+                count = max(1, int(attributes.get(STRING_LENGTH) or 1))
+                code = f'{count * 2}s'
+            elif data_type in DATA_TYPES:
+                code, count = DATA_TYPES[data_type]
+            else:
+                continue
+
+            # The value's registers must be the following rows of the table
+            if row + count > self.size or any(
+                rows[row + i][0] != address + i or rows[row + i][1].get(FUNCTION_CODE) != function_code
+                for i in range(1, count)
+            ):
+                print(f"Register {address} needs the next {count - 1} registers to decode {data_type}; showing raw values")
+                continue
+
+            byte_big = attributes.get(BYTE_ORDER, BIG_ENDIAN) == BIG_ENDIAN
+            if data_type == STRING_DATA_TYPE:
+                # Strings are read byte by byte, in register order
+                word_big = True
+            elif count == 1:
+                # Only the byte order applies to single register values
+                word_big = byte_big
+            else:
+                word_big = attributes.get(WORD_ORDER, BIG_ENDIAN) == BIG_ENDIAN
+
+            gain = attributes.get(GAIN) or 1
+            offset = attributes.get(OFFSET) or 0
+            kind = 's' if data_type == STRING_DATA_TYPE else ('f' if data_type == "float32" else 'n')
+            groups.setdefault(_orders(byte_big, word_big), []).append((row, count, code, gain, offset, kind))
+            next_row = row + count
+
+        # One struct per group, with pad bytes over the rows that are not part of it
+        self.groups = []
+        self.pack_orders = set()
+        for (pack_order, read_order), fields in groups.items():
+            format_parts = [read_order]
+            cursor = 0
+            for row, count, code, _, _, _ in fields:
+                if row > cursor:
+                    format_parts.append(f'{(row - cursor) * 2}x')
+                format_parts.append(code)
+                cursor = row + count
+            fields = [(row, count, gain, offset, kind) for row, count, _, gain, offset, kind in fields]
+            self.groups.append((pack_order, struct.Struct(''.join(format_parts)), fields))
+            self.pack_orders.add(pack_order)
+
+        self._packers = {order: struct.Struct(f'{order}{self.size}H') for order in self.pack_orders}
+
+
+    def decode(self, values) -> list:
+        """
+        Returns the decoded values of every row.
+
+        args:
+            values (list): The raw value of every row. Rows may hold 'Error' or '' instead of a number.
+
+        returns:
+            decoded (list): A new list with one value per row.
+        """
+        decoded = list(values)
+        if not self.groups or len(values) != self.size:
+            return decoded
+
+        errors = None
+        try:
+            buffers = {order: packer.pack(*values) for order, packer in self._packers.items()}
+        except struct.error:
+            # Some rows hold no number; decode zeros there and mark the values that use them
+            errors = {row for row, value in enumerate(values) if not isinstance(value, int)}
+            words = [0 if row in errors else value for row, value in enumerate(values)]
+            buffers = {order: packer.pack(*words) for order, packer in self._packers.items()}
+
+        for pack_order, unpacker, fields in self.groups:
+            for (row, count, gain, offset, kind), value in zip(fields, unpacker.unpack_from(buffers[pack_order])):
+                if errors and not errors.isdisjoint(range(row, row + count)):
+                    value = "Error"
+                elif kind == 's':
+                    value = value.decode('ascii', errors='replace').strip('\x00 ')
+                else:
+                    if kind == 'f':
+                        # Drop the digits float32 does not have
+                        value = float(f'{value:.7g}')
+                    if gain != 1 or offset:
+                        value = value * gain + offset
+                decoded[row] = value
+                if count > 1:
+                    decoded[row + 1:row + count] = [""] * (count - 1)
+        return decoded
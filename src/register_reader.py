@@ -19,21 +19,52 @@ class DeviceWorker(QObject):
     Lives in its own QThread and performs a single Modbus read each time
     do_read() is invoked via a queued signal connection.
 
+    In independent poll mode start_polling() makes the worker read the
+    device on its own single-shot QTimer instead, so a slow or unreachable
+    device only delays itself.
+
+    A device that keeps failing is quarantined by its circuit breaker, so
+    do_read() returns at once except for an occasional probe. The
+    PollCoordinator does not wait for quarantined workers, and a worker skips
+    the triggers that queued up while it was probing.
+
     Because there is no blocking run() loop the thread keeps a normal Qt
     event loop, so thread.quit() always succeeds immediately.
     """
 
-    result         = pyqtSignal(int, list)   # device_number, data
-    finished_cycle = pyqtSignal(int)         # device_number
-    error          = pyqtSignal(int, str)    # device_number, message
+    result          = pyqtSignal(int, object) # device_number, data (list, or {row: value} of changes)
+    finished_cycle  = pyqtSignal(int)         # device_number
+    error           = pyqtSignal(int, str)    # device_number, message
+    connection_lost = pyqtSignal(int)         # device_number
+    connection_restored = pyqtSignal(int)     # device_number, reconnected automatically
+    quarantine_changed  = pyqtSignal(int, bool)  # device_number, quarantined, see circuit_breaker
 
     # Emitted internally so stop() can be called safely from any thread
-    _stop_requested = pyqtSignal()
+    _stop_requested  = pyqtSignal()
+    _start_requested = pyqtSignal(int)       # interval_ms
 
-    def __init__(self, device):
+    def __init__(self, device, report_by_exception=False):
+        """
+        device              : acquisition.Device to read. Widgets only observe the signals.
+        report_by_exception : emit only the values that moved by more than their
+                              deadband, as {row: value}, instead of every value
+        """
         super().__init__()
         self.device = device
+        self.report_by_exception = report_by_exception
+        if report_by_exception:
+            # The first read passes on every value
+            device.deadband.reset()
+        self.interval_ms = 0
+        self._read_end = 0.0
+
+        # Independent mode timer. Parented to the worker so moveToThread() moves it too.
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._poll)
+
         self._stop_requested.connect(self._on_stop_requested, Qt.QueuedConnection)
+        self._start_requested.connect(self._on_start_requested, Qt.QueuedConnection)
 
     # ------------------------------------------------------------------
     # Public API (thread-safe)
@@ -43,34 +74,79 @@ class DeviceWorker(QObject):
         """Call from any thread; schedules client close on the worker thread."""
         self._stop_requested.emit()
 
+    def start_polling(self, interval_ms: int):
+        """Call from any thread; reads the device every interval_ms on the worker thread."""
+        self._start_requested.emit(interval_ms)
+
     # ------------------------------------------------------------------
     # Slots – executed on the worker thread
     # ------------------------------------------------------------------
 
-    @pyqtSlot()
-    def do_read(self):
-        """Triggered by PollCoordinator.trigger_workers signal."""
-        if not self.device.connection_status:
-            self.finished_cycle.emit(self.device.device_number)
+    @pyqtSlot(float)
+    def do_read(self, cycle_start: float):
+        """Triggered by PollCoordinator.trigger_workers signal, with the perf_counter time the cycle started."""
+        device = self.device
+        was_connected = device.connected
+        was_quarantined = device.breaker.quarantined
+        if not was_connected and not device.auto_reconnect:
+            self.finished_cycle.emit(device.device_number)
+            return
+        if cycle_start < self._read_end:
+            # Queued while the previous read, a probe, was running. The coordinator did not wait for it.
+            self.finished_cycle.emit(device.device_number)
             return
 
         try:
-            data = self.device.read_registers()
-            self.result.emit(self.device.device_number, data)
+            # Read and request times are recorded in device.stats.
+            # A lost TCP connection is restored by the read, see Device.reconnect().
+            read_start = time.perf_counter()
+            if self.report_by_exception:
+                data = device.read_changes(read_start)
+            else:
+                data = device.read(read_start)
+            if data:
+                self.result.emit(device.device_number, data)
+            if was_connected and not device.connected:
+                self.error.emit(device.device_number, "Connection lost")
+                self.connection_lost.emit(device.device_number)
+            elif not was_connected and device.connected:
+                self.connection_restored.emit(device.device_number)
+            if was_quarantined != device.breaker.quarantined:
+                self.quarantine_changed.emit(device.device_number, device.breaker.quarantined)
 
         except ModbusIOException:
-            self.error.emit(self.device.device_number, "Modbus IO Exception")
+            self.error.emit(device.device_number, "Modbus IO Exception")
 
         except ConnectionException:
-            self.device.set_connection_status(False)
-            self.error.emit(self.device.device_number, "Connection lost")
+            device.connected = False
+            device.stats.record_connection_loss()
+            self.error.emit(device.device_number, "Connection lost")
+            self.connection_lost.emit(device.device_number)
 
         finally:
-            self.finished_cycle.emit(self.device.device_number)
+            self._read_end = time.perf_counter()
+            self.finished_cycle.emit(device.device_number)
+
+    @pyqtSlot(int)
+    def _on_start_requested(self, interval_ms: int):
+        self.interval_ms = interval_ms
+        self.device.stats.cycles.reset(interval_ms)
+        self._timer.start(0)
+
+    @pyqtSlot()
+    def _poll(self):
+        """Independent mode: one read, then wait for the rest of the interval."""
+        cycle_start = time.perf_counter()
+        self.do_read(cycle_start)
+        elapsed = time.perf_counter() - cycle_start
+        self.device.stats.cycles.record(cycle_start, elapsed)
+        elapsed_ms = elapsed * 1000
+        self._timer.start(max(0, int(self.interval_ms - elapsed_ms)))
 
     @pyqtSlot()
     def _on_stop_requested(self):
-        """Closes the Modbus client on the worker thread."""
+        """Stops the poll timer and closes the Modbus client on the worker thread."""
+        self._timer.stop()
         try:
             self.device.client.close()
         except Exception:
@@ -94,34 +170,40 @@ class PollCoordinator(QObject):
     4. When all workers have reported in → emit synchronized_snapshot
                                          → restart QTimer for next cycle
 
+    Quarantined workers (see DeviceWorker.quarantine_changed) are still
+    triggered, so they can probe their device, but not waited for.
+
     No blocking code, no time.sleep(), no threading primitives.
     """
 
-    # Signal emitted once per cycle when all workers have responded
+    # Signal emitted once per cycle when all workers have responded.
+    # In report-by-exception mode data_dict only holds the devices with changes.
     synchronized_snapshot = pyqtSignal(dict, float)   # data_dict, timestamp
 
     # Connected to every DeviceWorker.do_read slot (queued, cross-thread)
-    trigger_workers = pyqtSignal()
+    trigger_workers = pyqtSignal(float)               # perf_counter time the cycle started
 
     # Internal stop signal so stop() is safe to call from any thread
     _stop_requested = pyqtSignal()
 
-    def __init__(self, workers: dict, interval_ms: int):
+    def __init__(self, workers: dict, interval_ms: int, stats=None):
         """
         Parameters
         ----------
         workers      : {device_number: DeviceWorker}
         interval_ms  : target poll cycle time in milliseconds
+        stats        : poll_stats.CycleStats recording every cycle, or None
         """
         super().__init__()
 
         self.workers      = workers
         self.interval_ms  = interval_ms
+        self.stats        = stats
 
         self._results       = {}
-        self._finished_count = 0
-        self._total_workers  = len(workers)
-        self._cycle_start    = 0.0
+        self._waiting       = set()   # device numbers of the workers this cycle waits for
+        self._quarantined   = {number for number, worker in workers.items() if worker.device.breaker.quarantined}
+        self._cycle_start   = 0.0
 
         # Single-shot timer: restarted at the end of each cycle
         self._timer = QTimer(self)
@@ -135,6 +217,7 @@ class PollCoordinator(QObject):
         for worker in self.workers.values():
             worker.result.connect(self._collect_result)
             worker.finished_cycle.connect(self._on_worker_finished)
+            worker.quarantine_changed.connect(self._on_quarantine_changed)
 
     # ------------------------------------------------------------------
     # Public API (thread-safe)
@@ -160,30 +243,48 @@ class PollCoordinator(QObject):
     @pyqtSlot()
     def _start_cycle(self):
         self._results.clear()
-        self._finished_count = 0
+        self._waiting = set(self.workers) - self._quarantined
         self._cycle_start = time.perf_counter()
-        self.trigger_workers.emit()
+        self.trigger_workers.emit(self._cycle_start)
+        if not self._waiting:
+            self._finish_cycle()
 
-    @pyqtSlot(int, list)
-    def _collect_result(self, device_number: int, data: list):
+    @pyqtSlot(int, object)
+    def _collect_result(self, device_number: int, data):
         self._results[device_number] = data
 
+    @pyqtSlot(int, bool)
+    def _on_quarantine_changed(self, device_number: int, quarantined: bool):
+        # Takes effect from the next cycle; the worker still reports in for this one
+        if quarantined:
+            self._quarantined.add(device_number)
+        else:
+            self._quarantined.discard(device_number)
+
     @pyqtSlot(int)
     def _on_worker_finished(self, device_number: int):
-        self._finished_count += 1
+        if device_number not in self._waiting:
+            # A quarantined worker, or a trigger it skipped
+            return
+        self._waiting.discard(device_number)
 
-        if self._finished_count >= self._total_workers:
+        if not self._waiting:
             # All workers done for this cycle
-            timestamp = time.time()
-            self.synchronized_snapshot.emit(self._results.copy(), timestamp)
+            self._finish_cycle()
+
+    def _finish_cycle(self):
+        timestamp = time.time()
+        self.synchronized_snapshot.emit(self._results.copy(), timestamp)
 
-            elapsed_ms = (time.perf_counter() - self._cycle_start) * 1000
-            next_ms    = max(0, int(self.interval_ms - elapsed_ms))
-            self._timer.start(next_ms)
+        elapsed = time.perf_counter() - self._cycle_start
+        if self.stats is not None:
+            self.stats.record(self._cycle_start, elapsed)
+        next_ms    = max(0, int(self.interval_ms - elapsed * 1000))
+        self._timer.start(next_ms)
 
 
 # ---------------------------------------------------------------------------
-# Observer  (unchanged from original)
+# Observer
 # ---------------------------------------------------------------------------
 
 class Observer:
@@ -200,17 +301,14 @@ class Observer:
 
     def read_all_registers(self):
         result_dict = {}
-        for key, device in self.table_widgets.items():
-            if device.connection_status and not device.hidden_status:
-                try:
-                    response = device.read_registers()
-                    if response:
-                        result_dict[key] = device.read_registers()
-                    else:
-                        print("No response after reading registers")
-                except ModbusIOException:
-                    print("Failed to perform Modbus operation due to IO exception.")
-                except ConnectionException:
+        for key, widget in self.table_widgets.items():
+            if widget.connection_status and not widget.hidden_status:
+                response = widget.device.read()
+                if response:
+                    result_dict[key] = response
+                else:
+                    print("No response after reading registers")
+                if not widget.connection_status:
                     print("Failed to connect to Modbus device.")
-                    device.set_connection_status(False)
+                    widget.set_connection_status(False)
         return result_dict
\ No newline at end of file
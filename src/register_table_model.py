@@ -0,0 +1,151 @@
+"""
+This module implements the Qt item model behind a device's register table.
+
+The table is stored as one compact array per column instead of one item
+object per cell, and value updates are reported to the view as a single
+changed row range, so memory use and repaint cost do not grow with the
+number of items the view creates.
+"""
+
+from array import array
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, pyqtSignal
+
+NAME_COLUMN = 0
+ADDRESS_COLUMN = 1
+VALUE_COLUMN = 2
+
+TABLE_HEADER = {"Register Name": NAME_COLUMN, "Address": ADDRESS_COLUMN, "Value": VALUE_COLUMN}
+
+
+class RegisterTableModel(QAbstractTableModel):
+    """
+    Register names, addresses and values of one device, one row per register.
+
+    Only the register name column is editable. Edits are reported with
+    register_name_changed rather than saved by the model.
+    """
+
+    register_name_changed = pyqtSignal(str, str)   # address, name
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.headers = list(TABLE_HEADER.keys())
+        self.names = []
+        self.addresses = array('l')
+        self.values = []
+
+
+    def set_registers(self, names, addresses):
+        """
+        Replaces all rows. Values are cleared.
+
+        args:
+            names (list): The register name of every row.
+            addresses (list): The register address of every row.
+        """
+        self.beginResetModel()
+        self.names = list(names)
+        self.addresses = array('l', (int(address) for address in addresses))
+        self.values = [""] * len(self.names)
+        self.endResetModel()
+
+
+    def set_values(self, register_data) -> bool:
+        """
+        Updates the value column and tells the view about the rows that changed, in one range.
+
+        args:
+            register_data (list): One value per row.
+
+        returns:
+            bool: True if any value changed.
+        """
+        values = self.values
+        first = last = None
+        for row, value in enumerate(register_data[:len(values)]):
+            text = str(value)
+            if values[row] != text:
+                values[row] = text
+                if first is None:
+                    first = row
+                last = row
+        if first is None:
+            return False
+        self.dataChanged.emit(self.index(first, VALUE_COLUMN), self.index(last, VALUE_COLUMN), [Qt.DisplayRole])
+        return True
+
+
+    def set_changed_values(self, changes) -> bool:
+        """
+        Updates the value column of the changed rows only, in one range.
+
+        args:
+            changes (dict): {row: value} of the rows that changed.
+
+        returns:
+            bool: True if any value changed.
+        """
+        values = self.values
+        size = len(values)
+        first = last = None
+        for row, value in changes.items():
+            if row >= size:
+                continue
+            text = str(value)
+            if values[row] != text:
+                values[row] = text
+                if first is None or row < first:
+                    first = row
+                if last is None or row > last:
+                    last = row
+        if first is None:
+            return False
+        self.dataChanged.emit(self.index(first, VALUE_COLUMN), self.index(last, VALUE_COLUMN), [Qt.DisplayRole])
+        return True
+
+
+    # ------------------------------------------------------------------
+    # QAbstractTableModel
+    # ------------------------------------------------------------------
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.names)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.EditRole):
+            return None
+        row, column = index.row(), index.column()
+        if column == NAME_COLUMN:
+            return self.names[row]
+        if column == ADDRESS_COLUMN:
+            return str(self.addresses[row])
+        if column == VALUE_COLUMN:
+            return self.values[row]
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self.headers[section] if section < len(self.headers) else None
+        return str(section + 1)
+
+    def flags(self, index):
+        flags = super().flags(index)
+        if index.isValid() and index.column() == NAME_COLUMN:
+            flags |= Qt.ItemIsEditable
+        return flags
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or index.column() != NAME_COLUMN or role != Qt.EditRole:
+            return False
+        row = index.row()
+        if self.names[row] == value:
+            return False
+        self.names[row] = value
+        self.dataChanged.emit(index, index, [Qt.DisplayRole, Qt.EditRole])
+        self.register_name_changed.emit(str(self.addresses[row]), value)
+        return True
@@ -1,33 +1,25 @@
 from PyQt5.QtCore import QSize, Qt, pyqtSignal
-from PyQt5.QtWidgets import QWidget,  QGroupBox, QWidget,  QPushButton, QTableWidget, QVBoxLayout, QLabel, QLineEdit, QComboBox, QDialog,QHBoxLayout, QTableWidgetItem, QCheckBox, QSpacerItem, QSizePolicy
+from PyQt5.QtWidgets import QWidget,  QGroupBox, QWidget,  QPushButton, QTableView, QHeaderView, QVBoxLayout, QLabel, QLineEdit, QComboBox, QDialog,QHBoxLayout, QCheckBox, QSpacerItem, QSizePolicy
 from PyQt5.QtGui import QIcon
 from file_handler import FileHandler
 from modbus_clients import ModbusTCP, ModbusRTU
-from pymodbus.payload import BinaryPayloadDecoder
-from pymodbus.constants import Endian
-from pymodbus.exceptions import ModbusIOException
 from modbus_group_boxes import RtuGroupBox, TcpGroupBox
-from pymodbus.exceptions import ConnectionException
-from constants import REGISTER_NAME, REGISTER_ADDRESS, REGISTER_PREFIX, TCP_METHOD, RTU_METHOD, \
+from constants import REGISTER_NAME, REGISTER_ADDRESS, TCP_METHOD, RTU_METHOD, \
                         HOST, PORT, SERIAL_PORT, BAUD_RATE, PARITY, STOP_BITS, BYTESIZE, \
-                        FUNCTION_CODE, REGISTER_QUANTITY, ACTION_ITEMS, DISCONNECT, \
+                        ACTION_ITEMS, DISCONNECT, \
                         CONNECT, SELECT_ACTION_ID, ADD_REGISTERS_ID, REMOVE_REGISTERS_ID, \
                         CONNECT_ID, HIDE_DEVICE_ID, DELETE_DEVICE_ID, CONNECTED, DISCONNECTED, \
-                        LIGHT_GREEN, GRAY
+                        LIGHT_GREEN, GRAY, ORANGE, QUARANTINED, SCAN_CLASS, SCAN_CLASS_ITEMS, DEFAULT_SCAN_CLASS, \
+                        SET_SCAN_CLASS_ID, SET_DATA_TYPE_ID, SET_DEADBAND_ID
 
 from notifications import Notification
-from custom_dialogs import DeleteRegisters
-from time import perf_counter
+from custom_dialogs import DeleteRegisters, SetScanClass, SetDataType, SetDeadband
+from acquisition import Device
+from register_table_model import RegisterTableModel, NAME_COLUMN, ADDRESS_COLUMN, VALUE_COLUMN
 
 from serial_ports import SerialPorts
 from constants import resource_path
 
-NAME_COLUMN = 0
-ADDRESS_COLUMN = 1
-VALUE_COLUMN = 2
-
-TABLE_HEADER = {"Register Name": NAME_COLUMN, "Address": ADDRESS_COLUMN, "Value": VALUE_COLUMN}
-
 class TableWidget(QWidget):
 
     REGISTER_PROPERTIES = {
@@ -67,22 +59,16 @@ class TableWidget(QWidget):
         self.columns = columns
         self.rows = self.file_handler.get_register_count(self.device_number)
         self.device_name = self.file_handler.get_device_name(self.device_number)
-        self.slave_address = self.file_handler.get_slave_address(self.device_number)
         self.modbus_method_label = ""
         self.connection_methods = self.__get_available_connection_methods(self.device_number)
-        self.connection_status = False
         self.set_default_modbus_method_if_not_set()
-        self.active_connection = None
-        self.set_active_connection()
 
-        self.registers_to_read = dict()
-        self.update_registers_to_read()
+        # The client, read plan and decoder live in the acquisition core; the widget only shows its results.
+        self.device = Device(self.device_number, self.file_handler)
 
         hidden_status = self.file_handler.get_hidden_status(self.device_number)
         self.hidden_status = hidden_status if hidden_status is not None else False
 
-        self.register_data = []
-
         self.connection_params = self.file_handler.get_connection_params(self.device_number)
         self.stored_com_port_missing = False
         self.stored_serial_port = self.connection_params.get(RTU_METHOD, {}).get(SERIAL_PORT)
@@ -186,16 +172,17 @@ class TableWidget(QWidget):
 
 
         # Create a table to display the registers
-        self.table_widget = QTableWidget()
-        self.table_widget.setRowCount(self.rows)
-        self.table_widget.setColumnCount(self.columns)
-        self.table_widget.setHorizontalHeaderLabels(list(TABLE_HEADER.keys()))
-        self.table_widget.setColumnWidth(NAME_COLUMN, 200) # Set the width of the "Register Name" column to 200
-        self.table_widget.setColumnWidth(ADDRESS_COLUMN, 120) # Set the width of the "Address" column to 100
-        self.table_widget.setColumnWidth(VALUE_COLUMN, 120) # Set the width of the "Value" column to 100
-        self.table_widget.cellChanged.connect(self.on_cell_changed)
-        self.table_widget.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff) 
-        self.table_widget.setStyleSheet("QTableWidget { border: 1px light gray; }")
+        self.table_model = RegisterTableModel(self)
+        self.table_model.register_name_changed.connect(self.on_register_name_changed)
+        self.table_view = QTableView()
+        self.table_view.setModel(self.table_model)
+        self.table_view.setColumnWidth(NAME_COLUMN, 200) # Set the width of the "Register Name" column to 200
+        self.table_view.setColumnWidth(ADDRESS_COLUMN, 120) # Set the width of the "Address" column to 100
+        self.table_view.setColumnWidth(VALUE_COLUMN, 120) # Set the width of the "Value" column to 100
+        # Fixed row heights so the view never measures rows
+        self.table_view.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.table_view.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff) 
+        self.table_view.setStyleSheet("QTableView { border: 1px light gray; }")
         
         # Create a horizontal layout to hold action label and combo box vlayouy and connection status label
         self.left_group_box = QGroupBox()
@@ -236,7 +223,7 @@ class TableWidget(QWidget):
 
         top_horizontal_layout.addWidget(self.left_group_box)
         top_horizontal_layout.addWidget(self.right_group_box)
-        bottom_vertical_layout.addWidget(self.table_widget)
+        bottom_vertical_layout.addWidget(self.table_view)
 
         group_box_internal_layout.addLayout(top_horizontal_layout)
         group_box_internal_layout.addLayout(bottom_vertical_layout)
@@ -257,17 +244,14 @@ class TableWidget(QWidget):
         self.action_menu.addItems(self.action_items) 
 
 
-    def on_cell_changed(self, row, column):
+    def on_register_name_changed(self, register_address, new_register_name):
         """
         This method allows the user to assign a custom name to a register.
         """
-        new_register_name = self.table_widget.item(row, column)
-        register_address = self.table_widget.item(row, column + 1) # column + 1 is the address column
-        if new_register_name and register_address  and column == NAME_COLUMN:
-            if self.file_handler.update_register_name(self.device_number, register_address.text(), new_register_name.text()):
-                print(f"Updated register name to : {new_register_name.text()}")
-            else:
-                print(f"Failed to update register name")
+        if self.file_handler.update_register_name(self.device_number, register_address, new_register_name):
+            print(f"Updated register name to : {new_register_name}")
+        else:
+            print(f"Failed to update register name")
         
 
     def on_tcp_connection_status_changed(self):
@@ -344,24 +328,53 @@ class TableWidget(QWidget):
             position = current_index
             self.action_menu.setCurrentIndex(SELECT_ACTION_ID)
             self.drop_down_menu_clicked.emit(device_number, position)
+        elif current_index == SET_SCAN_CLASS_ID: # If the selected option is Set scan class (index 6)
+            position = current_index
+            self.action_menu.setCurrentIndex(SELECT_ACTION_ID)
+            self.drop_down_menu_clicked.emit(device_number, position)
+        elif current_index == SET_DATA_TYPE_ID: # If the selected option is Set data type (index 7)
+            position = current_index
+            self.action_menu.setCurrentIndex(SELECT_ACTION_ID)
+            self.drop_down_menu_clicked.emit(device_number, position)
+        elif current_index == SET_DEADBAND_ID: # If the selected option is Set deadband (index 8)
+            position = current_index
+            self.action_menu.setCurrentIndex(SELECT_ACTION_ID)
+            self.drop_down_menu_clicked.emit(device_number, position)
             
 
 
 
-    def set_connection_status(self,status):
+    @property
+    def connection_status(self) -> bool:
+        return self.device.connected
+
 
+    def set_connection_status(self,status):
+        """
+        Shows the connection status of the device. The status itself is kept by self.device.
+        """
         if status == True:
-            self.connection_status = True
             self.connection_status_label.setText(CONNECTED)
             self.connection_status_label.setStyleSheet("background-color: " + LIGHT_GREEN + "; padding: 25px;")
             self.change_action_item(CONNECT_ID, DISCONNECT)
         else:
-            self.connection_status = False
             self.connection_status_label.setText(DISCONNECTED)
             self.connection_status_label.setStyleSheet("background-color: " + GRAY + "; padding: 25px;")
             self.change_action_item(CONNECT_ID, CONNECT)
 
 
+    def set_quarantined(self, quarantined):
+        """
+        Shows that the device was taken out of the poll cycle after failing repeatedly and is only probed now and then,
+        see circuit_breaker. It shows as connected again once it answers.
+        """
+        if quarantined:
+            self.connection_status_label.setText(QUARANTINED)
+            self.connection_status_label.setStyleSheet("background-color: " + ORANGE + "; padding: 25px;")
+        else:
+            self.set_connection_status(self.connection_status)
+
+
 
         
     def set_default_modbus_method_if_not_set(self):
@@ -425,6 +438,15 @@ class TableWidget(QWidget):
         self.reg_quantity = QLineEdit(self)
         r_set_h_layout_3.addWidget(self.reg_quantity_label)
         r_set_h_layout_3.addWidget(self.reg_quantity)
+
+        # Create a horizontal layout for the scan class and its dropdown list
+        r_set_h_layout_scan = QHBoxLayout()
+        self.scan_class_label = QLabel("Scan Class")
+        self.scan_class = QComboBox()
+        self.scan_class.addItems(SCAN_CLASS_ITEMS)
+        self.scan_class.setCurrentText(DEFAULT_SCAN_CLASS)
+        r_set_h_layout_scan.addWidget(self.scan_class_label)
+        r_set_h_layout_scan.addWidget(self.scan_class)
         
         # Create a button to submit the register setup
         r_set_h_layout_4 = QHBoxLayout(self)
@@ -438,6 +460,7 @@ class TableWidget(QWidget):
         rset_main_layout.addLayout(r_set_v_layout_1)
         rset_main_layout.addLayout(r_set_h_layout_2)
         rset_main_layout.addLayout(r_set_h_layout_3)
+        rset_main_layout.addLayout(r_set_h_layout_scan)
         rset_main_layout.addLayout(r_set_h_layout_4) 
         self.register_setup_dialog.setLayout(rset_main_layout)
         self.register_setup_dialog.exec_() 
@@ -449,7 +472,6 @@ class TableWidget(QWidget):
         self.update_register_table()
         self.update_registers_to_read()
         self.register_setup_dialog.accept()
-        self.table_widget.update()
 
 
         # This function gets the user input values and the default values from the constructor function and sends them to interface.py
@@ -459,6 +481,7 @@ class TableWidget(QWidget):
         user_input['quantity'] = self.register_quantity
         user_input['address'] = int(self.reg_address.text())
         user_input["function_code"] = self.READ_FUNCTION_CODES[self.function_code.currentText()]
+        user_input[SCAN_CLASS] = self.scan_class.currentText()
         return user_input
 
         
@@ -469,27 +492,38 @@ class TableWidget(QWidget):
 
     def update_register_table(self):
         """
-        This method updates the register table widget with 
+        This method updates the register table with 
         the defaul attributes which are:
 
-        Register name: This is the first column of the table widget.
-        Register address: This is the second column of the table widget.
+        Register name: This is the first column of the table.
+        Register address: This is the second column of the table.
 
         The attributes are passed in form of a list.
         """
-        results = self.file_handler.get_register_attributes(self.device_number, REGISTER_NAME)
-        self.table_widget.setRowCount(0)
-        if results:
-            for index, register in enumerate(results):
-                self.table_widget.insertRow(index)
-                self.table_widget.setItem(index, NAME_COLUMN, QTableWidgetItem(results[register][REGISTER_NAME]))
-                self.table_widget.setItem(index, ADDRESS_COLUMN, QTableWidgetItem(register)) # Convert address to a string for it to be displayed.
+        results = self.file_handler.get_register_attributes(self.device_number, REGISTER_NAME) or {}
+        self.table_model.set_registers(
+            [attributes[REGISTER_NAME] for attributes in results.values()],
+            list(results.keys())
+        )
 
 
     def update_register_data(self):
-        for row, data in enumerate(self.register_data):
-            self.table_widget.setItem(row, VALUE_COLUMN, QTableWidgetItem(str(data)))
-        self.table_widget.viewport().update()
+        self.show_register_values(self.device.register_data)
+
+
+    def show_register_values(self, register_data):
+        """
+        Shows a list of register values in the value column.
+        Only the range of rows whose text changed is repainted.
+
+        args:
+            register_data (list): One value per row, see acquisition.Device.read(),
+                or {row: value} of changed values, see acquisition.Device.read_changes().
+        """
+        if isinstance(register_data, dict):
+            self.table_model.set_changed_values(register_data)
+        else:
+            self.table_model.set_values(register_data)
 
 
 
@@ -530,272 +564,56 @@ class TableWidget(QWidget):
         if self.stored_com_port_missing:
             self.notification.set_warning_message("Serial Port Not Found.", f"The stored serial port {self.stored_serial_port} is not available. Please reconnect the device or edit the connection settings.")
             return False
-        try:
-            self.active_connection.client.connect()
+        if self.device.connect():
             self.set_connection_status(True)
-            print(f"Successfully connected to device {self.device_number} using {self.file_handler.get_default_modbus_method(self.device_number)}" )
+            print(f"Successfully connected to device {self.device_number} using {self.device.default_method}" )
             return True
-        except Exception as e:
-            self.active_connection.client.close()
-            self.notification.set_warning_message("Failed to connect to device.", f"The stored serial port failed to connect with error {e}. Please try again or reconnect the device.")
-            return False
+        self.notification.set_warning_message("Failed to connect to device.", "The device did not respond. Please check the connection settings and try again.")
+        return False
 
     
     def disconnect_from_device(self):
-        self.active_connection.client.close()
+        self.device.disconnect()
         self.set_connection_status(False)
 
 
     def set_active_connection(self):
         """
-        This method checks for the default modbus connection and sets the appropriate connection method
-
-        which can be either TCP or RTU
-
-        arguments:
-            None
+        This method reloads the default modbus method and connection parameters of the device
 
-        returns:
-            modbus_object (object): An instance of either Modbus RTU or Modbus TCP
+        and creates its client, see acquisition.Device.load_settings().
         """
-        modbus_object = None
-        result = self.file_handler.get_default_modbus_method(self.device_number)
-        if result == TCP_METHOD:
-            modbus_object = ModbusTCP(self.device_number)
-        elif result == RTU_METHOD:
-            modbus_object = ModbusRTU(self.device_number)
-        else:
-            print("Default method has not been set")
-            return None
-        self.active_connection = modbus_object
+        self.device.load_settings()
     
 
     def update_registers_to_read(self):
-        input_dict = self.file_handler.get_registers_to_read(self.device_number)
-        self.registers_to_read = self.extract_register_patterns(input_dict)
+        self.device.update_registers_to_read()
 
 
+    def set_scan_classes(self) -> bool:
+        dialog = SetScanClass(self.device_number)
+        if dialog.exec_() == QDialog.Accepted:
+            self.update_registers_to_read()
+            return True
+        return False
 
-    def extract_register_patterns(self, input_dict):
-        """
-        This lovely method looks for a pattern of contiguous registers that share a common function code for batch reading which saves time.
-
-        args:
-            input_dict (dict): A dictionary of registers obtained from the register JSON file in the data directory.
-
-        returns:
-            output_dict (dict): A dictionary containing groups of registers that share a common function code, represented by the starting register.
-
-        example:
-            input_dict = {
-                '10': {'function_code': 3}, 
-                '11': {'function_code': 3}, 
-                '12': {'function_code': 3}, 
-                '13': {'function_code': 4}, 
-                '14': {'function_code': 2}, 
-                '15': {'function_code': 2}, 
-                '16': {'function_code': 1}
-            }
-
-            output_dict = {
-                10: {'function_code': 3, 'quantity': 3}, 
-                13: {'function_code': 4, 'quantity': 1}, 
-                14: {'function_code': 2, 'quantity': 2}, 
-                16: {'function_code': 1, 'quantity': 1}
-            }
-
-
-        """
-        new_list_of_registers = {int(key): value for key, value in input_dict.items()}
-        
-        current_fx = 0
-        current_key = 0
-        quantity = 1
-        output_dict = {}
-
-        for index, current_register in enumerate(new_list_of_registers):
-            temp_dict = {}
-            if index == 0:
-                previous_fx = current_fx = new_list_of_registers[current_register][FUNCTION_CODE]
-                current_key = previous_register = current_register
-                temp_dict[FUNCTION_CODE] = current_fx
-                temp_dict[REGISTER_QUANTITY] = quantity
-                output_dict[current_key] = temp_dict
-            else:
-                current_fx = new_list_of_registers[current_register][FUNCTION_CODE]
-                if previous_register + 1 == current_register and previous_fx == current_fx:
-                    quantity += 1
-                    temp_dict[FUNCTION_CODE] = current_fx
-                    temp_dict[REGISTER_QUANTITY] = quantity
-                    output_dict[current_key] = temp_dict
-                    previous_register = current_register
-                    previous_fx = current_fx
-
-                else:
-                    current_fx = new_list_of_registers[current_register][FUNCTION_CODE]
-                    quantity = 1
-                    current_key = current_register
-                    temp_dict[FUNCTION_CODE] = current_fx
-                    temp_dict[REGISTER_QUANTITY] = quantity
-                    output_dict[current_key] = temp_dict
-                    previous_register = current_register
-                    previous_fx = current_fx
-        return output_dict
-
-
-
-
-
-    def read_registers(self):
-
-        if not self.connection_status:
-            return []
-
-        read_start = perf_counter()
-        self.register_data.clear()
-
-        grouped = {}
-
-        
-        # Group registers by function code
-        for address, attributes in self.registers_to_read.items():
-
-            if address is None:
-                continue
-
-            function_code = attributes[FUNCTION_CODE]
-            quantity = attributes[REGISTER_QUANTITY]
-
-            grouped.setdefault(function_code, []).append(
-                (address, quantity)
-            )
-
-
-        # Process each function group
-        for function_code, entries in grouped.items():
-
-            entries.sort(key=lambda x: x[0])
-
-
-            # Merge contiguous / overlapping ranges
-            merged_blocks = []
-
-            current_start = entries[0][0]
-            current_end = current_start + entries[0][1]
-
-            for address, quantity in entries[1:]:
-
-                block_end = address + quantity
-
-                if address <= current_end:
-                    current_end = max(current_end, block_end)
-                else:
-                    merged_blocks.append((current_start, current_end))
-                    current_start = address
-                    current_end = block_end
-
-            merged_blocks.append((current_start, current_end))
 
-            
-            # Execute merged blocks with chunk safety
-            for block_start, block_end in merged_blocks:
+    def set_data_types(self) -> bool:
+        dialog = SetDataType(self.device_number)
+        if dialog.exec_() == QDialog.Accepted:
+            self.update_registers_to_read()
+            return True
+        return False
 
-                total_quantity = block_end - block_start
 
-                # Determine max allowed per request
-                if function_code in (3, 4):
-                    max_chunk = 125
-                elif function_code in (1, 2):
-                    max_chunk = 2000
-                else:
-                    continue
+    def set_deadbands(self) -> bool:
+        dialog = SetDeadband(self.device_number)
+        if dialog.exec_() == QDialog.Accepted:
+            self.update_registers_to_read()
+            return True
+        return False
 
-                
-                #  Split into safe chunks
-                chunk_start = block_start
-
-                while chunk_start < block_end:
-
-                    chunk_quantity = min(
-                        max_chunk,
-                        block_end - chunk_start
-                    )
-
-                    try:
-
-                        client = self.active_connection.client
-
-                        if function_code == 1:
-                            response = client.read_coils(
-                                chunk_start,
-                                chunk_quantity,
-                                slave=self.slave_address
-                            )
-
-                        elif function_code == 2:
-                            response = client.read_discrete_inputs(
-                                chunk_start,
-                                chunk_quantity,
-                                slave=self.slave_address
-                            )
-
-                        elif function_code == 3:
-                            response = client.read_holding_registers(
-                                chunk_start,
-                                chunk_quantity,
-                                slave=self.slave_address
-                            )
-
-                        elif function_code == 4:
-                            response = client.read_input_registers(
-                                chunk_start,
-                                chunk_quantity,
-                                slave=self.slave_address
-                            )
-
-                        if response.isError():
-                            self.register_data.extend(
-                                ["Error"] * chunk_quantity
-                            )
-                            chunk_start += chunk_quantity
-                            continue
-
-                        # Extract correct data container
-                        if function_code in (1, 2):
-                            values = response.bits[:chunk_quantity]
-                        else:
-                            values = response.registers[:chunk_quantity]
-
-                        
-                        # Map chunk data back to logical registers
-                        for address, quantity in entries:
-
-                            if chunk_start <= address < chunk_start + chunk_quantity:
-
-                                offset = address - chunk_start
-                                slice_end = offset + quantity
-
-                                self.register_data.extend(
-                                    values[offset:slice_end]
-                                )
-
-                    except (ModbusIOException, ConnectionException):
-
-                        self.set_connection_status(False)
-                        self.register_data.extend(
-                            ["Error"] * chunk_quantity
-                        )
-
-                    chunk_start += chunk_quantity
-
-        read_end = perf_counter()
-
-        print(
-            f"Device {self.device_number} optimized read: "
-            f"{read_end - read_start:.4f}s"
-        )
 
-        return self.register_data
 
     def get_tcp_connection_string(self, connection_params):
         return f'{connection_params[TCP_METHOD].get(HOST)}:{connection_params[TCP_METHOD].get(PORT)}'
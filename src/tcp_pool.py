@@ -0,0 +1,322 @@
+"""
+This module shares one Modbus TCP connection between all devices at the
+same host and port, and reconnects it when it is lost.
+
+Devices behind a TCP gateway differ only by their slave address, so they
+all talk through the same TcpConnection and its single socket. Their
+requests go through one queue per connection and are executed one at a
+time by the connection's thread, like bus_manager.SerialBus does for a
+serial port, which also keeps the pymodbus sync client on one thread.
+
+pymodbus closes the socket whenever a request gets no response, which
+would reconnect every device behind a gateway because one slave missed a
+request. A GatewayClient keeps the socket open instead, unless it broke.
+Before every request the socket is checked without blocking: a socket
+closed by the peer is reconnected, and stray bytes left by a response
+that arrived after its timeout are discarded. A request that fails
+because the connection broke is sent again once over a new connection.
+If reconnecting fails, further attempts are spaced by an exponential
+backoff with jitter, from TCP_RECONNECT_DELAY_MIN_S up to
+TCP_RECONNECT_DELAY_MAX_S, so a device that is away does not cost a
+connect timeout on every poll.
+"""
+
+import queue
+import random
+import select
+import threading
+from time import perf_counter
+from concurrent.futures import Future
+from pymodbus.client import ModbusTcpClient
+from pymodbus.exceptions import ConnectionException, ModbusIOException
+from bus_manager import REQUEST_METHODS
+from adaptive_timeout import set_client_timeout
+from constants import TCP_RECONNECT_DELAY_MIN_S, TCP_RECONNECT_DELAY_MAX_S, DEFAULT_TCP_TIMEOUT_S
+
+
+def backoff_delay(failures, minimum=TCP_RECONNECT_DELAY_MIN_S, maximum=TCP_RECONNECT_DELAY_MAX_S) -> float:
+    """
+    Returns how long to wait before the next reconnect attempt after a number of failed attempts.
+
+    The delay doubles with every failure up to maximum, and is then drawn between half and all of it,
+    so devices that lost their connection together do not reconnect in lockstep.
+    """
+    delay = min(maximum, minimum * 2 ** max(0, failures - 1))
+    return random.uniform(delay / 2, delay)
+
+
+class GatewayClient(ModbusTcpClient):
+    """
+    A ModbusTcpClient whose socket stays open while keep_open is set.
+    A close() made meanwhile, by pymodbus after a response timeout, is only recorded in close_requested.
+    """
+
+    keep_open = False
+    close_requested = False
+
+    def close(self):
+        if self.keep_open:
+            self.close_requested = True
+            return
+        super().close()
+
+
+class TcpConnection:
+    """
+    Owns the client of one host and port and executes every request made on it.
+
+    Requests from all devices at the host and port are queued and executed
+    one at a time, in the order they were submitted, by the connection's own
+    thread, so devices behind a gateway take turns fairly instead of racing
+    for the socket.
+    """
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.client = GatewayClient(host, port=port, timeout=DEFAULT_TCP_TIMEOUT_S)
+        self.timeout = DEFAULT_TCP_TIMEOUT_S
+        self.failures = 0
+        self.reconnects = 0
+        self._next_attempt = 0.0   # gateway thread only
+        self._requests = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._users = set()
+
+
+    # ------------------------------------------------------------------
+    # Public API (thread-safe)
+    # ------------------------------------------------------------------
+
+    def submit(self, user, function, *args, **kwargs) -> Future:
+        """
+        Queues a call for a device and returns a future for its result.
+        The device becomes a user of the connection again if it had closed it.
+
+        arguments:
+            user (object): The object using the connection, usually a PooledTcpClient, or None.
+            function (callable): Runs on the connection's thread, e.g. self._request.
+            args, kwargs: The arguments passed to function.
+        """
+        future = Future()
+        with self._lock:
+            if user is not None:
+                self._users.add(user)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"TcpConnection {self.host}:{self.port}", daemon=True)
+                self._thread.start()
+        self._requests.put((future, function, args, kwargs))
+        return future
+
+
+    def execute(self, user, method_name, *args, timeout=None, **kwargs):
+        """
+        Executes a client call for a device, reconnecting first if the connection was lost.
+        Blocks until the connection's thread has executed it.
+
+        arguments:
+            timeout (float): The response timeout of this call in seconds, or None for DEFAULT_TCP_TIMEOUT_S.
+
+        raises:
+            ConnectionException: If the connection is down and could not be restored.
+        """
+        return self.submit(user, self._request, method_name, args, kwargs, timeout).result()
+
+
+    def open(self, user, force=True) -> bool:
+        """
+        Registers a device as a user of the connection and connects if needed.
+
+        arguments:
+            user (object): The object using the connection, usually a PooledTcpClient.
+            force (bool): Try to connect now even if the backoff delay has not passed.
+
+        returns:
+            bool: True if the connection is open.
+        """
+        return self.submit(user, self._open, force).result()
+
+
+    def release(self, user):
+        """
+        Removes a device from the connection and closes it once no device uses it.
+        """
+        with self._lock:
+            self._users.discard(user)
+            if self._users or self._thread is None:
+                return
+        self.submit(None, self._close_if_unused).result()
+
+
+    def is_open(self) -> bool:
+        return self.client.is_socket_open()
+
+
+    def in_use(self) -> bool:
+        with self._lock:
+            return bool(self._users)
+
+
+    # ------------------------------------------------------------------
+    # Connection thread
+    # ------------------------------------------------------------------
+
+    def _run(self):
+        while True:
+            future, function, args, kwargs = self._requests.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(function(*args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+
+
+    def _open(self, force) -> bool:
+        set_client_timeout(self.client, self.timeout)
+        if self._is_alive():
+            return True
+        if not force and perf_counter() < self._next_attempt:
+            return False
+        return self._connect()
+
+
+    def _close_if_unused(self):
+        with self._lock:
+            if self._users:
+                return
+        self.client.close()
+
+
+    def _request(self, method_name, args, kwargs, timeout=None):
+        set_client_timeout(self.client, timeout or self.timeout)
+        if not self._is_alive():
+            if perf_counter() < self._next_attempt or not self._connect():
+                raise ConnectionException(f"{self.host}:{self.port} is not connected")
+        try:
+            return self._call(method_name, args, kwargs)
+        except (ConnectionException, OSError):
+            self.client.close()
+        # The connection broke during the request: send it again once over a new connection.
+        if not self._connect():
+            raise ConnectionException(f"Lost the connection to {self.host}:{self.port}")
+        try:
+            return self._call(method_name, args, kwargs)
+        except (ConnectionException, OSError) as e:
+            self.client.close()
+            self._schedule_reconnect()
+            raise ConnectionException(f"Lost the connection to {self.host}:{self.port}") from e
+
+
+    def _call(self, method_name, args, kwargs):
+        """
+        Calls a client method. If the response timed out but the socket is still healthy, it stays open
+        for the other devices, and a late response is discarded by the next _is_alive().
+        """
+        client = self.client
+        client.keep_open = True
+        client.close_requested = False
+        try:
+            response = getattr(client, method_name)(*args, **kwargs)
+        finally:
+            client.keep_open = False
+        if client.close_requested and not (isinstance(response, ModbusIOException) and self._is_alive()):
+            client.close()
+        return response
+
+
+    def _is_alive(self) -> bool:
+        """
+        Health check: returns False if the socket is closed or was closed by the peer.
+        Bytes waiting on an idle socket belong to no request and are discarded.
+        """
+        sock = self.client.socket
+        if sock is None:
+            return False
+        try:
+            readable, _, _ = select.select([sock], [], [], 0)
+            if readable and not sock.recv(4096):
+                self.client.close()
+                return False
+        except (OSError, ValueError):
+            self.client.close()
+            return False
+        return True
+
+
+    def _connect(self) -> bool:
+        self.client.close()
+        try:
+            connected = bool(self.client.connect())
+        except (ConnectionException, OSError):
+            connected = False
+        if connected:
+            if self.failures:
+                self.reconnects += 1
+            self.failures = 0
+            self._next_attempt = 0.0
+        else:
+            self._schedule_reconnect()
+        return connected
+
+
+    def _schedule_reconnect(self):
+        self.failures += 1
+        self._next_attempt = perf_counter() + backoff_delay(self.failures)
+
+
+class PooledTcpClient:
+    """
+    Stands in for a ModbusTcpClient for a single device.
+
+    It exposes the client methods used by the rest of the application, but
+    routes them through the shared TcpConnection of the device's host and port.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+
+
+    def connect(self) -> bool:
+        return self.connection.open(self)
+
+
+    def reconnect(self) -> bool:
+        """Connects like connect(), but only once the backoff delay since the last failed attempt has passed."""
+        return self.connection.open(self, force=False)
+
+
+    def close(self):
+        self.connection.release(self)
+
+
+    def is_socket_open(self) -> bool:
+        return self.connection.is_open()
+
+
+    def __getattr__(self, name):
+        if name in REQUEST_METHODS:
+            return lambda *args, **kwargs: self.connection.execute(self, name, *args, **kwargs)
+        raise AttributeError(name)
+
+
+class TcpConnectionPool:
+    """
+    Keeps one TcpConnection per host and port.
+    """
+
+    _connections = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_client(cls, host, port) -> PooledTcpClient:
+        """
+        Returns a client for a device at a host and port, sharing the connection with other devices there.
+        """
+        key = (host, int(port))
+        with cls._lock:
+            connection = cls._connections.get(key)
+            if connection is None:
+                connection = cls._connections[key] = TcpConnection(host, int(port))
+        return PooledTcpClient(connection)